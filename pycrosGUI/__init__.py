@@ -17,6 +17,11 @@ from .image_dialog import ImageDialog
 from .atom_dialog import AtomDialog
 from .probe_dialog import ProbeDialog
 from .homepage import HomePage
+from .dataset_picker import DatasetPicker
+from .file_loader import FileLoader
+from .save_dialog import H5SaveDialog
+from .formats import register_reader
+from .dataset import Dataset, DataType
 
 __all__ = [
     'BaseWidget', 
@@ -34,6 +39,12 @@ __all__ = [
     'AtomDialog',
     'ProbeDialog',
     'HomePage',
+    'DatasetPicker',
+    'FileLoader',
+    'H5SaveDialog',
+    'register_reader',
+    'Dataset',
+    'DataType',
 ]
 
 if __name__ == '__main__':
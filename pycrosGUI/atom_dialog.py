@@ -17,9 +17,15 @@ except ImportError:
 
 import numpy as np
 
+from .dataset_events import is_image
+from .dataset_model import KEY_ROLE, set_combo_model
+
 
 class AtomDialog(QtWidgets.QWidget):
     """Atom finding and analyzing dialog."""
+
+    # Results stored with the session
+    state_attributes = ('key', 'structure')
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -47,7 +53,7 @@ class AtomDialog(QtWidgets.QWidget):
 
         # Dataset selection
         self.main_list = QtWidgets.QComboBox(self)
-        self.main_list.addItem("None")
+        self.dataset_filter = set_combo_model(self.main_list, self.parent, is_image)
         layout.addWidget(self.main_list, row, 0, 1, 3)
         layout.setColumnStretch(0, 3)
         self.main_list.activated[str].connect(self.update_image_dataset)
@@ -171,27 +177,13 @@ class AtomDialog(QtWidgets.QWidget):
         return layout
 
     def update_sidebar(self):
-        """Update the sidebar with the current structure information."""
-        # Update the image list
-        image_list = []
-        if hasattr(self.parent, 'datasets'):
-            for key, dataset in self.parent.datasets.items():
-                if hasattr(dataset, 'data_type'):
-                    if 'IMAGE' in dataset.data_type.name:
-                        image_list.append(f"{key}: {dataset.title}")
-
-        self.main_list.clear()
-        if len(image_list) == 0:
-            self.main_list.addItem("None")
-        else:
-            for item in image_list:
-                self.main_list.addItem(item)
+        """Update the sidebar; the image list follows the dataset events."""
 
     def update_image_dataset(self, value=0):
         """Update the image dataset."""
-        item_text = self.main_list.currentText()
-        if hasattr(self.parent, 'main'):
-            self.parent.main = item_text.split(':')[0]
+        key = self.main_list.currentData(KEY_ROLE)
+        if key is not None and hasattr(self.parent, 'main'):
+            self.parent.main = key
         if hasattr(self.parent, 'dataset') and self.parent.dataset is not None:
             self.dataset = self.parent.dataset
 
@@ -0,0 +1,338 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# autosave: Crash recovery journal of a running session.
+#       - Appends small deltas (new or changed datasets, dialog states)
+#       - Written in a worker thread, the GUI only collects references
+#       - Datasets still on disk are journaled by reference, not copied
+#       - Restores datasets and fit results without recomputing them
+#
+#####################################################################
+"""
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import lazy_data
+from . import image_stack
+from .session import ChangeTracker, pack_state, decode_state
+from .dataset import Dataset, unwrap
+
+AUTOSAVE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pycrosGUI', 'autosave')
+
+# Default seconds between autosaves
+AUTOSAVE_INTERVAL = 30
+
+# Journals of other processes not touched for this long are treated as crashed
+STALE_SECONDS = 300
+
+JOURNAL_FILE = 'journal.jsonl'
+
+
+def data_source(data):
+    """Description of where lazy data can be reopened from, or None.
+
+    Only data that is still backed by a file on disk has a source.
+    """
+    if isinstance(data, lazy_data.H5Array):
+        return {'hdf5': data.file.filename, 'dataset': data.name}
+    if isinstance(data, image_stack.TiffStack):
+        return {'tiff': data.file_path}
+    if isinstance(data, image_stack.ImageSequence):
+        return {'images': list(data.files)}
+    if isinstance(data, lazy_data.DaskArray) and data.file_path:
+        return {'file': data.file_path}
+    if isinstance(data, np.memmap) and isinstance(data.base, mmap.mmap) and data.filename:
+        if data.flags.c_contiguous or data.flags.f_contiguous:
+            return {'memmap': os.fspath(data.filename), 'offset': int(data.offset), 'shape': list(data.shape),
+                    'dtype': data.dtype.str, 'order': 'C' if data.flags.c_contiguous else 'F'}
+    return None
+
+
+def open_source(source):
+    """Reopen data described by data_source."""
+    if 'hdf5' in source:
+        return lazy_data.open_hdf5(source['hdf5'], dataset_path=source['dataset'])
+    if 'tiff' in source:
+        return image_stack.TiffStack(source['tiff'])
+    if 'images' in source:
+        return image_stack.ImageSequence(source['images'])
+    if 'file' in source:
+        from . import formats
+        data = formats.find_reader(source['file']).read(source['file'])
+        return next(iter(data.values())) if isinstance(data, dict) else data
+    if 'memmap' in source:
+        return np.memmap(source['memmap'], mode='r', offset=source['offset'], shape=tuple(source['shape']),
+                         dtype=np.dtype(source['dtype']), order=source['order'])
+    raise ValueError(f"Unknown data source: {source}")
+
+
+def write_array(file_path, data):
+    """Write data as .npy file, block by block for lazy data."""
+    if data.ndim == 0 or not lazy_data.is_lazy(data):
+        np.save(file_path, np.asarray(data))
+        return
+    out = np.lib.format.open_memmap(file_path, mode='w+', dtype=data.dtype, shape=data.shape)
+    for sl, block in lazy_data.iter_blocks(data):
+        out[sl] = block
+    out.flush()
+    del out
+
+
+def _pid(folder):
+    try:
+        return int(os.path.basename(folder).split('-')[0])
+    except ValueError:
+        return None
+
+
+def _is_running(folder):
+    pid = _pid(folder)
+    if pid == os.getpid():
+        return True
+    if os.name == 'posix' and pid is not None:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+        return True
+    journal = os.path.join(folder, JOURNAL_FILE)
+    return os.path.exists(journal) and time.time() - os.path.getmtime(journal) < STALE_SECONDS
+
+
+def new_journal_folder():
+    """Journal folder for this process."""
+    return os.path.join(AUTOSAVE_DIR, f'{os.getpid()}-{time.strftime("%Y%m%d-%H%M%S")}')
+
+
+def crashed_journals():
+    """Journal folders left behind by sessions that did not end cleanly, newest first."""
+    if not os.path.isdir(AUTOSAVE_DIR):
+        return []
+    folders = [os.path.join(AUTOSAVE_DIR, name) for name in os.listdir(AUTOSAVE_DIR)]
+    folders = [folder for folder in folders
+               if os.path.isfile(os.path.join(folder, JOURNAL_FILE)) and not _is_running(folder)]
+    return sorted(folders, key=lambda folder: os.path.getmtime(os.path.join(folder, JOURNAL_FILE)), reverse=True)
+
+
+class Journal:
+    """Append-only journal of session changes in a folder.
+
+    Each line of ``journal.jsonl`` is one record: a dataset (by source or
+    as .npy payload), a removed dataset, a dialog state or the main key.
+    The last record of a key wins. ``changes`` runs in the GUI thread
+    and only compares references; ``submit`` packs dialog states and
+    writes the deltas in a worker thread. Deltas count as journaled only
+    once they are written, so those of a failed write are handed over
+    again by the next ``changes``.
+    """
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.path = os.path.join(folder, JOURNAL_FILE)
+        self.tracker = ChangeTracker()
+        # Last record per dataset key and per dialog, as written to the journal
+        self.records = {}
+        self.state_records = {}
+        # What has been journaled
+        self.keys = set()
+        self.state_digests = {}
+        self.main = ''
+        self.recorded_main = ''
+        # Keys marked changed since the last call of changes
+        self._changed = set()
+        self._lock = threading.Lock()
+        self._count = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='autosave')
+        if os.path.exists(self.path):
+            self._replay()
+
+    def _replay(self):
+        """Read the records of an existing journal (a truncated last line is ignored)."""
+        with open(self.path, encoding='utf-8') as fp:
+            for line in fp:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                self._apply(record)
+        numbers = [int(name[:6]) for name in os.listdir(self.folder) if name[:6].isdigit()]
+        self._count = max(numbers, default=0)
+        self.keys = set(self.records)
+        self.main = self.recorded_main
+        self.state_digests = {name: record['digest'] for name, record in self.state_records.items()}
+
+    def _apply(self, record):
+        op = record['op']
+        if op == 'dataset':
+            self.records[record['key']] = record
+        elif op == 'remove':
+            self.records.pop(record['key'], None)
+        elif op == 'state':
+            self.state_records[record['name']] = record
+        elif op == 'main':
+            self.recorded_main = record['key']
+
+    def changes(self, datasets, states, main):
+        """Deltas since the last written ones; datasets and states are only referenced.
+
+        Dialog states are always handed over; they are packed and
+        compared with their last digest in the worker thread.
+        """
+        with self._lock:
+            self._changed.clear()
+            deltas = [{'op': 'remove', 'key': key} for key in self.keys if key not in datasets]
+            for key, data in datasets.items():
+                if not self.tracker.is_stored(key, data):
+                    delta = {'op': 'dataset', 'key': key, 'data': data, 'stamp': self.tracker.stamp(data)}
+                    if isinstance(data, Dataset):
+                        delta['attrs'] = data.attrs
+                    deltas.append(delta)
+        deltas += [{'op': 'state', 'name': name, 'state': state} for name, state in states.items()]
+        if main != self.main:
+            deltas.append({'op': 'main', 'key': main})
+        return deltas
+
+    def mark_changed(self, key):
+        """Journal key again at the next autosave (e.g. after in-place edits)."""
+        with self._lock:
+            self.tracker.forget(key)
+            self._changed.add(key)
+
+    def _commit(self, deltas):
+        """Count written deltas as journaled; keys marked changed meanwhile are journaled again."""
+        with self._lock:
+            for delta in deltas:
+                op = delta['op']
+                if op == 'remove':
+                    self.keys.discard(delta['key'])
+                    self.tracker.forget(delta['key'])
+                elif op == 'dataset':
+                    self.keys.add(delta['key'])
+                    if delta['key'] not in self._changed:
+                        self.tracker.remember(delta['key'], delta['data'], delta['stamp'])
+                elif op == 'state':
+                    self.state_digests[delta['name']] = delta['digest']
+                elif op == 'main':
+                    self.main = delta['key']
+
+    def _payload(self, extension):
+        self._count += 1
+        return f'{self._count:06d}{extension}'
+
+    def _remove_payload(self, record):
+        if record and 'file' in record:
+            try:
+                os.remove(os.path.join(self.folder, record['file']))
+            except OSError:
+                pass
+
+    def write(self, deltas):
+        """Write payloads and append the records of deltas; unchanged dialog states are skipped."""
+        os.makedirs(self.folder, exist_ok=True)
+        lines = []
+        records = []
+        written = []
+        try:
+            for delta in deltas:
+                if delta['op'] == 'state':
+                    text, arrays, digest = pack_state(delta['state'])
+                    if self.state_digests.get(delta['name']) == digest:
+                        continue
+                    delta = {'op': 'state', 'name': delta['name'], 'json': text, 'digest': digest,
+                             'arrays': arrays}
+                record = {key: value for key, value in delta.items() if key not in ['data', 'arrays', 'stamp']}
+                records.append(record)
+                if delta['op'] == 'dataset':
+                    data = unwrap(delta['data'])
+                    source = data_source(data)
+                    if source is not None:
+                        record['source'] = source
+                    else:
+                        record['file'] = self._payload('.npy')
+                        write_array(os.path.join(self.folder, record['file']), data)
+                elif delta['op'] == 'state' and delta['arrays']:
+                    record['file'] = self._payload('.npz')
+                    np.savez(os.path.join(self.folder, record['file']), **delta['arrays'])
+                lines.append(json.dumps(record) + '\n')
+                written.append(delta)
+            if not lines:
+                self.heartbeat()
+                return
+            with open(self.path, 'a', encoding='utf-8') as fp:
+                fp.writelines(lines)
+                fp.flush()
+                os.fsync(fp.fileno())
+        except BaseException:
+            # Nothing was journaled; the deltas are handed over again by the next changes
+            for record in records:
+                self._remove_payload(record)
+            raise
+        superseded = []
+        for record in records:
+            if record['op'] in ['dataset', 'remove']:
+                superseded.append(self.records.get(record['key']))
+            elif record['op'] == 'state':
+                superseded.append(self.state_records.get(record['name']))
+            self._apply(record)
+        self._commit(written)
+        # Payloads of superseded records are not needed for recovery any more
+        for record in superseded:
+            self._remove_payload(record)
+
+    def submit(self, deltas):
+        """Write deltas in the worker thread; returns a Future."""
+        if not deltas:
+            return self._executor.submit(self.heartbeat)
+        return self._executor.submit(self.write, deltas)
+
+    def heartbeat(self):
+        """Mark the journal as belonging to a live session."""
+        if os.path.exists(self.path):
+            os.utime(self.path)
+
+    def restore(self):
+        """Datasets, dialog states and main key recorded in the journal.
+
+        Payloads are memory-mapped and sources reopened lazily, so nothing
+        is recomputed. Restored datasets count as journaled.
+        """
+        datasets = {}
+        for key, record in self.records.items():
+            try:
+                if 'source' in record:
+                    data = open_source(record['source'])
+                else:
+                    data = np.load(os.path.join(self.folder, record['file']), mmap_mode='r')
+            except (OSError, ValueError, ImportError):
+                continue
+            if data is None:
+                continue
+            if 'attrs' in record:
+                data = Dataset.from_attrs(data, record['attrs'])
+            datasets[key] = data
+            self.tracker.remember(key, data)
+        states = {}
+        for name, record in self.state_records.items():
+            arrays = {}
+            if 'file' in record:
+                with np.load(os.path.join(self.folder, record['file'])) as npz:
+                    arrays = {path: npz[path] for path in npz.files}
+            states[name] = decode_state(json.loads(record['json']), arrays)
+        return datasets, states, self.recorded_main
+
+    def close(self, delete=True):
+        """Finish pending writes; a cleanly closed session deletes its journal."""
+        self._executor.shutdown(wait=True)
+        if delete:
+            shutil.rmtree(self.folder, ignore_errors=True)
@@ -11,6 +11,7 @@
 """
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     from PyQt6 import QtCore, QtWidgets, QtGui
@@ -32,6 +33,29 @@ from .peak_fit_dialog import PeakFitDialog
 from .image_dialog import ImageDialog
 from .atom_dialog import AtomDialog
 from .probe_dialog import ProbeDialog
+from .dataset_picker import DatasetPicker
+from .style import format_bytes
+from . import lazy_data
+from . import h5_index
+from .file_loader import FileLoader, LoadProgress, LoadCancelled
+from .save_dialog import H5SaveDialog
+from . import h5_writer
+from .session import Session, dialog_state, restore_dialog_state, save_as as save_session_as
+from . import autosave
+from . import formats
+from .recent_files import RecentFilesPanel
+from .watch_folder import LiveIngest
+from .dataset_store import DatasetStore
+from .dataset import DataType, wrap, unwrap
+from .dataset_events import DatasetEvents
+from .dataset_model import DatasetModel
+from .provenance import ProvenanceGraph
+from .history import History
+from .spectrum_plot import SpectrumCurve, spectrum_pyramid
+from .image_pyramid import ImagePyramid, TiledImageView, TILED_PIXELS
+from .si_view import SpectrumImageView
+from .redraw import RedrawScheduler
+from .display_levels import LevelStats
 
 # Full 118 Element Data 
 ELEMENT_DATA = {
@@ -106,28 +130,120 @@ class ImageView(pg.ImageView):
         for i in range(len(self.roiCurves)):
             self.roiCurves[i].setPen('black')
 
+    def quickMinMax(self, data):
+        # Estimate levels of file-backed data from a few frames only
+        if lazy_data.is_lazy(data):
+            data = lazy_data.sample_frames(data)
+        return super().quickMinMax(data)
+
 class BaseWidget(QtWidgets.QMainWindow):
+    # Error of an autosave write, emitted from the journal writer thread
+    autosave_failed = QtCore.pyqtSignal(str)
+    # Scratch file of a spilled dataset complete, emitted from the spill thread
+    spill_written = QtCore.pyqtSignal()
+
     def __init__(self, sidebar=[], filename=None):
         super().__init__()
         self.version = '2025-1-1'
         
         # KEY REPOSITORY FIXES
         self.dataset = None 
-        self.datasets = {}
+        self.datasets = DatasetStore()
+        self.dataset_events = DatasetEvents(self.datasets, self)
+        self.dataset_model = DatasetModel(self.datasets, self.dataset_events, self)
+        # Derived datasets remember how they were made; over budget they are dropped, not spilled
+        self.provenance = ProvenanceGraph(self.datasets, add=self.add_dataset)
+        self.datasets.evictor = self.provenance.evict
+        self.history = History(self.datasets, changed=self.mark_changed, too_large=self._undo_too_large)
+        # Plots are redrawn at most once per frame, however often they are asked for
+        self.redraw = RedrawScheduler(self)
+        self.redraw.add_layer('spectra', self.plot_spectra)
+        self.redraw.add_layer('spectrum_image', self.show_spectrum_image)
         self.add_spectrum = []
         
         self.main = ""
         self.tabCurrent = 1
         self.periodic_table = PeriodicTable(self)
         self.dir_name = os.getcwd()
+        self.lazy_loading = True
+        self.session = None
+        self.live_ingest = None
         
         self._init_ui()
         self._init_menus()
         self._init_dialogs()
         self._connect_pt_buttons()
+        self._init_loader()
+        self._init_autosave()
+        self._init_memory()
+        self.setAcceptDrops(True)
+
+    def _init_loader(self):
+        """Initialize background file loading."""
+        self.load_progress = {}
+        self.file_loader = FileLoader(self)
+        self.file_loader.progress.connect(self._load_progress)
+        self.file_loader.finished.connect(self._load_finished)
+        self.file_loader.failed.connect(self._load_failed)
+        self.file_loader.cancelled.connect(self._load_cancelled)
+        # Import slow readers (hyperspy) before the first file needs them
+        formats.prewarm()
+
+    def _init_autosave(self):
+        """Initialize the crash recovery journal, written at a fixed interval."""
+        self.journal = None
+        self.autosave_future = None
+        self.autosave_failed.connect(
+            lambda error: self.statusBar().showMessage(f"Autosave failed (retrying): {error}", 10000))
+        self.autosave_interval = autosave.AUTOSAVE_INTERVAL
+        self.autosave_timer = QtCore.QTimer(self)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.set_autosave_interval(self.autosave_interval)
+
+    def _init_memory(self):
+        """Initialize the status bar readout of the dataset memory and background spilling."""
+        # Datasets over the memory budget are written to scratch files off the GUI thread
+        self.datasets.executor = ThreadPoolExecutor(max_workers=1)
+        self.datasets.spill_done = self.spill_written.emit
+        self.spill_written.connect(self.datasets.finish_spills)
+        self.datasets.subscribe(self._dataset_spilled)
+        self.memory_label = QtWidgets.QLabel()
+        self.statusBar().addPermanentWidget(self.memory_label)
+        self.datasets.subscribe(lambda event, key: self.update_memory_label())
+        self.update_memory_label()
+
+    def _dataset_spilled(self, event, key):
+        """Show the memory map of the current dataset once it is spilled, so its array can be freed."""
+        if event != 'spilled' or key != self.main or self.dataset is not self.datasets.peek(key):
+            return
+        data = self.dataset
+        if data.has_cached('pyramid'):
+            pyramid = data.cached('pyramid', None)
+            pyramid.data = pyramid.levels[0] = data.array
+        if data.ndim >= 2 and data.data_type != DataType.SPECTRAL_IMAGE and not self.image_item.isHidden() \
+                and self.image_item.image is not None:
+            index = self.image_item.currentIndex
+            self.image_item.setImage(data.array, autoRange=False, autoLevels=False)
+            if data.ndim > 2:
+                self.image_item.setCurrentIndex(index)
+
+    def closeEvent(self, event):
+        """Stop running loading jobs before the window closes."""
+        self.stop_watching()
+        self.file_loader.cancel_all()
+        self.file_loader.wait(5000)
+        if self.session is not None:
+            self.session.close()
+        if self.journal is not None:
+            # Clean exit, nothing to recover
+            self.journal.close(delete=True)
+            self.journal = None
+        self.datasets.close()
+        self.datasets.executor.shutdown()
+        super().closeEvent(event)
 
     def _init_menus(self):
-        """Initialize menu bar with File and View menus."""
+        """Initialize menu bar with File, Edit and View menus."""
         menubar = self.menuBar()
         
         # File menu
@@ -147,6 +263,17 @@ class BaseWidget(QtWidgets.QMainWindow):
         open_action.triggered.connect(self.open_file)
         self.file_menu.addAction(open_action)
         
+        open_sequence_action = QtWidgets.QAction('Open Image Sequence', self)
+        open_sequence_action.setStatusTip('Open a folder of frames as image stack')
+        open_sequence_action.triggered.connect(self.open_image_sequence)
+        self.file_menu.addAction(open_sequence_action)
+        
+        # Live ingestion of files written by an acquisition
+        self.watch_action = QtWidgets.QAction('Watch Folder', self, checkable=True)
+        self.watch_action.setStatusTip('Add new frames and spectra written to a folder as they arrive')
+        self.watch_action.toggled.connect(self.toggle_watch_folder)
+        self.file_menu.addAction(self.watch_action)
+        
         save_action = QtWidgets.QAction('Save', self)
         save_action.setShortcut('Ctrl+S')
         save_action.triggered.connect(self.save_file)
@@ -160,11 +287,69 @@ class BaseWidget(QtWidgets.QMainWindow):
         
         self.file_menu.addSeparator()
         
+        # Session: all datasets and dialog states in one file
+        open_session_action = QtWidgets.QAction('Open Session', self)
+        open_session_action.setShortcut('Ctrl+Alt+O')
+        open_session_action.triggered.connect(lambda: self.open_session())
+        self.file_menu.addAction(open_session_action)
+        
+        save_session_action = QtWidgets.QAction('Save Session', self)
+        save_session_action.setShortcut('Ctrl+Alt+S')
+        save_session_action.setStatusTip('Save all datasets and analysis results; only changes are written')
+        save_session_action.triggered.connect(lambda: self.save_session())
+        self.file_menu.addAction(save_session_action)
+        
+        save_session_as_action = QtWidgets.QAction('Save Session As', self)
+        save_session_as_action.triggered.connect(lambda: self.save_session(new_file=True))
+        self.file_menu.addAction(save_session_as_action)
+        
+        self.file_menu.addSeparator()
+        
+        # Lazy loading toggle - keep large files on disk
+        self.lazy_action = QtWidgets.QAction('Lazy Loading', self, checkable=True)
+        self.lazy_action.setChecked(self.lazy_loading)
+        self.lazy_action.setStatusTip('Memory-map large files and read only the displayed slices')
+        self.lazy_action.toggled.connect(self.set_lazy_loading)
+        self.file_menu.addAction(self.lazy_action)
+        
+        autosave_action = QtWidgets.QAction('Autosave Interval...', self)
+        autosave_action.setStatusTip('Seconds between crash recovery autosaves')
+        autosave_action.triggered.connect(self.ask_autosave_interval)
+        self.file_menu.addAction(autosave_action)
+        
+        memory_action = QtWidgets.QAction('Memory Budget...', self)
+        memory_action.setStatusTip('Memory for datasets before the least recently used are moved to disk')
+        memory_action.triggered.connect(self.ask_memory_budget)
+        self.file_menu.addAction(memory_action)
+        
+        self.file_menu.addSeparator()
+        
         exit_action = QtWidgets.QAction('Exit', self)
         exit_action.setShortcut('Ctrl+Q')
         exit_action.triggered.connect(self.close)
         self.file_menu.addAction(exit_action)
         
+        # Edit menu: undo and redo of dataset changes
+        self.edit_menu = menubar.addMenu('Edit')
+        self.edit_menu.aboutToShow.connect(self.update_edit_menu)
+        
+        self.undo_action = QtWidgets.QAction('Undo', self)
+        self.undo_action.setShortcut('Ctrl+Z')
+        self.undo_action.triggered.connect(self.undo)
+        self.edit_menu.addAction(self.undo_action)
+        
+        self.redo_action = QtWidgets.QAction('Redo', self)
+        self.redo_action.setShortcut('Ctrl+Shift+Z')
+        self.redo_action.triggered.connect(self.redo)
+        self.edit_menu.addAction(self.redo_action)
+        
+        self.edit_menu.addSeparator()
+        
+        history_action = QtWidgets.QAction('Undo History Size...', self)
+        history_action.setStatusTip('Memory for undo data before the oldest steps are dropped')
+        history_action.triggered.connect(self.ask_history_size)
+        self.edit_menu.addAction(history_action)
+        
         # View menu
         self.view = menubar.addMenu('View')
         
@@ -186,6 +371,12 @@ class BaseWidget(QtWidgets.QMainWindow):
         self.calc_visible.toggled.connect(lambda checked: self.calculator_widget.setVisible(checked))
         self.view.addAction(self.calc_visible)
         
+        # Recent files toggle
+        self.recent_visible = QtWidgets.QAction('Recent Files', self, checkable=True)
+        self.recent_visible.setChecked(True)
+        self.recent_visible.toggled.connect(lambda checked: self.recent_widget.setVisible(checked))
+        self.view.addAction(self.recent_visible)
+        
         self.view.addSeparator()
         
         # Image group toggle
@@ -209,6 +400,13 @@ class BaseWidget(QtWidgets.QMainWindow):
         self.eds_visible.toggled.connect(self.visible_eds)
         self.view.addAction(self.eds_visible)
 
+        self.view.addSeparator()
+
+        timings_action = QtWidgets.QAction('Redraw Timings...', self)
+        timings_action.setStatusTip('Show how often and how long the plots were redrawn')
+        timings_action.triggered.connect(self.show_redraw_timings)
+        self.view.addAction(timings_action)
+
     def _init_dialogs(self):
         """Initialize all analysis dialogs."""
         # Info dialog
@@ -243,6 +441,10 @@ class BaseWidget(QtWidgets.QMainWindow):
         self.probe_dialog = ProbeDialog(self)
         self.probe_widget = self.add_sidebar(self.probe_dialog, "Probe")
         
+        # Recent files with cached previews
+        self.recent_files_panel = RecentFilesPanel(self)
+        self.recent_widget = self.add_sidebar(self.recent_files_panel, "Recent")
+        
         # Tabify dialogs on the left side
         self.tabifyDockWidget(self.data_widget, self.info_widget)
         self.tabifyDockWidget(self.info_widget, self.low_loss_widget)
@@ -252,6 +454,7 @@ class BaseWidget(QtWidgets.QMainWindow):
         self.tabifyDockWidget(self.eds_widget, self.image_widget)
         self.tabifyDockWidget(self.image_widget, self.atom_widget)
         self.tabifyDockWidget(self.atom_widget, self.probe_widget)
+        self.tabifyDockWidget(self.probe_widget, self.recent_widget)
         
         # Connect visibility to updates
         self.info_widget.visibilityChanged.connect(self.info_update)
@@ -331,14 +534,206 @@ class BaseWidget(QtWidgets.QMainWindow):
         if visible:
             self.probe_dialog.update_sidebar()
 
+    def set_lazy_loading(self, checked):
+        """Toggle memory-mapped/on-demand loading of files."""
+        self.lazy_loading = checked
+
+    def set_autosave_interval(self, seconds):
+        """Autosave every seconds; 0 switches autosave off."""
+        self.autosave_interval = int(seconds)
+        if self.autosave_interval > 0:
+            self.autosave_timer.start(1000 * self.autosave_interval)
+        else:
+            self.autosave_timer.stop()
+
+    def ask_autosave_interval(self):
+        """Let the user set the autosave interval."""
+        seconds, ok = QtWidgets.QInputDialog.getInt(
+            self, "Autosave", "Seconds between autosaves (0 = off):", self.autosave_interval, 0, 3600)
+        if ok:
+            self.set_autosave_interval(seconds)
+
+    def update_memory_label(self):
+        """Show the memory used by datasets and the data spilled to disk."""
+        text = f"Memory: {format_bytes(self.datasets.resident_bytes)}"
+        if self.datasets.spilled_bytes:
+            text += f", {format_bytes(self.datasets.spilled_bytes)} on disk"
+        self.memory_label.setText(text)
+        self.memory_label.setToolTip(f"Memory budget: {format_bytes(self.datasets.budget)}\n"
+                                     "Least recently used datasets beyond it are moved to scratch files")
+
+    def ask_memory_budget(self):
+        """Let the user set the memory budget of the datasets."""
+        gigabytes, ok = QtWidgets.QInputDialog.getDouble(
+            self, "Memory Budget", "GB of memory for datasets:", self.datasets.budget / 1024 ** 3, 0.1, 4096, 1)
+        if ok:
+            self.datasets.set_budget(gigabytes * 1024 ** 3)
+
+    def update_edit_menu(self):
+        """Name the steps that undo and redo would revert."""
+        self.undo_action.setEnabled(self.history.can_undo())
+        self.undo_action.setText(f"Undo {self.history.undo_text()}".strip())
+        self.redo_action.setEnabled(self.history.can_redo())
+        self.redo_action.setText(f"Redo {self.history.redo_text()}".strip())
+
+    def undo(self):
+        """Undo the last change of the datasets."""
+        description = self.history.undo()
+        if description is not None:
+            self.statusBar().showMessage(f"Undone: {description}", 5000)
+            self.set_dataset()
+            self.plot_update()
+
+    def redo(self):
+        """Redo the last undone change of the datasets."""
+        description = self.history.redo()
+        if description is not None:
+            self.statusBar().showMessage(f"Redone: {description}", 5000)
+            self.set_dataset()
+            self.plot_update()
+
+    def _undo_too_large(self, step):
+        """Tell the user that a change cannot be undone."""
+        self.statusBar().showMessage(
+            f"{step.description} cannot be undone: {format_bytes(step.nbytes)} is more than the undo history "
+            f"keeps ({format_bytes(self.history.max_bytes)}, see Edit > Undo History Size)", 10000)
+
+    def ask_history_size(self):
+        """Let the user set the memory cap of the undo history."""
+        megabytes, ok = QtWidgets.QInputDialog.getDouble(
+            self, "Undo History", f"MB of memory for undo data (now {format_bytes(self.history.nbytes)}):",
+            self.history.max_bytes / 1024 ** 2, 0, 1024 ** 2, 0)
+        if ok:
+            self.history.set_max_bytes(megabytes * 1024 ** 2)
+
+    def autosave(self):
+        """Hand changes since the last autosave to the journal writer thread.
+        
+        Only references are collected here; datasets and fit results are
+        packed and written in the background. While a write is still
+        running nothing new is handed over; changes of a failed write are
+        handed over again.
+        """
+        if self.journal is None:
+            if not self.datasets:
+                return
+            self.journal = autosave.Journal(autosave.new_journal_folder())
+        if self.autosave_future is not None and not self.autosave_future.done():
+            return self.autosave_future
+        deltas = self.journal.changes(self.datasets, self.session_states(), self.main)
+        self.autosave_future = self.journal.submit(deltas)
+        self.autosave_future.add_done_callback(self._autosave_done)
+        return self.autosave_future
+
+    def _autosave_done(self, future):
+        # Runs in the writer thread; the signal reaches the GUI thread
+        error = future.exception()
+        if error is not None:
+            self.autosave_failed.emit(str(error) or type(error).__name__)
+
+    def recover_autosave(self):
+        """Offer to restore a session that ended without closing the window."""
+        folders = autosave.crashed_journals()
+        if not folders:
+            return False
+        folder = folders[0]
+        journal = autosave.Journal(folder)
+        reply = QtWidgets.QMessageBox.question(
+            self,
+            "Recover Session",
+            f"A previous session did not end cleanly ({len(journal.records)} datasets).\n"
+            "Recover it? Otherwise the autosaved data are discarded.",
+            QtWidgets.QMessageBox.StandardButton.Yes | QtWidgets.QMessageBox.StandardButton.No
+            if hasattr(QtWidgets.QMessageBox, 'StandardButton')
+            else QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No
+        )
+        yes_button = QtWidgets.QMessageBox.StandardButton.Yes if hasattr(QtWidgets.QMessageBox, 'StandardButton') else QtWidgets.QMessageBox.Yes
+        if reply != yes_button:
+            journal.close(delete=True)
+            return False
+        return self.restore_journal(journal)
+
+    def restore_journal(self, journal):
+        """Restore datasets and dialog states from journal and keep journaling into it."""
+        datasets, states, main = journal.restore()
+        if self.journal is not None:
+            # Current datasets will be journaled again into the recovered journal
+            self.journal.close(delete=True)
+        self.journal = journal
+        self.autosave_future = None
+        for key, data in datasets.items():
+            self.add_dataset(key, data, show=key == main)
+        for dialog in self.session_dialogs():
+            if dialog.name in states:
+                restore_dialog_state(dialog, states[dialog.name])
+        self.provenance.restore(states.get('provenance', {}))
+        self.statusBar().showMessage(f"Recovered {len(datasets)} datasets", 10000)
+        return True
+
+    def get_displayed_image(self):
+        """Return the 2D frame currently shown in the Image tab."""
+        if self.tiled_view.isVisibleTo(self.plot3):
+            return self.tiled_view.visible_image()
+        image = self.image_item.image
+        if image is None:
+            return None
+        if self.image_item.axes.get('t') is not None:
+            image = image[self.image_item.currentIndex]
+        return np.asarray(image)
+
+    def display_stats(self):
+        """Histogram of the image shown in the Image tab, computed once per dataset version.
+
+        It is taken from a few frames or the coarsest pyramid level, not
+        from all the data.
+        """
+        if self.dataset is None or self.dataset.ndim < 2:
+            return None
+        if self.tiled_view.isVisibleTo(self.plot3) and self.tiled_view.pyramid is not None:
+            pyramid = self.tiled_view.pyramid
+            return self.dataset.cached('display_stats', lambda: LevelStats(pyramid.coarsest()), key='tiled')
+        return self.dataset.cached('display_stats', lambda: LevelStats(lazy_data.sample_frames(self.dataset.array)))
+
+    def set_display_levels(self, low, high):
+        """Set the levels of the Image tab; the image data are not sent again."""
+        if self.tiled_view.isVisibleTo(self.plot3):
+            self.tiled_view.set_levels((low, high))
+        else:
+            self.image_item.setLevels(low, high)
+
     def set_dataset(self):
         """Set the current dataset for the widget."""
         if self.main in self.datasets:
             self.dataset = self.datasets[self.main]
 
     def plot_update(self):
-        """Update the plot based on current dataset."""
-        pass
+        """Update the plot based on current dataset.
+
+        The plot is only marked for redrawing; any number of updates
+        until the next frame are drawn once.
+        """
+        if self.dataset is not None and self.dataset.ndim == 1:
+            self.redraw.request('spectra')
+        elif self.dataset is not None and self.dataset.data_type == DataType.SPECTRAL_IMAGE:
+            self.redraw.request('spectrum_image')
+
+    def show_redraw_timings(self):
+        """Show the number and duration of the redraws of each plot."""
+        QtWidgets.QMessageBox.information(self, "Redraw Timings", self.redraw.summary())
+
+    def plot_spectra(self):
+        """Plot the current spectrum and the spectra of add_spectrum.
+
+        Curves are drawn from min/max envelopes of the visible channels,
+        so long spectra and many overlays pan and zoom at screen speed.
+        """
+        self.plot_param_window.clear()
+        spectra = [self.dataset] + [self.datasets.peek(key) for key in self.add_spectrum if key != self.main]
+        for n, data in enumerate(spectra):
+            if data is None or data.ndim != 1:
+                continue
+            pen = 'b' if n == 0 else pg.intColor(n - 1, hues=max(len(spectra) - 1, 1))
+            self.plot_param_window.addItem(SpectrumCurve(spectrum_pyramid(data), pen=pen))
 
     def plot_additional_features(self, plt):
         """Adds additional features to the plot, as defined in the dialogs."""
@@ -587,14 +982,21 @@ class BaseWidget(QtWidgets.QMainWindow):
         
         self.plot2 = QtWidgets.QWidget()
         p2_lay = QtWidgets.QGridLayout(self.plot2)
-        self.si_plot = pg.PlotWidget()
-        p2_lay.addWidget(self.si_plot, 0, 0)
+        self.si_view = SpectrumImageView()
+        p2_lay.addWidget(self.si_view, 0, 0)
+        self.si_plot = self.si_view.spectrum_plot
         self.tab.addTab(self.plot2, 'Spectral Image')
 
         self.plot3 = QtWidgets.QWidget()
         p3_lay = QtWidgets.QVBoxLayout(self.plot3)
         self.image_item = ImageView()
         p3_lay.addWidget(self.image_item)
+        # Images too large for the image view are shown tile by tile
+        self.tiled_view = TiledImageView()
+        self.tiled_view.build_failed.connect(
+            lambda error: self.statusBar().showMessage(f"Zoom levels could not be built: {error}", 10000))
+        self.tiled_view.hide()
+        p3_lay.addWidget(self.tiled_view)
         self.tab.addTab(self.plot3, 'Image')
 
     def add_sidebar(self, widget, title=None, area=QtCore.Qt.DockWidgetArea.LeftDockWidgetArea):
@@ -625,7 +1027,7 @@ class BaseWidget(QtWidgets.QMainWindow):
             QtWidgets.QMessageBox.warning(self, "No Data", "No dataset to save.")
             return
             
-        file_path, _ = QtWidgets.QFileDialog.getSaveFileName(
+        file_path, selected_filter = QtWidgets.QFileDialog.getSaveFileName(
             self,
             "Save Dataset",
             self.dir_name,
@@ -640,125 +1042,413 @@ class BaseWidget(QtWidgets.QMainWindow):
                 elif file_path.endswith('.npz'):
                     np.savez(file_path, data=self.dataset)
                 else:
-                    # Default to npz for other extensions
-                    if not file_path.endswith('.npz'):
+                    # Default to HDF5 unless NumPy was selected
+                    if selected_filter.startswith('NumPy'):
                         file_path += '.npz'
-                    np.savez(file_path, data=self.dataset)
-                QtWidgets.QMessageBox.information(self, "Saved", f"Dataset saved to:\n{file_path}")
+                        np.savez(file_path, data=self.dataset)
+                    else:
+                        if not file_path.endswith(('.h5', '.hdf5')):
+                            file_path += '.h5'
+                        if not self.save_hdf5(file_path, {self.main or 'data': self.dataset}):
+                            return
+                self.statusBar().showMessage(f"Dataset saved to: {file_path}", 10000)
             except Exception as e:
                 QtWidgets.QMessageBox.critical(self, "Error", f"Failed to save file:\n{str(e)}")
     
+    def save_hdf5(self, file_path, datasets):
+        """Write datasets chunked and compressed, with the options chosen in H5SaveDialog.
+        
+        Data are streamed block by block, so lazy datasets are never fully in memory.
+        Returns False if the user cancelled.
+        """
+        options_dialog = H5SaveDialog(next(iter(datasets.values())), self)
+        accepted = QtWidgets.QDialog.DialogCode.Accepted if hasattr(QtWidgets.QDialog, 'DialogCode') else QtWidgets.QDialog.Accepted
+        if options_dialog.exec() != accepted:
+            return False
+        
+        progress_dialog = QtWidgets.QProgressDialog("Saving...", "Cancel", 0, 100, self)
+        progress_dialog.setMinimumDuration(500)
+        
+        def progress(fraction):
+            progress_dialog.setValue(int(100 * fraction))
+            QtWidgets.QApplication.processEvents()
+            if progress_dialog.wasCanceled():
+                raise LoadCancelled()
+        
+        try:
+            h5_writer.write_hdf5(file_path, datasets, progress=progress, **options_dialog.options())
+        except BaseException as e:
+            # Do not leave a partial file behind
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            if isinstance(e, LoadCancelled):
+                return False
+            raise
+        finally:
+            progress_dialog.close()
+        return True
+    
+    def session_dialogs(self):
+        """Dialogs whose state is stored with the session."""
+        return [self.info_dialog, self.low_loss_dialog, self.core_loss_dialog, self.eds_dialog,
+                self.peak_fit_dialog, self.image_dialog, self.atom_dialog, self.probe_dialog]
+    
+    def session_states(self):
+        """State of every session dialog by dialog name, and of the provenance graph."""
+        states = {dialog.name: dialog_state(dialog) for dialog in self.session_dialogs()}
+        states['provenance'] = self.provenance.state()
+        return states
+    
+    def mark_changed(self, key):
+        """Mark a dataset changed in place, so the next session save and autosave write it."""
+        if key in self.datasets:
+            self.datasets.notify_changed(key)
+        if self.session is not None:
+            self.session.mark_changed(key)
+        if self.journal is not None:
+            self.journal.mark_changed(key)
+    
+    def save_session(self, file_path=None, new_file=False):
+        """Save all datasets and dialog states into the session file.
+        
+        Only datasets that are new or changed since the last save are written.
+        The session file is compacted when saved as itself, or once most
+        of it is left unused by rewritten datasets.
+        Returns False if nothing was saved.
+        """
+        if file_path is None and (self.session is None or new_file):
+            file_path, _ = QtWidgets.QFileDialog.getSaveFileName(
+                self, "Save Session", self.dir_name, "Session Files (*.h5);;All Files (*)")
+            if not file_path:
+                return False
+            if not file_path.endswith(('.h5', '.hdf5')):
+                file_path += '.h5'
+        
+        progress_dialog = QtWidgets.QProgressDialog("Saving session...", "Cancel", 0, 100, self)
+        progress_dialog.setMinimumDuration(500)
+        
+        def progress(fraction):
+            progress_dialog.setValue(int(100 * fraction))
+            QtWidgets.QApplication.processEvents()
+            if progress_dialog.wasCanceled():
+                raise LoadCancelled()
+        
+        try:
+            if file_path is not None and (self.session is None or new_file
+                                          or self.session.file_path != file_path):
+                # The current session stays open until the new file is complete
+                self.session, written, unchanged = save_session_as(
+                    file_path, self.datasets, self.session_states(), self.main, progress=progress,
+                    source=self.session)
+                self.dir_name = os.path.dirname(file_path)
+            else:
+                written, unchanged = self.session.save(self.datasets, self.session_states(), self.main,
+                                                       progress=progress)
+                if self.session.needs_compacting():
+                    self.statusBar().showMessage("Compacting session file...")
+                    try:
+                        self.session, _, _ = save_session_as(
+                            self.session.file_path, self.datasets, self.session_states(), self.main,
+                            progress=progress, source=self.session)
+                    except LoadCancelled:
+                        # The session is saved, it is only not compacted
+                        pass
+        except LoadCancelled:
+            self.statusBar().showMessage("Saving session cancelled", 5000)
+            return False
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to save session:\n{str(e)}")
+            return False
+        finally:
+            progress_dialog.close()
+        self.setWindowTitle(f'pycrosGUI v{self.version} - {os.path.basename(self.session.file_path)}')
+        self.statusBar().showMessage(
+            f"Session saved: {len(written)} datasets written, {len(unchanged)} unchanged", 10000)
+        return True
+    
+    def open_session(self, file_path=None):
+        """Open a session file; its datasets are read lazily from the file."""
+        if file_path is None:
+            file_path, _ = QtWidgets.QFileDialog.getOpenFileName(
+                self, "Open Session", self.dir_name, "Session Files (*.h5);;All Files (*)")
+            if not file_path:
+                return False
+        try:
+            session = Session(file_path)
+            datasets, states, main = session.load()
+        except Exception as e:
+            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to open session:\n{str(e)}")
+            return False
+        if self.session is not None:
+            self.session.close()
+        self.session = session
+        self.dir_name = os.path.dirname(file_path)
+        
+        for key, data in datasets.items():
+            self.add_dataset(key, data, show=key == main)
+        for dialog in self.session_dialogs():
+            if dialog.name in states:
+                restore_dialog_state(dialog, states[dialog.name])
+        self.provenance.restore(states.get('provenance', {}))
+        self.setWindowTitle(f'pycrosGUI v{self.version} - {os.path.basename(file_path)}')
+        self.statusBar().showMessage(f"Session opened: {len(datasets)} datasets", 10000)
+        return True
+    
     def open_file(self):
-        """Open a data file (images, spectra, HDF5, etc.)."""
-        file_path, _ = QtWidgets.QFileDialog.getOpenFileName(
+        """Open data files (images, spectra, HDF5, etc.); several can be selected."""
+        file_paths, _ = QtWidgets.QFileDialog.getOpenFileNames(
             self,
-            "Open Data File",
+            "Open Data Files",
             self.dir_name,
-            "All Supported (*.h5 *.hdf5 *.npy *.npz *.tif *.tiff *.png *.jpg *.jpeg *.dm3 *.dm4);;"
-            "HDF5 Files (*.h5 *.hdf5);;"
-            "NumPy Files (*.npy *.npz);;"
-            "Image Files (*.tif *.tiff *.png *.jpg *.jpeg);;"
-            "Digital Micrograph (*.dm3 *.dm4);;"
-            "All Files (*)"
+            formats.file_filter()
         )
         
-        if file_path:
+        if file_paths:
             try:
-                self.dir_name = os.path.dirname(file_path)
-                self._load_file(file_path)
+                self.dir_name = os.path.dirname(file_paths[0])
+                self.load_files(file_paths)
             except Exception as e:
                 QtWidgets.QMessageBox.critical(self, "Error", f"Failed to open file:\n{str(e)}")
     
-    def _load_file(self, file_path):
-        """Load a file and add it to datasets."""
-        import os
-        filename = os.path.basename(file_path)
-        ext = os.path.splitext(file_path)[1].lower()
-        
-        data = None
-        data_name = filename
-        
-        if ext in ['.npy']:
-            data = np.load(file_path, allow_pickle=True)
-        elif ext in ['.npz']:
-            loaded = np.load(file_path, allow_pickle=True)
-            # Get the first array in the npz file
-            keys = list(loaded.keys())
-            if keys:
-                data = loaded[keys[0]]
-        elif ext in ['.tif', '.tiff', '.png', '.jpg', '.jpeg']:
-            # Load image using Qt
-            from PIL import Image
-            img = Image.open(file_path)
-            data = np.array(img)
-        elif ext in ['.h5', '.hdf5']:
-            # Try to load HDF5
-            try:
-                import h5py
-                with h5py.File(file_path, 'r') as f:
-                    # Get first dataset
-                    def get_first_dataset(group):
-                        for key in group.keys():
-                            item = group[key]
-                            if isinstance(item, h5py.Dataset):
-                                return np.array(item)
-                            elif isinstance(item, h5py.Group):
-                                result = get_first_dataset(item)
-                                if result is not None:
-                                    return result
-                        return None
-                    data = get_first_dataset(f)
-            except ImportError:
-                QtWidgets.QMessageBox.warning(self, "Missing Package", "h5py is required to open HDF5 files.\nInstall with: pip install h5py")
-                return
-        elif ext in ['.dm3', '.dm4']:
-            # Try to load Digital Micrograph files
-            try:
-                import hyperspy.api as hs
-                s = hs.load(file_path)
-                data = s.data
-            except ImportError:
-                QtWidgets.QMessageBox.warning(self, "Missing Package", "hyperspy is required to open DM files.\nInstall with: pip install hyperspy")
-                return
+    def open_image_sequence(self):
+        """Open a folder of image files as a streamed image stack."""
+        folder = QtWidgets.QFileDialog.getExistingDirectory(self, "Open Image Sequence", self.dir_name)
+        if folder:
+            self.dir_name = os.path.dirname(folder)
+            self.load_file(folder)
+    
+    def toggle_watch_folder(self, checked):
+        """Start watching a folder chosen by the user, or stop watching."""
+        if not checked:
+            self.stop_watching()
+            return
+        folder = QtWidgets.QFileDialog.getExistingDirectory(self, "Watch Folder", self.dir_name)
+        if folder:
+            self.watch_folder(folder)
+        else:
+            self.watch_action.setChecked(False)
+    
+    def watch_folder(self, folder):
+        """Ingest files written to folder from now on.
         
-        if data is not None:
-            # Add to datasets
-            self.datasets[data_name] = data
-            self.main = data_name
-            self.dataset = data
-            
-            # Update UI
-            self.update_DataDialog()
-            
-            # Display based on data dimensions
-            if data.ndim == 1:
-                # 1D spectrum
-                self.plot_param_window.clear()
-                self.plot_param_window.plot(data, pen='b')
-                self.tab.setCurrentIndex(0)  # Spectrum tab
-            elif data.ndim == 2:
-                # 2D image
-                self.image_item.setImage(data)
-                self.tab.setCurrentIndex(2)  # Image tab
-            elif data.ndim >= 3:
-                # Spectral image or 3D+ data
-                self.image_item.setImage(data)
-                self.tab.setCurrentIndex(2)
-            
-            # Update data dialog lists
-            if hasattr(self.data_dialog, 'spectrum_list') and data.ndim == 1:
-                if self.data_dialog.spectrum_list.item(0).text() == "None":
-                    self.data_dialog.spectrum_list.clear()
-                self.data_dialog.spectrum_list.addItem(data_name)
-            elif hasattr(self.data_dialog, 'image_list') and data.ndim >= 2:
-                if self.data_dialog.image_list.item(0).text() == "None":
-                    self.data_dialog.image_list.clear()
-                self.data_dialog.image_list.addItem(data_name)
-                
-            QtWidgets.QMessageBox.information(self, "Loaded", f"Loaded: {data_name}\nShape: {data.shape}")
+        Single frames are appended to a live image stack that is displayed
+        at its newest frame; other files are loaded in the background.
+        """
+        self.stop_watching()
+        self.live_ingest = LiveIngest(folder, self.load_files, lambda: self.datasets, parent=self)
+        self.live_ingest.frames_added.connect(self._live_frames)
+        self.watch_label = QtWidgets.QLabel(f"Watching {os.path.basename(os.path.normpath(folder))}")
+        self.statusBar().addPermanentWidget(self.watch_label)
+        self.watch_action.blockSignals(True)
+        self.watch_action.setChecked(True)
+        self.watch_action.blockSignals(False)
+    
+    def stop_watching(self):
+        """Stop the live ingestion of a watched folder."""
+        if self.live_ingest is None:
+            return
+        self.live_ingest.stop()
+        self.live_ingest.deleteLater()
+        self.live_ingest = None
+        self.statusBar().removeWidget(self.watch_label)
+        self.watch_label.deleteLater()
+        self.watch_action.blockSignals(True)
+        self.watch_action.setChecked(False)
+        self.watch_action.blockSignals(False)
+    
+    def _live_frames(self, key, stack):
+        """Show frames added to a live stack."""
+        if self.live_ingest is None:
+            return
+        if unwrap(self.datasets.get(key)) is not stack:
+            self.add_dataset(key, stack)
+        else:
+            if self.main == key:
+                self.image_item.setImage(stack, autoRange=False, autoLevels=False)
+                self.image_item.setCurrentIndex(stack.shape[0] - 1)
+            self.datasets.notify_changed(key)
+        n_frames = sum(stack.shape[0] for stack in self.live_ingest.stacks.values())
+        self.watch_label.setText(f"Watching {os.path.basename(os.path.normpath(self.live_ingest.folder))}: "
+                                 f"{n_frames} frames")
+    
+    def dragEnterEvent(self, event):
+        """Accept files dragged onto the window."""
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
         else:
+            event.ignore()
+    
+    def dropEvent(self, event):
+        """Load all files dropped onto the window."""
+        file_paths = [url.toLocalFile() for url in event.mimeData().urls() if url.isLocalFile()]
+        if file_paths:
+            event.acceptProposedAction()
+            self.load_files(file_paths)
+    
+    def load_file(self, file_path):
+        """Load a file in the background; the GUI stays responsive meanwhile."""
+        job_ids = self.load_files([file_path])
+        return job_ids[0] if job_ids else None
+    
+    def load_files(self, file_paths):
+        """Load several files concurrently in the background.
+        
+        Datasets are added as soon as each file is read; the first one is
+        displayed. For HDF5 files with several datasets the selection is
+        asked once per file structure and reused for the rest of the batch.
+        """
+        choices = {}
+        jobs = []
+        for file_path in file_paths:
+            kwargs = {'lazy': self.lazy_loading}
+            reader = formats.find_reader(file_path)
+            if reader is not None and reader.datasets:
+                kwargs['dataset_paths'] = self._pick_hdf5_datasets(file_path, choices)
+                if kwargs['dataset_paths'] is None:
+                    continue
+            jobs.append((self.file_loader.load(file_path, **kwargs), file_path))
+        if not jobs:
+            return []
+        progress = LoadProgress(jobs, self.file_loader, self)
+        self.statusBar().addPermanentWidget(progress)
+        for job_id, _ in jobs:
+            self.load_progress[job_id] = progress
+        return [job_id for job_id, _ in jobs]
+    
+    def _load_progress(self, job_id, percent):
+        if job_id in self.load_progress:
+            self.load_progress[job_id].set_progress(job_id, percent)
+    
+    def _end_load(self, job_id, loaded=True, file_path=None, error=None):
+        """Finish job_id; returns its progress widget.
+        
+        When the last job of a batch is done, the result is shown in the
+        status bar and the files that failed are listed in a message box.
+        """
+        progress = self.load_progress.pop(job_id, None)
+        if progress is not None:
+            progress.job_done(job_id, loaded, file_path, error)
+            if progress.is_done():
+                self.statusBar().removeWidget(progress)
+                progress.deleteLater()
+                if progress.n_jobs > 1:
+                    self.statusBar().showMessage(progress.summary(), 10000)
+                    if progress.failures:
+                        QtWidgets.QMessageBox.warning(
+                            self, "Load Failed",
+                            f"{progress.summary()}\n\n{progress.failure_report()}")
+        return progress
+    
+    def _load_finished(self, job_id, file_path, loaded):
+        progress = self.load_progress.get(job_id)
+        if progress is None or progress.n_jobs == 1:
+            self._end_load(job_id)
+            self._add_loaded(file_path, loaded)
+        elif not loaded:
+            self._end_load(job_id, loaded=False, file_path=file_path, error="no data found")
+        else:
+            # Stream batch results into the lists, display only the first one
+            self._add_loaded(file_path, loaded, show=progress.n_loaded == 0)
+            self._end_load(job_id)
+    
+    def _load_failed(self, job_id, file_path, message):
+        progress = self._end_load(job_id, loaded=False, file_path=file_path, error=message)
+        if progress is None or progress.n_jobs == 1:
+            QtWidgets.QMessageBox.critical(self, "Error", f"Failed to open file:\n{file_path}\n{message}")
+    
+    def _load_cancelled(self, job_id, file_path):
+        progress = self._end_load(job_id, loaded=False)
+        if progress is None or progress.n_jobs == 1:
+            self.statusBar().showMessage(f"Loading cancelled: {os.path.basename(file_path)}", 5000)
+    
+    def _add_loaded(self, file_path, loaded, show=True):
+        """Add the datasets read from file_path and notify the user."""
+        if loaded:
+            for key, data in loaded.items():
+                self.add_dataset(key, data, show=show)
+                self.dataset_model.set_source(key, file_path)
+                show = False
+            self.recent_files_panel.add_file(file_path)
+            info = ', '.join(f"{key} {data.shape}" for key, data in loaded.items())
+            self.statusBar().showMessage(f"Loaded: {info}", 10000)
+        elif show:
             QtWidgets.QMessageBox.warning(self, "Load Failed", f"Could not load data from:\n{file_path}")
     
+    def _pick_hdf5_datasets(self, file_path, choices=None):
+        """Index an HDF5 file and let the user pick datasets if there is a choice.
+        
+        If choices (a dict) is given, the selection is stored in it and reused
+        for files with the same datasets. Returns the selected dataset paths
+        or None if the user cancelled.
+        """
+        entries = h5_index.main_datasets(h5_index.index_hdf5(file_path))
+        if len(entries) <= 1:
+            return [entry['path'] for entry in entries]
+        structure = tuple(entry['path'] for entry in entries)
+        if choices is not None and structure in choices:
+            return choices[structure]
+        picker = DatasetPicker(entries, os.path.basename(file_path), self)
+        accepted = QtWidgets.QDialog.DialogCode.Accepted if hasattr(QtWidgets.QDialog, 'DialogCode') else QtWidgets.QDialog.Accepted
+        selected = picker.selected_paths() if picker.exec() == accepted else None
+        if choices is not None:
+            choices[structure] = selected
+        return selected
+    
+    def add_dataset(self, key, data, show=True):
+        """Add data to datasets; with show it becomes the current dataset and is displayed.
+        
+        Arrays are wrapped in a Dataset titled key; the views show its array.
+        """
+        data = wrap(data, title=key)
+        self.datasets[key] = data
+        if show:
+            self.main = key
+            self.dataset = data
+        
+        # Update UI
+        self.update_DataDialog()
+        
+        # Display based on data dimensions
+        if not show:
+            pass
+        elif data.ndim == 1:
+            # 1D spectrum
+            self.add_spectrum = []
+            self.redraw.request('spectra')
+            self.tab.setCurrentIndex(0)  # Spectrum tab
+        elif data.ndim == 2 and data.size > TILED_PIXELS:
+            # Gigapixel image, only the tiles in view are read
+            self.show_tiled(True)
+            self.tiled_view.set_pyramid(data.cached('pyramid', lambda: ImagePyramid(data)))
+            self.tab.setCurrentIndex(2)
+        elif data.ndim == 2:
+            # 2D image
+            self.show_tiled(False)
+            self.image_item.setImage(np.asarray(data.array))
+            self.tab.setCurrentIndex(2)  # Image tab
+        elif data.data_type == DataType.SPECTRAL_IMAGE:
+            # Navigator and spectra at cursor and ROI, read from the data as needed
+            self.redraw.request('spectrum_image')
+            self.tab.setCurrentIndex(1)  # Spectral Image tab
+        elif data.ndim >= 3:
+            # Image stack or 3D+ data, frames are read as they are shown
+            self.show_tiled(False)
+            self.image_item.setImage(data.array)
+            self.tab.setCurrentIndex(2)
+    
+    def show_spectrum_image(self):
+        """Show the current dataset in the Spectral Image tab; images of its size can be navigators."""
+        if self.dataset is None or self.dataset.data_type != DataType.SPECTRAL_IMAGE:
+            return
+        images = {key: self.datasets.peek(key) for key in self.datasets
+                  if key != self.main and self.datasets.peek(key).ndim == 2}
+        self.si_view.set_dataset(self.dataset, images)
+
+    def show_tiled(self, tiled):
+        """Show the tiled view instead of the image view in the Image tab, or the other way round."""
+        self.tiled_view.setVisible(tiled)
+        self.image_item.setVisible(not tiled)
+    
     def save_image(self):
         """Save the current plot or image view as an image file."""
         file_path, selected_filter = QtWidgets.QFileDialog.getSaveFileName(
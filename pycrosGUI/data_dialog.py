@@ -15,20 +15,8 @@ except ImportError:
     ShiftModifier = QtCore.Qt.ShiftModifier
     ControlModifier = QtCore.Qt.ControlModifier
 
-
-# Consistent color palette
-COLORS = {
-    'primary': '#3498db',
-    'primary_hover': '#2980b9',
-    'secondary': '#2c3e50',
-    'background': '#f8f9fa',
-    'text': '#2c3e50',
-    'text_light': '#7f8c8d',
-    'border': '#bdc3c7',
-    'success': '#27ae60',
-    'danger': '#e74c3c',
-    'warning': '#f39c12',
-}
+from .dataset_model import KEY_ROLE, THUMBNAIL_SIZE, DatasetFilter, category
+from .style import COLORS
 
 
 class DataDialog(QtWidgets.QWidget):
@@ -55,7 +43,7 @@ class DataDialog(QtWidgets.QWidget):
                 font-size: 12px;
                 padding: 5px 0;
             }}
-            QListWidget {{
+            QListView {{
                 background-color: white;
                 border: 1px solid {COLORS['border']};
                 border-radius: 6px;
@@ -63,15 +51,15 @@ class DataDialog(QtWidgets.QWidget):
                 color: {COLORS['text']};
                 font-size: 11px;
             }}
-            QListWidget::item {{
+            QListView::item {{
                 padding: 8px;
                 border-radius: 4px;
             }}
-            QListWidget::item:selected {{
+            QListView::item:selected {{
                 background-color: {COLORS['primary']};
                 color: white;
             }}
-            QListWidget::item:hover:!selected {{
+            QListView::item:hover:!selected {{
                 background-color: #ecf0f1;
             }}
             QPushButton {{
@@ -97,44 +85,24 @@ class DataDialog(QtWidgets.QWidget):
         layout.setSpacing(8)
         layout.setContentsMargins(10, 10, 10, 10)
 
-        # Spectral Data section
-        label = QtWidgets.QLabel("Spectral Data")
-        layout.addWidget(label)
-        
-        self.spectrum_list = QtWidgets.QListWidget()
-        self.spectrum_list.addItems(["None"])
-        self.spectrum_list.setMinimumHeight(80)
-        layout.addWidget(self.spectrum_list)
-        self.spectrum_list.itemClicked.connect(self.plot_update)
-
-        # Survey Data section
-        label = QtWidgets.QLabel("Survey Data")
-        layout.addWidget(label)
-        
-        self.survey_list = QtWidgets.QListWidget()
-        self.survey_list.addItems(["None"])
-        self.survey_list.setMinimumHeight(80)
-        layout.addWidget(self.survey_list)
-        self.survey_list.itemClicked.connect(self.plot_update)
-
-        # Image Data section
-        label = QtWidgets.QLabel("Image Data")
-        layout.addWidget(label)
-        
-        self.image_list = QtWidgets.QListWidget()
-        self.image_list.addItems(["None"])
-        self.image_list.setMinimumHeight(80)
-        layout.addWidget(self.image_list)
-        self.image_list.itemClicked.connect(self.plot_update)
-
-        # Structures section
-        label = QtWidgets.QLabel("Structures")
-        layout.addWidget(label)
-        
-        self.structure_list = QtWidgets.QListWidget()
-        self.structure_list.addItems(["None"])
-        self.structure_list.setMinimumHeight(80)
-        layout.addWidget(self.structure_list)
+        # Filter and sort, applied to all lists
+        filter_layout = QtWidgets.QHBoxLayout()
+        self.filter_edit = QtWidgets.QLineEdit()
+        self.filter_edit.setPlaceholderText("Filter")
+        self.filter_edit.setClearButtonEnabled(True)
+        self.filter_edit.textChanged.connect(self.set_filter)
+        filter_layout.addWidget(self.filter_edit)
+        self.sort_box = QtWidgets.QComboBox()
+        self.sort_box.addItems(["Loaded", "Name", "Size"])
+        self.sort_box.currentIndexChanged.connect(self.set_sort)
+        filter_layout.addWidget(self.sort_box)
+        layout.addLayout(filter_layout)
+
+        # One view per kind of data, all on the dataset model of the parent
+        self.spectrum_list = self._dataset_list(layout, "Spectral Data", 'Spectrum')
+        self.survey_list = self._dataset_list(layout, "Survey Data", 'Survey')
+        self.image_list = self._dataset_list(layout, "Image Data", 'Image')
+        self.structure_list = self._dataset_list(layout, "Structures", 'Structure')
 
         layout.addStretch()
 
@@ -182,21 +150,45 @@ class DataDialog(QtWidgets.QWidget):
         
         return layout
 
+    def _dataset_list(self, layout, title, kind):
+        """Labeled list of the datasets of one category (see dataset_model.category)."""
+        label = QtWidgets.QLabel(title)
+        layout.addWidget(label)
+
+        view = QtWidgets.QListView()
+        view.setModel(DatasetFilter(self.parent.dataset_model, lambda data: category(data) == kind, view))
+        view.setIconSize(QtCore.QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        view.setUniformItemSizes(True)
+        view.setMinimumHeight(80)
+        view.clicked.connect(self.plot_update)
+        layout.addWidget(view)
+        return view
+
+    def dataset_lists(self):
+        return [self.spectrum_list, self.survey_list, self.image_list, self.structure_list]
+
+    def set_filter(self, text):
+        """Show only datasets whose "key: title" contains text."""
+        for view in self.dataset_lists():
+            view.model().setFilterFixedString(text)
+
+    def set_sort(self, index):
+        """Sort the lists in load order, by name or by size (largest first)."""
+        for view in self.dataset_lists():
+            if index == 1:
+                view.model().sort(0, QtCore.Qt.SortOrder.AscendingOrder)
+            elif index == 2:
+                view.model().sort(3, QtCore.Qt.SortOrder.DescendingOrder)
+            else:
+                view.model().sort(-1)
+
     def update_sidebar(self):
         """Update the sidebar with the current dataset information."""
         pass
 
     def clear_all(self):
         """Clear all data from the dialog."""
-        self.parent.datasets = {}
-        self.spectrum_list.clear()
-        self.survey_list.clear()
-        self.image_list.clear()
-        self.structure_list.clear()
-        self.spectrum_list.addItem("None")
-        self.survey_list.addItem("None")
-        self.image_list.addItem("None")
-        self.structure_list.addItem("None")
+        self.parent.datasets.clear()
 
         self.parent.main = ""
 
@@ -211,35 +203,35 @@ class DataDialog(QtWidgets.QWidget):
         """Remove the selected item from the list."""
         pass
 
-    def plot_update(self, item):
-        """Update the plot based on the selected item."""
+    def plot_update(self, index):
+        """Update the plot based on the selected dataset."""
         modifiers = QtWidgets.QApplication.keyboardModifiers()
-        list_widget = item.listWidget()
+        key = index.data(KEY_ROLE)
+        if key is None:
+            return
         if self.parent.dataset is not None:
             if self.parent.dataset.data_type.name == 'SPECTRUM':
 
                 if modifiers == ShiftModifier:
-                    self.parent.add_spectrum.append(item.text().split(':')[0])
+                    self.parent.add_spectrum.append(key)
                     self.parent.plot_update()
                     return
 
         if modifiers == ControlModifier:
-            del self.parent.datasets[item.text().split(':')[0]]
-
-            row = list_widget.row(item)-1
-            list_widget.clear()
+            proxy = index.model()
+            view = next(view for view in self.dataset_lists() if view.model() is proxy)
+            row = max(0, index.row() - 1)
+            # Only the row of this dataset is removed, by the dataset model; undo puts it back
+            self.parent.history.remove(key)
 
             self.parent.update_DataDialog()
-            if list_widget.count() == 0:
-                list_widget.addItem("None")
+            if proxy.rowCount() == 0:
                 return
-            list_widget.setCurrentRow(row)
-        item = list_widget.currentItem()
-        if item.text() == "None":
-            return
+            view.setCurrentIndex(proxy.index(row, 0))
+            key = proxy.index(row, 0).data(KEY_ROLE)
 
         self.parent.add_spectrum = []
-        self.parent.main = item.text().split(':')[0]
+        self.parent.main = key
         self.parent.set_dataset()
         self.parent.plot_update()
         # self.parent.InfoDialog.updateInfo()
@@ -0,0 +1,226 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# dataset: Lightweight dataset wrapper with sidpy-style attributes.
+#       - Dataset: array (in memory or lazy) with title, data_type,
+#         modality, axes and metadata
+#       - Version counter bumped on in-place changes, used to
+#         invalidate cached results (FFT, previews) and to find
+#         datasets changed since the last save
+#
+#####################################################################
+"""
+import enum
+import json
+
+import numpy as np
+
+from . import lazy_data
+
+
+class DataType(enum.Enum):
+    """Kind of dataset, named as in sidpy."""
+    UNKNOWN = -1
+    SPECTRUM = 1
+    LINE_PLOT = 2
+    LINE_PLOT_FAMILY = 3
+    IMAGE = 4
+    IMAGE_MAP = 5
+    IMAGE_STACK = 6
+    SPECTRAL_IMAGE = 7
+    IMAGE_4D = 8
+    POINT_CLOUD = 9
+
+
+def guess_data_type(shape, axes=None):
+    """Data type from the shape (and the navigation flags of axes, if known).
+
+    Three-dimensional data whose last axis is the longest are taken as
+    spectrum images, other three-dimensional data as image stacks.
+    """
+    if axes and len(axes) == len(shape) and all('navigate' in axis for axis in axes):
+        signal = [axis for axis in axes if not axis['navigate']]
+        if len(shape) == 3:
+            return DataType.SPECTRAL_IMAGE if len(signal) == 1 else DataType.IMAGE_STACK
+        if len(shape) == 4 and len(signal) == 2:
+            return DataType.IMAGE_4D
+    if len(shape) == 1:
+        return DataType.SPECTRUM
+    if len(shape) == 2:
+        return DataType.IMAGE
+    if len(shape) == 3:
+        return DataType.SPECTRAL_IMAGE if shape[2] > max(shape[:2]) else DataType.IMAGE_STACK
+    if len(shape) == 4:
+        return DataType.IMAGE_4D
+    return DataType.UNKNOWN
+
+
+def _text(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return str(value)
+
+
+class Dataset:
+    """Array with the attributes the dialogs expect of a sidpy dataset.
+
+    ``array`` may be a numpy array or any lazy array of ``lazy_data``;
+    it is only read when the dataset is indexed. Writing through the
+    dataset (``dataset[...] = value``) bumps ``version``; code changing
+    ``array`` directly calls ``modified()``. ``version`` also follows
+    arrays that count their own changes (growing live stacks).
+    """
+
+    __slots__ = ('array', 'title', 'data_type', 'modality', 'axes', 'metadata', '_version', '_cache',
+                 '__weakref__')
+
+    def __init__(self, array, title='', data_type=None, modality='', axes=None, metadata=None):
+        self.array = array
+        self.title = title
+        if axes is None:
+            axes = list(getattr(array, 'axes', None) or [])
+        self.axes = axes
+        if data_type is None:
+            data_type = guess_data_type(array.shape, axes)
+        elif isinstance(data_type, str):
+            data_type = DataType[data_type] if data_type in DataType.__members__ else DataType.UNKNOWN
+        self.data_type = data_type
+        self.modality = modality
+        self.metadata = metadata if metadata is not None else {}
+        self._version = 0
+        self._cache = {}
+
+    def __repr__(self):
+        return f"Dataset({self.title!r}, {self.data_type.name}, shape={self.shape}, dtype={self.dtype})"
+
+    # Array interface, passed on to the backing array
+
+    @property
+    def shape(self):
+        return tuple(self.array.shape)
+
+    @property
+    def dtype(self):
+        return self.array.dtype
+
+    @property
+    def ndim(self):
+        return len(self.array.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.array.shape, dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    @property
+    def chunks(self):
+        return getattr(self.array, 'chunks', None)
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, key):
+        return self.array[key]
+
+    def __setitem__(self, key, value):
+        self.array[key] = value
+        self.modified()
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.array, dtype=dtype)
+
+    def transpose(self, *axes):
+        return self.array.transpose(*axes)
+
+    @property
+    def T(self):
+        return self.array.T
+
+    def min(self):
+        return self.array.min()
+
+    def max(self):
+        return self.array.max()
+
+    def iter_blocks(self, max_bytes=lazy_data.BLOCK_BYTES):
+        return lazy_data.iter_blocks(self.array, max_bytes)
+
+    # Versions and cached results
+
+    @property
+    def version(self):
+        return self._version + getattr(self.array, 'version', 0)
+
+    def modified(self):
+        """Mark the data changed in place; drops all cached results."""
+        self._version += 1
+        self._cache.clear()
+
+    def cached(self, name, compute, key=None):
+        """Result of compute(), kept until the data change or key differs.
+
+        One result is kept per name; key tells apart results of the same
+        kind for different parts of the data (e.g. the frame of an FFT).
+        """
+        entry = self._cache.get(name)
+        if entry is not None and entry[0] == self.version and entry[1] == key:
+            return entry[2]
+        value = compute()
+        self._cache[name] = (self.version, key, value)
+        return value
+
+    def has_cached(self, name, key=None):
+        """True if a result of name for key is kept for the present data."""
+        entry = self._cache.get(name)
+        return entry is not None and entry[0] == self.version and entry[1] == key
+
+    # Attributes as stored in HDF5 files and journals
+
+    @property
+    def attrs(self):
+        """Attributes as strings, for HDF5 attributes or JSON."""
+        return {'title': str(self.title), 'data_type': self.data_type.name, 'modality': str(self.modality),
+                'axes': json.dumps(self.axes, default=str), 'metadata': json.dumps(self.metadata, default=str)}
+
+    @classmethod
+    def from_attrs(cls, array, attrs):
+        """Dataset of array with the attributes read from a dict like ``attrs``."""
+        def load_json(name, default):
+            try:
+                value = json.loads(_text(attrs[name]))
+            except (KeyError, ValueError):
+                return default
+            return value if isinstance(value, type(default)) else default
+
+        data_type = attrs.get('data_type')
+        return cls(array, title=_text(attrs.get('title', '')),
+                   data_type=_text(data_type) if data_type is not None else None,
+                   modality=_text(attrs.get('modality', '')), axes=load_json('axes', []) or None,
+                   metadata=load_json('metadata', {}))
+
+
+def wrap(data, title=''):
+    """data as Dataset; datasets are returned as they are.
+
+    HDF5 datasets written by pycroscopy (or pycrosGUI) keep their
+    title, data_type and modality attributes.
+    """
+    if isinstance(data, Dataset):
+        return data
+    if isinstance(data, lazy_data.H5Array):
+        dataset = Dataset.from_attrs(data, data.attrs)
+        dataset.title = dataset.title or title
+        return dataset
+    return Dataset(data, title=title)
+
+
+def unwrap(data):
+    """Backing array of a Dataset, other data as they are."""
+    if isinstance(data, Dataset):
+        return data.array
+    return data
@@ -0,0 +1,46 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# dataset_events: Signals of added, removed and changed datasets.
+#       - DatasetEvents: Qt signals of the changes of a DatasetStore
+#       - Predicates of the datasets a dialog works on
+#
+#####################################################################
+"""
+try:
+    from PyQt6 import QtCore
+except ImportError:
+    from PyQt5 import QtCore
+
+
+class DatasetEvents(QtCore.QObject):
+    """Signals of the changes of parent.datasets, with the key of the dataset."""
+
+    added = QtCore.pyqtSignal(str)
+    removed = QtCore.pyqtSignal(str)
+    changed = QtCore.pyqtSignal(str)
+    cleared = QtCore.pyqtSignal()
+
+    def __init__(self, datasets, parent=None):
+        super().__init__(parent)
+        datasets.subscribe(self._emit)
+
+    def _emit(self, event, key):
+        if event == 'cleared':
+            self.cleared.emit()
+        elif event in ['added', 'removed', 'changed']:
+            getattr(self, event).emit(str(key))
+
+
+def is_spectrum(data):
+    return 'SPEC' in data.data_type.name
+
+
+def is_image(data):
+    return 'IMAGE' in data.data_type.name
+
+
+def is_eds_spectrum(data):
+    return is_spectrum(data) and getattr(data, 'modality', '') == 'EDS'
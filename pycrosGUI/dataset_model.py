@@ -0,0 +1,314 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# dataset_model: Item model of the datasets of a session.
+#       - DatasetModel: one row per dataset with name, shape, type and
+#         size columns; rows are found by key in O(1)
+#       - Thumbnails computed in the background when a row is first
+#         shown, and again only when its dataset changed; datasets as
+#         read from a file take them from the preview cache
+#       - DatasetFilter: sorted and filtered view of some datasets,
+#         shared by the lists of the Data dialog and the dialog combos
+#
+#####################################################################
+"""
+try:
+    from PyQt6 import QtCore
+except ImportError:
+    from PyQt5 import QtCore
+
+from . import preview_cache
+from .dataset import DataType
+from .recent_files import preview_icon, preview_tooltip
+from .style import format_bytes
+
+KEY_ROLE = QtCore.Qt.ItemDataRole.UserRole
+CATEGORY_ROLE = QtCore.Qt.ItemDataRole.UserRole + 1
+SORT_ROLE = QtCore.Qt.ItemDataRole.UserRole + 2
+
+COLUMNS = ['Dataset', 'Shape', 'Type', 'Size']
+THUMBNAIL_SIZE = 32
+
+
+def category(data):
+    """List of the Data dialog a dataset is shown in: 'Spectrum', 'Survey', 'Image' or 'Structure'.
+
+    Survey images are those whose metadata say so (``metadata['survey']``).
+    """
+    if data.data_type == DataType.POINT_CLOUD:
+        return 'Structure'
+    if data.ndim == 2 and getattr(data, 'metadata', {}).get('survey'):
+        return 'Survey'
+    return 'Spectrum' if data.ndim <= 1 else 'Image'
+
+
+def label(key, data):
+    """Text ``"key: title"`` of a dataset; just the key if the title adds nothing."""
+    title = str(getattr(data, 'title', '') or '')
+    return key if title in ['', key] else f"{key}: {title}"
+
+
+class ThumbnailSignals(QtCore.QObject):
+    """Signals of a thumbnail job: key, stamp and (preview, stats) or None."""
+    finished = QtCore.pyqtSignal(str, object, object)
+
+
+class ThumbnailTask(QtCore.QRunnable):
+    """Computes the preview of one dataset in a worker thread.
+
+    If source (file path, key in the file) is given, the preview cached
+    for it is used if the file did not change since.
+    """
+
+    def __init__(self, key, stamp, data, signals, source=None, data_type=None):
+        super().__init__()
+        self.key = key
+        self.stamp = stamp
+        self.data = data
+        self.signals = signals
+        self.source = source
+        self.data_type = data_type
+
+    def run(self):
+        try:
+            result = None
+            if self.source is not None:
+                result = preview_cache.cached_preview(*self.source, shape=self.data.shape)
+            if result is None:
+                result = preview_cache.make_preview(self.data, data_type=self.data_type)
+        except Exception:
+            result = None
+        self.signals.finished.emit(self.key, self.stamp, result)
+
+
+class DatasetModel(QtCore.QAbstractItemModel):
+    """Flat model of the datasets of a DatasetStore, in the order they were added.
+
+    The model follows the store through the signals of ``events``
+    (a DatasetEvents): only the row of an added, changed or removed
+    dataset is touched. Rows are looked up by key through a dict, and
+    the key of a row is returned by the ``KEY_ROLE`` data role, so no
+    code needs to parse the display text.
+    """
+
+    def __init__(self, datasets, events=None, parent=None):
+        super().__init__(parent)
+        self.datasets = datasets
+        self._keys = []
+        self._rows = {}
+        self._thumbnails = {}
+        self._pending = set()
+        # key: (stamp, file path, key in the file) of datasets as read from a file
+        self._sources = {}
+
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.signals = ThumbnailSignals()
+        self.signals.finished.connect(self._thumbnail_ready)
+
+        if events is not None:
+            events.added.connect(self.update_key)
+            events.changed.connect(self.update_key)
+            events.removed.connect(self.remove_key)
+            events.cleared.connect(self.refresh)
+        self.refresh()
+
+    # Lookup
+
+    def row_of(self, key):
+        """Row of key, -1 if there is no such dataset."""
+        return self._rows.get(key, -1)
+
+    def index_of(self, key, column=0):
+        row = self.row_of(key)
+        return self.index(row, column) if row >= 0 else QtCore.QModelIndex()
+
+    def key_at(self, row):
+        return self._keys[row]
+
+    def dataset_at(self, row):
+        return self.datasets.peek(self._keys[row])
+
+    # QAbstractItemModel
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        if parent.isValid() or not self.hasIndex(row, column, parent):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QtCore.QModelIndex()
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self._keys)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if (orientation == QtCore.Qt.Orientation.Horizontal and role == QtCore.Qt.ItemDataRole.DisplayRole
+                and 0 <= section < len(COLUMNS)):
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        key = self._keys[index.row()]
+        data = self.datasets.peek(key)
+        if data is None:
+            return None
+        column = index.column()
+        if role == KEY_ROLE:
+            return key
+        if role == CATEGORY_ROLE:
+            return category(data)
+        if role == QtCore.Qt.ItemDataRole.DisplayRole:
+            if column == 0:
+                return label(key, data)
+            if column == 1:
+                return ' x '.join(str(n) for n in data.shape)
+            if column == 2:
+                return str(data.dtype)
+            return format_bytes(data.nbytes)
+        if role == SORT_ROLE:
+            if column == 0:
+                return label(key, data).lower()
+            if column == 1:
+                return data.size
+            if column == 2:
+                return str(data.dtype)
+            return data.nbytes
+        if role == QtCore.Qt.ItemDataRole.DecorationRole and column == 0:
+            thumbnail = self._thumbnail(key, data)
+            return thumbnail[1] if thumbnail else None
+        if role == QtCore.Qt.ItemDataRole.ToolTipRole:
+            thumbnail = self._thumbnail(key, data)
+            if thumbnail:
+                return thumbnail[2]
+            return preview_tooltip(key, {'shape': data.shape, 'dtype': data.dtype, 'nbytes': data.nbytes})
+        return None
+
+    # Thumbnails
+
+    def set_source(self, key, file_path, file_key=None):
+        """Note that the dataset of key is as read from file_path (as file_key, default key).
+
+        Its thumbnail is then taken from the preview cache of the file,
+        as long as the dataset and the file do not change.
+        """
+        data = self.datasets.peek(key)
+        if data is not None:
+            self._sources[key] = ((id(data), getattr(data, 'version', 0)), file_path, file_key or key)
+
+    def _thumbnail(self, key, data):
+        """(stamp, icon, tooltip) of key; starts computing it if missing or out of date.
+
+        The stamp is the identity and version of the dataset. An out of
+        date thumbnail is shown until the new one is ready.
+        """
+        stamp = (id(data), getattr(data, 'version', 0))
+        thumbnail = self._thumbnails.get(key)
+        if (thumbnail is None or thumbnail[0] != stamp) and (key, stamp) not in self._pending:
+            self._pending.add((key, stamp))
+            source = self._sources.get(key)
+            source = source[1:] if source is not None and source[0] == stamp else None
+            self.pool.start(ThumbnailTask(key, stamp, getattr(data, 'array', data), self.signals, source,
+                                          getattr(data, 'data_type', None)))
+        return thumbnail
+
+    def _thumbnail_ready(self, key, stamp, result):
+        self._pending.discard((key, stamp))
+        row = self.row_of(key)
+        if row < 0 or result is None:
+            return
+        preview, stats = result
+        self._thumbnails[key] = (stamp, preview_icon(preview, THUMBNAIL_SIZE), preview_tooltip(key, stats))
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index, [QtCore.Qt.ItemDataRole.DecorationRole,
+                                             QtCore.Qt.ItemDataRole.ToolTipRole])
+
+    # Changes of the datasets
+
+    def update_key(self, key):
+        """Add the row of a new dataset or refresh the row of a changed one."""
+        if key not in self.datasets:
+            self.remove_key(key)
+            return
+        row = self.row_of(key)
+        if row < 0:
+            row = len(self._keys)
+            self.beginInsertRows(QtCore.QModelIndex(), row, row)
+            self._keys.append(key)
+            self._rows[key] = row
+            self.endInsertRows()
+        else:
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMNS) - 1))
+
+    def remove_key(self, key):
+        row = self.row_of(key)
+        if row < 0:
+            return
+        self.beginRemoveRows(QtCore.QModelIndex(), row, row)
+        del self._keys[row]
+        del self._rows[key]
+        for i in range(row, len(self._keys)):
+            self._rows[self._keys[i]] = i
+        self._thumbnails.pop(key, None)
+        self._sources.pop(key, None)
+        self.endRemoveRows()
+
+    def refresh(self):
+        """Rebuild all rows from the datasets."""
+        self.beginResetModel()
+        self._keys = list(self.datasets)
+        self._rows = {key: row for row, key in enumerate(self._keys)}
+        self._thumbnails = {}
+        self._sources = {key: source for key, source in self._sources.items() if key in self._rows}
+        self.endResetModel()
+
+
+class DatasetFilter(QtCore.QSortFilterProxyModel):
+    """Datasets of a DatasetModel accepted by ``accept(data)``.
+
+    Further filtered by the text set with ``setFilterFixedString`` (case
+    insensitive, on the ``"key: title"`` column) and sorted by any
+    column through ``sort``; ``sort(-1)`` restores the load order.
+    """
+
+    def __init__(self, model, accept=None, parent=None):
+        super().__init__(parent)
+        self.accept = accept
+        self.setSourceModel(model)
+        self.setDynamicSortFilter(True)
+        self.setSortRole(SORT_ROLE)
+        self.setFilterKeyColumn(0)
+        self.setFilterCaseSensitivity(QtCore.Qt.CaseSensitivity.CaseInsensitive)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.accept is not None:
+            data = self.sourceModel().dataset_at(source_row)
+            if data is None or not hasattr(data, 'data_type') or not self.accept(data):
+                return False
+        return super().filterAcceptsRow(source_row, source_parent)
+
+    def key_of(self, index):
+        return index.data(KEY_ROLE) if index.isValid() else None
+
+
+def set_combo_model(combo, parent, accept=None):
+    """Show the datasets of parent accepted by accept in a combo box; returns the DatasetFilter.
+
+    The combo box shows "None" if parent has no dataset model (dialogs
+    used on their own).
+    """
+    model = getattr(parent, 'dataset_model', None)
+    if model is None:
+        if combo.count() == 0:
+            combo.addItem("None")
+        return None
+    proxy = DatasetFilter(model, accept, combo)
+    combo.setModel(proxy)
+    return proxy
@@ -0,0 +1,116 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# DatasetPicker: Choose datasets of an HDF5/NSID file to load.
+#       - Lists all datasets of the file index
+#       - Shape, dtype, chunking and size without reading data
+#       - Multiple selection
+#
+#####################################################################
+"""
+try:
+    from PyQt6 import QtWidgets, QtCore
+except ImportError:
+    from PyQt5 import QtWidgets, QtCore
+
+from .style import COLORS, format_bytes
+
+
+class DatasetPicker(QtWidgets.QDialog):
+    """Dialog to pick one or more datasets from an HDF5 file index."""
+
+    COLUMNS = ['Dataset', 'Title', 'Shape', 'Type', 'Chunks', 'Size']
+
+    def __init__(self, entries, file_name='', parent=None):
+        super().__init__(parent)
+        self.entries = entries
+        self.show_dimensions = False
+
+        self.setWindowTitle(f"Select Datasets - {file_name}")
+        self.setMinimumSize(700, 400)
+
+        self._init_ui()
+        self._fill_tree()
+
+    def _init_ui(self):
+        """Initialize the user interface."""
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setSpacing(5)
+        layout.setContentsMargins(10, 10, 10, 10)
+
+        self.tree = QtWidgets.QTreeWidget()
+        self.tree.setHeaderLabels(self.COLUMNS)
+        self.tree.setRootIsDecorated(False)
+        self.tree.setSelectionMode(QtWidgets.QAbstractItemView.SelectionMode.ExtendedSelection)
+        self.tree.itemDoubleClicked.connect(self.accept)
+        layout.addWidget(self.tree)
+
+        self.dimension_box = QtWidgets.QCheckBox("Show dimension scales")
+        self.dimension_box.toggled.connect(self.set_show_dimensions)
+        layout.addWidget(self.dimension_box)
+
+        button_layout = QtWidgets.QHBoxLayout()
+        button_layout.addStretch()
+
+        ok_btn = QtWidgets.QPushButton("Load")
+        ok_btn.clicked.connect(self.accept)
+        ok_btn.setStyleSheet(f"""
+            QPushButton {{
+                background-color: {COLORS['success']};
+                color: white;
+                border: none;
+                border-radius: 4px;
+                padding: 8px 24px;
+                font-weight: bold;
+            }}
+        """)
+        button_layout.addWidget(ok_btn)
+
+        cancel_btn = QtWidgets.QPushButton("Cancel")
+        cancel_btn.clicked.connect(self.reject)
+        cancel_btn.setStyleSheet(f"""
+            QPushButton {{
+                background-color: {COLORS['danger']};
+                color: white;
+                border: none;
+                border-radius: 4px;
+                padding: 8px 16px;
+                font-weight: bold;
+            }}
+        """)
+        button_layout.addWidget(cancel_btn)
+        layout.addLayout(button_layout)
+
+    def _fill_tree(self):
+        """Fill the tree with the (visible) datasets of the index."""
+        self.tree.clear()
+        for entry in self.entries:
+            if entry['is_dimension'] and not self.show_dimensions:
+                continue
+            chunks = 'x'.join(str(n) for n in entry['chunks']) if entry['chunks'] else 'contiguous'
+            item = QtWidgets.QTreeWidgetItem([
+                entry['path'],
+                str(entry['title']),
+                ' x '.join(str(n) for n in entry['shape']),
+                entry['dtype'],
+                chunks,
+                format_bytes(entry['nbytes']),
+            ])
+            item.setData(0, QtCore.Qt.ItemDataRole.UserRole, entry['path'])
+            item.setToolTip(0, '\n'.join(f"{key}: {value}" for key, value in entry['attrs'].items()))
+            self.tree.addTopLevelItem(item)
+        for column in range(len(self.COLUMNS)):
+            self.tree.resizeColumnToContents(column)
+        if self.tree.topLevelItemCount() > 0:
+            self.tree.topLevelItem(0).setSelected(True)
+
+    def set_show_dimensions(self, checked):
+        """Show or hide the dimension scale datasets."""
+        self.show_dimensions = checked
+        self._fill_tree()
+
+    def selected_paths(self):
+        """HDF5 paths of the selected datasets."""
+        return [item.data(0, QtCore.Qt.ItemDataRole.UserRole) for item in self.tree.selectedItems()]
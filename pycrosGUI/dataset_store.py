@@ -0,0 +1,311 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# dataset_store: Datasets of a session within a memory budget.
+#       - DatasetStore: dict of datasets that spills the least recently
+#         used in-memory arrays to memory-mapped scratch files
+#       - Spilled data are paged back in by the OS when they are read
+#       - With an executor, scratch files are written in the background
+#         and the arrays swapped only once their file is complete
+#
+#####################################################################
+"""
+import os
+import shutil
+import tempfile
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+import numpy as np
+
+from . import lazy_data
+from .dataset import Dataset, unwrap
+
+
+def physical_memory():
+    """Physical memory of this machine in bytes (8 GB if unknown)."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return 8 * 1024 ** 3
+
+
+# Default memory budget: a quarter of the physical memory
+MEMORY_BUDGET = physical_memory() // 4
+
+
+def is_resident(data):
+    """True if data (or the array of a Dataset) is held in memory, not file-backed."""
+    data = unwrap(data)
+    return isinstance(data, np.ndarray) and not lazy_data.is_lazy(data)
+
+
+def unique_key(datasets, key, reusable=None):
+    """key, or the first of key_1, key_2, ... not in datasets (or for which reusable(candidate) is true)."""
+    candidate, n = key, 0
+    while candidate in datasets and not (reusable is not None and reusable(candidate)):
+        n += 1
+        candidate = f"{key}_{n}"
+    return candidate
+
+
+def write_scratch(file_path, data):
+    """Copy data block by block to a new .npy file; returns its memory map."""
+    spilled = np.lib.format.open_memmap(file_path, mode='w+', dtype=data.dtype, shape=data.shape)
+    try:
+        for sl, block in lazy_data.iter_blocks(data):
+            spilled[sl] = block
+        spilled.flush()
+        return spilled
+    except BaseException:
+        # Release the mapping before the file is removed
+        spilled = None
+        remove_file(file_path)
+        raise
+
+
+def remove_file(file_path):
+    try:
+        os.remove(file_path)
+    except OSError:
+        # Still mapped (Windows); removed with the scratch folder
+        pass
+
+
+class DatasetStore(MutableMapping):
+    """Dict of datasets that keeps in-memory arrays within a memory budget.
+
+    When the arrays held in memory exceed ``budget`` bytes, the least
+    recently used ones are written to scratch files in ``scratch_dir``
+    and replaced by memory maps of these files, which the OS pages back
+    in on access. File-backed (lazy) data do not count against the
+    budget. Of a Dataset only the array is replaced, so the dataset
+    keeps its identity and version. Reading ``store[key]`` marks a dataset as used; ``items()``,
+    ``values()`` and ``peek()`` do not.
+
+    ``evictor``, if set, is asked first with ``evictor(key)`` whether it
+    can release the array of key without a scratch file (results that
+    can be recomputed); it returns True if it did.
+
+    With an ``executor`` (e.g. a ThreadPoolExecutor) the scratch files
+    are written in its worker threads. The arrays stay in memory, and
+    are used, until ``finish_spills()`` swaps in the completed memory
+    maps; ``spill_done()``, if set, is called from the worker when a
+    file is complete, so the owner can call ``finish_spills`` in its
+    own thread. Data replaced or modified meanwhile are not swapped.
+
+    Callbacks registered with ``subscribe`` are called as
+    ``callback(event, key)`` with event 'added', 'removed', 'changed',
+    'spilled' or 'cleared' (key None).
+    """
+
+    def __init__(self, budget=None, scratch_dir=None, executor=None):
+        self.budget = MEMORY_BUDGET if budget is None else int(budget)
+        self.scratch_dir = scratch_dir
+        self._own_scratch_dir = False
+        self.executor = executor
+        self.evictor = None
+        self.spill_done = None
+        self._listeners = []
+        self._data = OrderedDict()
+        self._scratch_files = {}
+        # key: (future, array, version, file_path) of the spills being written
+        self._spilling = {}
+        self._counter = 0
+
+    def __getitem__(self, key):
+        data = self._data[key]
+        self._data.move_to_end(key)
+        return data
+
+    def __setitem__(self, key, data):
+        event = 'changed' if key in self._data else 'added'
+        self._remove_scratch(key)
+        self._data[key] = data
+        self._data.move_to_end(key)
+        self._notify(event, key)
+        for spilled in self.enforce_budget():
+            self._notify('spilled', spilled)
+
+    def __delitem__(self, key):
+        del self._data[key]
+        self._remove_scratch(key)
+        self._notify('removed', key)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return f"DatasetStore({len(self)} datasets, {self.resident_bytes} bytes in memory)"
+
+    def items(self):
+        return self._data.items()
+
+    def values(self):
+        return self._data.values()
+
+    def clear(self):
+        for key in set(self._scratch_files) | set(self._spilling):
+            self._remove_scratch(key)
+        self._data.clear()
+        self._notify('cleared', None)
+
+    def peek(self, key, default=None):
+        """Dataset of key (or default) without marking it used."""
+        return self._data.get(key, default)
+
+    def is_spilled(self, key):
+        return key in self._scratch_files
+
+    def is_spilling(self, key):
+        """True while the scratch file of key is written in the background."""
+        return key in self._spilling
+
+    @property
+    def resident_bytes(self):
+        """Bytes of the datasets held in memory."""
+        return sum(unwrap(data).nbytes for data in self._data.values() if is_resident(data))
+
+    @property
+    def spilled_bytes(self):
+        """Bytes of the datasets spilled to scratch files."""
+        return sum(unwrap(self._data[key]).nbytes for key in self._scratch_files)
+
+    def set_budget(self, budget):
+        """Change the memory budget; spills at once if it is exceeded."""
+        self.budget = int(budget)
+        for key in self.enforce_budget():
+            self._notify('spilled', key)
+
+    def enforce_budget(self):
+        """Spill (or evict) least recently used arrays until the budget is kept.
+
+        Returns the keys spilled or evicted at once; those spilled in
+        the background follow from ``finish_spills``.
+        """
+        resident = self.resident_bytes - sum(array.nbytes for _, array, _, _ in self._spilling.values())
+        spilled = []
+        for key in list(self._data):
+            if resident <= self.budget:
+                break
+            data = self._data[key]
+            array = unwrap(data)
+            if key in self._spilling or not is_resident(array) or array.dtype.hasobject \
+                    or not array.ndim or not array.size:
+                continue
+            if self.evictor is not None and self.evictor(key):
+                spilled.append(key)
+            elif self.executor is not None:
+                self._start_spill(key, data, array)
+            else:
+                file_path = self._scratch_path()
+                self._swap(key, write_scratch(file_path, array), file_path)
+                spilled.append(key)
+            resident -= array.nbytes
+        return spilled
+
+    def _start_spill(self, key, data, array):
+        file_path = self._scratch_path()
+        future = self.executor.submit(write_scratch, file_path, array)
+        self._spilling[key] = (future, array, getattr(data, 'version', None), file_path)
+        if self.spill_done is not None:
+            future.add_done_callback(lambda future: self.spill_done())
+
+    def finish_spills(self):
+        """Swap in the memory maps of the scratch files written in the background; returns their keys.
+
+        Data replaced or modified while their file was written stay in
+        memory and their file is deleted.
+        """
+        finished = []
+        for key, (future, array, version, file_path) in list(self._spilling.items()):
+            if not future.done():
+                continue
+            del self._spilling[key]
+            data = self._data.get(key)
+            if future.exception() is None and unwrap(data) is array and getattr(data, 'version', None) == version:
+                self._swap(key, future.result(), file_path)
+                finished.append(key)
+                self._notify('spilled', key)
+            else:
+                remove_file(file_path)
+        return finished
+
+    def wait_spills(self):
+        """Wait for the scratch files written in the background, then swap them in."""
+        for future, _, _, _ in list(self._spilling.values()):
+            future.exception()
+        return self.finish_spills()
+
+    def _swap(self, key, spilled, file_path):
+        data = self._data[key]
+        if isinstance(data, Dataset):
+            data.array = spilled
+        else:
+            self._data[key] = spilled
+        self._scratch_files[key] = file_path
+
+    def _scratch_path(self):
+        if self.scratch_dir is None:
+            self.scratch_dir = tempfile.mkdtemp(prefix='pycrosGUI-scratch-')
+            self._own_scratch_dir = True
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        self._counter += 1
+        return os.path.join(self.scratch_dir, f'{self._counter:06d}.npy')
+
+    def release_scratch(self, key):
+        """Hand over the scratch file of key: it is no longer deleted with its dataset.
+
+        Returns its path, None if the dataset of key is not spilled (a
+        spill still being written is given up).
+        """
+        self._cancel_spill(key)
+        return self._scratch_files.pop(key, None)
+
+    def adopt_scratch(self, key, file_path):
+        """Take file_path (handed over by release_scratch) as the scratch file of the dataset of key."""
+        self._remove_scratch(key)
+        self._scratch_files[key] = file_path
+
+    def _cancel_spill(self, key):
+        spilling = self._spilling.pop(key, None)
+        if spilling is not None:
+            future, _, _, file_path = spilling
+            future.cancel()
+            future.add_done_callback(lambda future: remove_file(file_path))
+
+    def _remove_scratch(self, key):
+        self._cancel_spill(key)
+        file_path = self._scratch_files.pop(key, None)
+        if file_path is not None:
+            remove_file(file_path)
+
+    def subscribe(self, callback):
+        """Call callback(event, key) after every change of the datasets."""
+        self._listeners.append(callback)
+
+    def notify_changed(self, key):
+        """Tell subscribers that the dataset of key changed in place."""
+        self._notify('changed', key)
+
+    def _notify(self, event, key):
+        for callback in self._listeners:
+            callback(event, key)
+
+    def close(self):
+        """Drop all datasets and delete the scratch files."""
+        futures = [future for future, _, _, _ in self._spilling.values()]
+        self.clear()
+        for future in futures:
+            if not future.cancelled():
+                future.exception()
+        if self._own_scratch_dir:
+            shutil.rmtree(self.scratch_dir, ignore_errors=True)
@@ -0,0 +1,69 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# display_levels: Contrast and brightness of displayed images.
+#       - LevelStats: histogram of a sample of an image, computed once;
+#         percentiles and auto levels are read from it
+#       - Contrast and brightness (0 to 100, 50 = auto levels) mapped to
+#         display levels, so changing them never touches the image data
+#
+#####################################################################
+"""
+import numpy as np
+
+HISTOGRAM_BINS = 1024
+# Percentiles of the auto levels
+AUTO_PERCENTILES = (0.5, 99.5)
+# Factor the display range narrows (contrast 100) or widens (contrast 0) by
+CONTRAST_RANGE = 4.0
+
+
+class LevelStats:
+    """Histogram of the finite values of an image (or a sample of it)."""
+
+    def __init__(self, sample, bins=HISTOGRAM_BINS):
+        values = np.asarray(sample, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if values.size:
+            self.minimum, self.maximum = float(values.min()), float(values.max())
+        else:
+            self.minimum, self.maximum = 0.0, 1.0
+        upper = self.maximum if self.maximum > self.minimum else self.minimum + 1.0
+        self.counts, self.edges = np.histogram(values, bins=bins, range=(self.minimum, upper))
+        self.cumulative = np.cumsum(self.counts)
+
+    def percentile(self, q):
+        """Value below which q percent of the values lie, interpolated within the bins."""
+        total = self.cumulative[-1] if len(self.cumulative) else 0
+        if not total:
+            return self.minimum
+        target = total * q / 100.0
+        i = int(np.searchsorted(self.cumulative, target))
+        i = min(i, len(self.counts) - 1)
+        below = self.cumulative[i - 1] if i else 0
+        fraction = (target - below) / self.counts[i] if self.counts[i] else 0.0
+        value = float(self.edges[i] + fraction * (self.edges[i + 1] - self.edges[i]))
+        return min(max(value, self.minimum), self.maximum)
+
+    @property
+    def auto_levels(self):
+        low, high = (self.percentile(q) for q in AUTO_PERCENTILES)
+        if high <= low:
+            low, high = self.minimum, self.maximum if self.maximum > self.minimum else self.minimum + 1.0
+        return low, high
+
+
+def contrast_levels(auto_levels, contrast=50, brightness=50):
+    """Display levels for contrast and brightness from 0 to 100; 50 and 50 give auto_levels.
+
+    Higher contrast narrows the range around its center (by up to
+    CONTRAST_RANGE times), higher brightness lowers the range (by up to
+    the width of auto_levels).
+    """
+    low, high = auto_levels
+    width = high - low
+    center = (low + high) / 2 - (brightness - 50) / 50.0 * width
+    half = width * CONTRAST_RANGE ** ((50 - contrast) / 50.0) / 2
+    return center - half, center + half
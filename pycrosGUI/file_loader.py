@@ -0,0 +1,290 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# file_loader: Reading data files off the GUI thread.
+#       - read_file: reads all supported formats into a dict of arrays
+#       - FileLoader: background loading with progress and cancellation
+#       - LoadProgress: status bar widget of one loading job
+#
+#####################################################################
+"""
+import os
+import threading
+
+try:
+    from PyQt6 import QtWidgets, QtCore
+except ImportError:
+    from PyQt5 import QtWidgets, QtCore
+
+import numpy as np
+
+from . import lazy_data
+from . import image_stack
+from . import formats
+from . import preview_cache
+
+
+class LoadCancelled(Exception):
+    """Raised inside a loading job when the user cancelled it."""
+    pass
+
+
+def _check(is_cancelled):
+    if is_cancelled is not None and is_cancelled():
+        raise LoadCancelled()
+
+
+def materialize(data, progress=None, is_cancelled=None):
+    """Read lazy data into memory block by block, reporting progress.
+
+    Blocks are read straight into the result where the format allows,
+    so the peak memory is about the size of the data.
+    """
+    if not lazy_data.is_lazy(data):
+        return data
+    out = np.empty(data.shape, dtype=data.dtype)
+    slices = lazy_data.block_slices(data, 0, data.shape[0]) if data.ndim else [Ellipsis]
+    for sl in slices:
+        _check(is_cancelled)
+        if isinstance(data, lazy_data.LazyArray):
+            data.read_into(out, sl)
+        else:
+            out[sl] = data[sl]
+        if progress is not None and data.ndim > 0:
+            progress(sl.stop / data.shape[0])
+    if isinstance(data, lazy_data.LazyArray):
+        data.close()
+    return out
+
+
+def read_file(file_path, lazy=True, dataset_paths=None, progress=None, is_cancelled=None):
+    """Read a data file with its registered reader and return a dict of dataset name to array.
+
+    With lazy loading the arrays stay on disk (memory-mapped or opened
+    on demand), otherwise they are read into memory. ``dataset_paths``
+    selects the datasets of an HDF5 file, by default the first is used.
+    A folder is read as a stack of its image files.
+    ``progress`` is called with the completed fraction and reading stops
+    with ``LoadCancelled`` as soon as ``is_cancelled()`` returns True.
+    """
+    filename = os.path.basename(os.path.normpath(file_path))
+
+    def report(fraction):
+        if progress is not None:
+            progress(fraction)
+
+    loaded = {}
+    _check(is_cancelled)
+
+    if os.path.isdir(file_path):
+        # Folder of frames, streamed as image stack
+        items = {'': image_stack.ImageSequence(file_path)}
+    else:
+        reader = formats.find_reader(file_path)
+        if reader is None:
+            raise ValueError(f"Unsupported file format: {filename}")
+        options = {'dataset_paths': dataset_paths} if reader.datasets else {}
+        items = reader.read(file_path, **options)
+        if not isinstance(items, dict):
+            items = {'': items}
+
+    items = {name: item for name, item in items.items() if item is not None}
+    for index, (name, item) in enumerate(items.items()):
+        _check(is_cancelled)
+        key = filename if len(items) == 1 else f"{filename}{name}"
+        if not lazy:
+            item = materialize(item, lambda f: report((index + f) / len(items)), is_cancelled)
+        loaded[key] = item
+    report(1.0)
+    return loaded
+
+
+class LoadSignals(QtCore.QObject):
+    """Signals of a loading job, delivered in the GUI thread."""
+    progress = QtCore.pyqtSignal(int, int)
+    finished = QtCore.pyqtSignal(int, str, dict)
+    failed = QtCore.pyqtSignal(int, str, str)
+    cancelled = QtCore.pyqtSignal(int, str)
+
+
+class LoadTask(QtCore.QRunnable):
+    """Reads one file in a worker thread of the FileLoader pool."""
+
+    def __init__(self, job_id, file_path, kwargs, signals):
+        super().__init__()
+        self.job_id = job_id
+        self.file_path = file_path
+        self.kwargs = kwargs
+        self.signals = signals
+        self.cancel_event = threading.Event()
+        self._last_percent = -1
+
+    def _progress(self, fraction):
+        percent = int(100 * fraction)
+        if percent != self._last_percent:
+            self._last_percent = percent
+            self.signals.progress.emit(self.job_id, percent)
+
+    def run(self):
+        try:
+            loaded = read_file(self.file_path, progress=self._progress,
+                               is_cancelled=self.cancel_event.is_set, **self.kwargs)
+        except LoadCancelled:
+            self.signals.cancelled.emit(self.job_id, self.file_path)
+        except Exception as e:
+            self.signals.failed.emit(self.job_id, self.file_path, str(e))
+        else:
+            if self.cancel_event.is_set():
+                self.signals.cancelled.emit(self.job_id, self.file_path)
+            else:
+                try:
+                    # Previews for the recent files, while still off the GUI thread
+                    preview_cache.store_previews(self.file_path, loaded)
+                except Exception:
+                    pass
+                self.signals.finished.emit(self.job_id, self.file_path, loaded)
+
+
+class FileLoader(QtCore.QObject):
+    """Loads files concurrently in a thread pool.
+
+    ``load`` returns a job id immediately; the result is delivered by
+    the ``finished``, ``failed`` or ``cancelled`` signal of the loader.
+    """
+
+    progress = QtCore.pyqtSignal(int, int)
+    finished = QtCore.pyqtSignal(int, str, dict)
+    failed = QtCore.pyqtSignal(int, str, str)
+    cancelled = QtCore.pyqtSignal(int, str)
+
+    def __init__(self, parent=None, max_threads=None):
+        super().__init__(parent)
+        self.pool = QtCore.QThreadPool(self)
+        if max_threads is not None:
+            self.pool.setMaxThreadCount(max_threads)
+        self.signals = LoadSignals()
+        self.signals.progress.connect(self.progress)
+        self.signals.finished.connect(self._done)
+        self.signals.failed.connect(self._done)
+        self.signals.cancelled.connect(self._done)
+        self.signals.finished.connect(self.finished)
+        self.signals.failed.connect(self.failed)
+        self.signals.cancelled.connect(self.cancelled)
+        self.tasks = {}
+        self._next_id = 0
+
+    def load(self, file_path, **kwargs):
+        """Start loading file_path; kwargs are passed on to read_file."""
+        self._next_id += 1
+        task = LoadTask(self._next_id, file_path, kwargs, self.signals)
+        task.setAutoDelete(False)
+        self.tasks[task.job_id] = task
+        self.pool.start(task)
+        return task.job_id
+
+    def _done(self, job_id, *args):
+        self.tasks.pop(job_id, None)
+
+    def cancel(self, job_id):
+        """Ask a running job to stop at the next block."""
+        if job_id in self.tasks:
+            self.tasks[job_id].cancel_event.set()
+
+    def cancel_all(self):
+        """Cancel all running jobs."""
+        for job_id in list(self.tasks):
+            self.cancel(job_id)
+
+    def active_jobs(self):
+        """Number of jobs that have not finished yet."""
+        return len(self.tasks)
+
+    def wait(self, msecs=-1):
+        """Block until all jobs are done."""
+        return self.pool.waitForDone(msecs)
+
+
+class LoadProgress(QtWidgets.QWidget):
+    """Status bar widget showing progress of a batch of loading jobs."""
+
+    def __init__(self, jobs, loader, parent=None):
+        super().__init__(parent)
+        self.percent = {job_id: 0 for job_id, _ in jobs}
+        self.n_jobs = len(jobs)
+        self.n_loaded = 0
+        self.n_cancelled = 0
+        # (file_path, message) of the jobs that failed or found no data
+        self.failures = []
+        self.name = os.path.basename(os.path.normpath(jobs[0][1]))
+
+        layout = QtWidgets.QHBoxLayout(self)
+        layout.setContentsMargins(2, 0, 2, 0)
+        layout.setSpacing(4)
+
+        self.label = QtWidgets.QLabel()
+        layout.addWidget(self.label)
+
+        self.bar = QtWidgets.QProgressBar()
+        self.bar.setRange(0, 100)
+        self.bar.setMaximumWidth(120)
+        self.bar.setMaximumHeight(14)
+        layout.addWidget(self.bar)
+
+        self.cancel_button = QtWidgets.QPushButton("Cancel")
+        self.cancel_button.setStyleSheet('QPushButton {padding: 2px 6px;}')
+        self.cancel_button.clicked.connect(lambda: [loader.cancel(job_id) for job_id in list(self.percent)])
+        layout.addWidget(self.cancel_button)
+        self._update()
+
+    def _update(self):
+        done = self.n_jobs - len(self.percent)
+        if self.n_jobs == 1:
+            self.label.setText(self.name)
+        else:
+            self.label.setText(f"Loading {done}/{self.n_jobs} files")
+        total = 100 * done + sum(self.percent.values())
+        self.bar.setValue(int(total / self.n_jobs))
+
+    def set_progress(self, job_id, percent):
+        """Update the progress of one job."""
+        if job_id in self.percent:
+            self.percent[job_id] = percent
+            self._update()
+
+    def job_done(self, job_id, loaded=True, file_path=None, error=None):
+        """Mark a job as finished.
+
+        A job that did not load is recorded as a failure if error is
+        given, else as cancelled.
+        """
+        if self.percent.pop(job_id, None) is not None:
+            if loaded:
+                self.n_loaded += 1
+            elif error is not None:
+                self.failures.append((file_path, error))
+            else:
+                self.n_cancelled += 1
+        self._update()
+
+    def is_done(self):
+        """True when all jobs of the batch are finished."""
+        return not self.percent
+
+    def summary(self):
+        """Short text describing the finished batch."""
+        text = f"Loaded {self.n_loaded} of {self.n_jobs} files"
+        details = []
+        if self.failures:
+            details.append(f"{len(self.failures)} failed")
+        if self.n_cancelled:
+            details.append(f"{self.n_cancelled} cancelled")
+        return f"{text} ({', '.join(details)})" if details else text
+
+    def failure_report(self, max_files=10):
+        """Text listing the failed files and their errors (at most max_files)."""
+        lines = [f"{os.path.basename(file_path)}: {message}" for file_path, message in self.failures[:max_files]]
+        if len(self.failures) > max_files:
+            lines.append(f"... and {len(self.failures) - max_files} more")
+        return '\n'.join(lines)
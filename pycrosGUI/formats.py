@@ -0,0 +1,203 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# formats: Registry of file format readers.
+#       - Readers register by extension and/or magic bytes; generic
+#         magic bytes (zip) can be confirmed by a sniff of the content
+#       - Reader modules and their packages are imported on first use
+#       - Slow imports (hyperspy) can be pre-warmed in the background
+#
+#####################################################################
+"""
+import importlib
+import os
+import threading
+import zipfile
+
+# Bytes read from the start of a file to sniff its format
+MAGIC_BYTES = 16
+
+
+class FormatReader:
+    """A file format and the function that reads it.
+
+    ``reader`` is a callable or a ``'module:function'`` string that is
+    imported when the first file is read. It is called as
+    ``reader(file_path, **options)`` and returns an array or a dict of
+    name to array; readers with ``lazy`` return data still on disk.
+    ``requires`` are modules that must be importable (e.g. 'hyperspy.api'),
+    ``package`` is the pip package to suggest if they are missing.
+    Readers with ``datasets`` let the user pick datasets of a file.
+    ``sniff`` is called as ``sniff(file_path)`` for files of an unknown
+    extension whose magic bytes match, and has to confirm the format.
+    """
+
+    def __init__(self, name, extensions=(), magic=(), reader=None, lazy=False, requires=(),
+                 package=None, datasets=False, prewarm=False, sniff=None):
+        self.name = name
+        self.extensions = [ext.lower() for ext in extensions]
+        self.magic = [bytes(m) for m in magic]
+        self.reader = reader
+        self.lazy = lazy
+        self.requires = [requires] if isinstance(requires, str) else list(requires)
+        self.package = package
+        self.datasets = datasets
+        self.prewarm = prewarm
+        self.sniff = sniff
+        self._function = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"FormatReader({self.name!r}, {self.extensions})"
+
+    def matches_magic(self, head, file_path=None):
+        if not any(head.startswith(m) for m in self.magic):
+            return False
+        return self.sniff is None or file_path is None or self.sniff(file_path)
+
+    @property
+    def is_loaded(self):
+        return self._function is not None
+
+    def load(self):
+        """Import the required packages and the reader function."""
+        with self._lock:
+            if self._function is None:
+                try:
+                    for module in self.requires:
+                        importlib.import_module(module)
+                except ImportError as err:
+                    package = self.package or self.requires[0].split('.')[0]
+                    raise ImportError(f"{package} is required to open {self.name} files.\n"
+                                      f"Install with: pip install {package}") from err
+                if callable(self.reader):
+                    self._function = self.reader
+                else:
+                    module, function = self.reader.split(':')
+                    self._function = getattr(importlib.import_module(module, __package__), function)
+            return self._function
+
+    def read(self, file_path, **options):
+        return self.load()(file_path, **options)
+
+
+_readers = []
+
+
+def register_reader(name, extensions=(), magic=(), reader=None, **kwargs):
+    """Register a reader; later registrations take precedence for the same extension."""
+    format_reader = FormatReader(name, extensions, magic, reader, **kwargs)
+    _readers.append(format_reader)
+    return format_reader
+
+
+def readers():
+    """All registered readers."""
+    return list(_readers)
+
+
+def find_reader(file_path):
+    """Reader for file_path by extension, or by magic bytes for unknown extensions."""
+    ext = os.path.splitext(file_path)[1].lower()
+    for format_reader in reversed(_readers):
+        if ext in format_reader.extensions:
+            return format_reader
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'rb') as fp:
+        head = fp.read(MAGIC_BYTES)
+    for format_reader in reversed(_readers):
+        if format_reader.matches_magic(head, file_path):
+            return format_reader
+    return None
+
+
+def file_filter():
+    """Filter string for file dialogs with all registered formats."""
+    filters = []
+    for format_reader in _readers:
+        patterns = ' '.join(f'*{ext}' for ext in format_reader.extensions)
+        if patterns:
+            filters.append(f"{format_reader.name} ({patterns})")
+    everything = ' '.join(f'*{ext}' for format_reader in _readers for ext in format_reader.extensions)
+    return ';;'.join([f"All Supported ({everything})"] + filters + ["All Files (*)"])
+
+
+def prewarm(names=None):
+    """Import slow readers in a background thread; returns the thread.
+
+    By default all readers registered with ``prewarm`` are imported;
+    missing packages are ignored here and reported when a file is read.
+    """
+    selected = [format_reader for format_reader in _readers
+                if (format_reader.name in names if names is not None else format_reader.prewarm)]
+
+    def run():
+        for format_reader in selected:
+            try:
+                format_reader.load()
+            except ImportError:
+                pass
+
+    thread = threading.Thread(target=run, name='prewarm', daemon=True)
+    thread.start()
+    return thread
+
+
+# Built-in readers
+
+def _is_npz(file_path):
+    """True if file_path is a zip archive with .npy members."""
+    try:
+        with zipfile.ZipFile(file_path) as archive:
+            return any(name.endswith('.npy') for name in archive.namelist())
+    except (OSError, zipfile.BadZipFile):
+        return False
+
+
+def _read_npz(file_path, **options):
+    from .lazy_data import open_npz
+    # All members, named like the datasets of an HDF5 file; they stay unread
+    return {f'/{key}': array for key, array in open_npz(file_path).items()}
+
+
+def _read_hdf5(file_path, dataset_paths=None, **options):
+    from .lazy_data import open_hdf5
+    return {path or '': open_hdf5(file_path, dataset_path=path) for path in (dataset_paths or [None])}
+
+
+def _read_image(file_path, **options):
+    from .image_stack import decode_image_file
+    return decode_image_file(file_path)
+
+
+def _read_dm(file_path, **options):
+    import hyperspy.api as hs
+    from .lazy_data import DaskArray, BLOCK_BYTES
+
+    # Opened lazily: the data stay memory-mapped in the file as dask array
+    signal = hs.load(file_path, lazy=True)
+    if isinstance(signal, list):
+        signal = signal[0]
+    data = signal.data
+    if data.ndim > 1:
+        # Strips of whole rows, so spectrum image chunks hold complete spectra
+        data = data.rechunk({0: 'auto', **{axis: -1 for axis in range(1, data.ndim)}},
+                            block_size_limit=BLOCK_BYTES)
+    axes = [{'name': str(axis.name), 'scale': float(axis.scale), 'offset': float(axis.offset),
+             'units': str(axis.units), 'navigate': bool(axis.navigate)}
+            for axis in sorted(signal.axes_manager._axes, key=lambda axis: axis.index_in_array)]
+    return DaskArray(data, axes, file_path)
+
+
+register_reader('NumPy', ['.npy'], [b'\x93NUMPY'], '.lazy_data:open_npy', lazy=True)
+register_reader('NumPy Archive', ['.npz'], [b'PK\x03\x04'], _read_npz, lazy=True, sniff=_is_npz)
+register_reader('HDF5', ['.h5', '.hdf5'], [b'\x89HDF\r\n\x1a\n'], _read_hdf5, lazy=True,
+                requires='h5py', datasets=True)
+register_reader('TIFF', ['.tif', '.tiff'], [b'II*\x00', b'MM\x00*', b'II+\x00', b'MM\x00+'],
+                '.image_stack:open_tiff', lazy=True)
+register_reader('Image', ['.png', '.jpg', '.jpeg'], [b'\x89PNG', b'\xff\xd8\xff'], _read_image)
+register_reader('DM', ['.dm3', '.dm4'], [b'\x00\x00\x00\x03', b'\x00\x00\x00\x04'], _read_dm, lazy=True,
+                requires=['hyperspy.api', 'dask.array'], package='hyperspy', prewarm=True)
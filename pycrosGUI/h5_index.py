@@ -0,0 +1,133 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# h5_index: Structure index of HDF5/NSID files.
+#       - Walks the file tree without reading any data
+#       - Shapes, dtypes, chunking and attributes of all datasets
+#       - Index cached per file (validated by mtime and size)
+#
+#####################################################################
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+# Attributes longer than this are not stored in the index
+MAX_ATTR_LENGTH = 256
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pycrosGUI', 'h5_index')
+
+_index_cache = {}
+
+
+def _file_signature(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _cache_file(file_path):
+    digest = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, digest + '.json')
+
+
+def _attr_value(value):
+    """Convert an HDF5 attribute into something JSON can store."""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    if isinstance(value, np.ndarray):
+        if value.size > MAX_ATTR_LENGTH:
+            return None
+        value = value.tolist()
+    elif isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, list):
+        return [_attr_value(v) for v in value]
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+
+def _build_index(file_path):
+    import h5py
+
+    entries = []
+
+    def visit(name, item):
+        if not isinstance(item, h5py.Dataset):
+            return
+        attrs = {}
+        for key, value in item.attrs.items():
+            try:
+                value = _attr_value(value)
+            except Exception:
+                continue
+            if value is not None and len(str(value)) <= MAX_ATTR_LENGTH:
+                attrs[key] = value
+        entries.append({
+            'path': '/' + name,
+            'shape': list(item.shape),
+            'dtype': str(item.dtype),
+            'chunks': list(item.chunks) if item.chunks else None,
+            'compression': item.compression,
+            'nbytes': int(item.size) * item.dtype.itemsize,
+            'title': attrs.get('title', ''),
+            'data_type': attrs.get('data_type', ''),
+            'is_dimension': attrs.get('CLASS') == 'DIMENSION_SCALE',
+            'attrs': attrs,
+        })
+
+    with h5py.File(file_path, 'r') as h5_file:
+        h5_file.visititems(visit)
+    return entries
+
+
+def index_hdf5(file_path, use_disk_cache=True):
+    """Index all datasets of an HDF5 file without reading their data.
+
+    Returns a list of dicts with path, shape, dtype, chunks, compression,
+    nbytes, title, data_type, is_dimension and attrs of each dataset.
+    The index is cached in memory and on disk and reused as long as the
+    modification time and size of the file are unchanged.
+    """
+    file_path = os.path.abspath(file_path)
+    signature = _file_signature(file_path)
+
+    cached = _index_cache.get(file_path)
+    if cached is not None and cached['signature'] == signature:
+        return cached['entries']
+
+    cache_file = _cache_file(file_path)
+    if use_disk_cache and os.path.exists(cache_file):
+        try:
+            with open(cache_file, 'r') as fp:
+                cached = json.load(fp)
+            if cached.get('signature') == signature:
+                _index_cache[file_path] = cached
+                return cached['entries']
+        except (OSError, ValueError):
+            pass
+
+    cached = {'file': file_path, 'signature': signature, 'entries': _build_index(file_path)}
+    _index_cache[file_path] = cached
+    if use_disk_cache:
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(cache_file, 'w') as fp:
+                json.dump(cached, fp)
+        except OSError:
+            pass
+    return cached['entries']
+
+
+def main_datasets(entries):
+    """Datasets of an index that are not dimension scales."""
+    return [entry for entry in entries if not entry['is_dimension']]
+
+
+def clear_cache():
+    """Forget all indexed files held in memory."""
+    _index_cache.clear()
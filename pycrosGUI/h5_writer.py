@@ -0,0 +1,170 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# h5_writer: Chunked, compressed HDF5 output.
+#       - Chunk shape guess suited to stacks and spectrum images
+#       - gzip/lzf compression with byte shuffle
+#       - Streams block by block out of lazy or memory-mapped data
+#       - Benchmark of write speed and compression ratio per codec
+#
+#####################################################################
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from . import lazy_data
+from .dataset import Dataset, unwrap
+
+# Target size of one chunk
+CHUNK_BYTES = 1024 * 1024
+
+# (name, compression, compression_opts, shuffle) tried by benchmark_codecs
+CODECS = [
+    ('none', None, None, False),
+    ('lzf', 'lzf', None, False),
+    ('lzf+shuffle', 'lzf', None, True),
+    ('gzip-1+shuffle', 'gzip', 1, True),
+    ('gzip-4+shuffle', 'gzip', 4, True),
+    ('gzip-9+shuffle', 'gzip', 9, True),
+]
+
+
+def guess_chunks(shape, dtype, target_bytes=CHUNK_BYTES):
+    """Chunk shape of about target_bytes.
+
+    Axes are halved from the first to the last, so image stacks get
+    whole frames and spectrum images get strips of complete spectra.
+    """
+    chunks = [int(n) for n in shape]
+    if not chunks:
+        return None
+    itemsize = np.dtype(dtype).itemsize
+    axis = 0
+    while int(np.prod(chunks)) * itemsize > target_bytes and axis < len(chunks):
+        if chunks[axis] > 1:
+            chunks[axis] = (chunks[axis] + 1) // 2
+        else:
+            axis += 1
+    return tuple(chunks)
+
+
+def _block_bytes(chunks, shape, dtype):
+    """Block size on the first axis that is a whole number of chunks."""
+    row_bytes = max(1, int(np.prod(shape[1:])) * np.dtype(dtype).itemsize)
+    rows = max(1, lazy_data.BLOCK_BYTES // row_bytes)
+    if chunks:
+        rows = max(chunks[0], rows - rows % chunks[0])
+    return rows * row_bytes
+
+
+def write_dataset(group, name, data, chunks=None, compression='gzip', compression_opts=4,
+                  shuffle=True, progress=None):
+    """Write data into group[name] block by block.
+
+    Data may be a numpy array, a memory-mapped array or a lazy array;
+    only one block at a time is held in memory.
+    """
+    shape, dtype = tuple(data.shape), data.dtype
+    if len(shape) == 0:
+        return group.create_dataset(name, data=np.asarray(data))
+    if chunks is None or chunks is True:
+        chunks = guess_chunks(shape, dtype)
+    if compression is None:
+        compression_opts = None
+        shuffle = False
+    elif compression == 'lzf':
+        compression_opts = None
+    dataset = group.create_dataset(name, shape=shape, dtype=dtype, chunks=chunks,
+                                   compression=compression, compression_opts=compression_opts,
+                                   shuffle=shuffle)
+    return overwrite_dataset(dataset, data, progress)
+
+
+def overwrite_dataset(dataset, data, progress=None):
+    """Write data block by block into an existing dataset of the same shape and dtype."""
+    shape = tuple(dataset.shape)
+    if tuple(data.shape) != shape or data.dtype != dataset.dtype:
+        raise ValueError(f"Can not write {data.dtype} data of shape {tuple(data.shape)} "
+                         f"into a {dataset.dtype} dataset of shape {shape}")
+    if len(shape) == 0:
+        dataset[()] = np.asarray(data)
+        return dataset
+    for sl, block in lazy_data.iter_blocks(data, _block_bytes(dataset.chunks, shape, dataset.dtype)):
+        dataset[sl] = block
+        if progress is not None:
+            progress(sl.stop / shape[0])
+    return dataset
+
+
+def write_hdf5(file_path, datasets, progress=None, **kwargs):
+    """Write a dict of arrays into a new HDF5 file.
+
+    Each dataset goes into its own channel group
+    (``/Measurement_000/Channel_000/<name>``) with the attributes of a
+    Dataset; the title defaults to its name.
+    kwargs (chunks, compression, compression_opts, shuffle) are passed
+    on to write_dataset.
+    """
+    import h5py
+
+    total = sum(max(1, data.nbytes) for data in datasets.values())
+    written = 0
+    with h5py.File(file_path, 'w') as h5_file:
+        measurement = h5_file.create_group('Measurement_000')
+        for index, (key, data) in enumerate(datasets.items()):
+            channel = measurement.create_group(f'Channel_{index:03d}')
+            name = str(key).replace('/', '_')
+
+            def report(fraction, done=written, size=max(1, data.nbytes)):
+                if progress is not None:
+                    progress((done + fraction * size) / total)
+
+            dataset = write_dataset(channel, name, unwrap(data), progress=report, **kwargs)
+            if isinstance(data, Dataset):
+                dataset.attrs.update(data.attrs)
+            dataset.attrs['title'] = str(getattr(data, 'title', '') or key)
+            written += max(1, data.nbytes)
+
+
+def _sample(data, max_bytes):
+    """First rows of data, up to max_bytes."""
+    if data.ndim == 0 or data.nbytes <= max_bytes:
+        return np.asarray(data[...]) if data.ndim else np.asarray(data)
+    row_bytes = max(1, data.nbytes // data.shape[0])
+    return np.asarray(data[:max(1, max_bytes // row_bytes)])
+
+
+def benchmark_codecs(data, codecs=CODECS, sample_bytes=64 * 1024 * 1024, chunks=None):
+    """Write speed and compression ratio of each codec on (a sample of) data.
+
+    Returns a list of dicts with name, seconds, mb_per_s and ratio.
+    """
+    import h5py
+
+    sample = _sample(data, sample_bytes)
+    if chunks is not None and chunks is not True and sample.ndim:
+        # The sample may have fewer rows than a chunk of the whole dataset
+        chunks = tuple(max(1, min(c, n)) for c, n in zip(chunks, sample.shape))
+    results = []
+    with tempfile.TemporaryDirectory() as folder:
+        for name, compression, compression_opts, shuffle in codecs:
+            file_path = os.path.join(folder, f'{name}.h5')
+            start = time.perf_counter()
+            with h5py.File(file_path, 'w') as h5_file:
+                dataset = write_dataset(h5_file, 'data', sample, chunks=chunks, compression=compression,
+                                        compression_opts=compression_opts, shuffle=shuffle)
+                h5_file.flush()
+                stored = dataset.id.get_storage_size()
+            seconds = max(time.perf_counter() - start, 1e-9)
+            results.append({
+                'name': name,
+                'seconds': seconds,
+                'mb_per_s': sample.nbytes / seconds / 1e6,
+                'ratio': sample.nbytes / max(1, stored),
+            })
+    return results
@@ -0,0 +1,255 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# history: Undo and redo of changes to datasets.
+#       - In-place changes keep copies of only the chunks they modify
+#         (copy on write); undo swaps them back, so redo costs nothing
+#         extra
+#       - Replaced and removed datasets are kept by reference, spilled
+#         ones together with their scratch file
+#       - Oldest steps are dropped when the history exceeds its
+#         memory cap
+#
+#####################################################################
+"""
+from contextlib import contextmanager
+
+import numpy as np
+
+from . import lazy_data
+from .dataset import unwrap
+from .dataset_store import is_resident, remove_file
+
+# Memory for undo and redo data before the oldest steps are dropped
+HISTORY_BYTES = 512 * 1024 ** 2
+# Size of the chunks (along the first axis) copied before they are changed
+CHUNK_BYTES = 1024 ** 2
+
+
+def chunk_slices(data, region=Ellipsis, max_bytes=CHUNK_BYTES):
+    """Chunks of data (slices of the first axis) that a write to region touches.
+
+    Chunks are aligned to the HDF5 chunks of data, if it has any;
+    indices other than integers and slices (masks, fancy indices) touch
+    every chunk.
+    """
+    if not data.ndim:
+        return [Ellipsis]
+    chunks = list(lazy_data.block_slices(data, 0, data.shape[0], max_bytes))
+    try:
+        first = lazy_data.expand_key(region, data.ndim)[0]
+    except IndexError:
+        return chunks
+    rows = np.arange(data.shape[0])[first]
+    starts = np.array([sl.start for sl in chunks])
+    touched = np.unique(np.searchsorted(starts, np.atleast_1d(rows), side='right') - 1)
+    return [chunks[i] for i in touched]
+
+
+def is_writable(data):
+    """True if data can be changed in place (not a read-only memory map or a lazy array)."""
+    array = unwrap(data)
+    if isinstance(array, np.ndarray):
+        return array.flags.writeable
+    return hasattr(array, '__setitem__') and not lazy_data.is_lazy(array)
+
+
+class Step:
+    """One undoable change: saved chunks of changed datasets, replaced datasets.
+
+    ``chunks`` holds [dataset, slice, block] entries, ``replaced`` holds
+    [key, dataset, scratch] entries (dataset None for a key that did not
+    exist; scratch the file of a spilled dataset, owned by the step
+    while the dataset is out of the store). Undo and redo swap the saved
+    and the present contents. ``nbytes`` counts the saved chunks and the
+    replaced datasets held in memory or in scratch files.
+    """
+
+    __slots__ = ('description', 'chunks', 'replaced')
+
+    def __init__(self, description):
+        self.description = description
+        self.chunks = []
+        self.replaced = []
+
+    @property
+    def nbytes(self):
+        return (sum(block.nbytes for _, _, block in self.chunks)
+                + sum(data.nbytes for _, data, scratch in self.replaced
+                      if data is not None and (scratch is not None or is_resident(data))))
+
+    def discard(self):
+        """Delete the scratch files the step owns."""
+        for entry in self.replaced:
+            if entry[2] is not None:
+                remove_file(entry[2])
+                entry[2] = None
+
+
+class History:
+    """Undo and redo stacks of the changes to ``datasets`` (a DatasetStore).
+
+    Changes made through ``modify``, ``apply``, ``replace`` and ``remove``
+    can be undone. ``changed(key)`` is called for every dataset changed
+    in place (by default ``datasets.notify_changed``). When undo and redo
+    data exceed ``max_bytes``, the oldest steps are dropped; a single
+    change larger than that is not kept at all, and ``too_large(step)``
+    is called to tell the user.
+    """
+
+    def __init__(self, datasets, max_bytes=HISTORY_BYTES, changed=None, too_large=None):
+        self.datasets = datasets
+        self.max_bytes = int(max_bytes)
+        self.changed = changed if changed is not None else datasets.notify_changed
+        self.too_large = too_large
+        self.undo_steps = []
+        self.redo_steps = []
+        datasets.subscribe(self._dataset_event)
+
+    def _dataset_event(self, event, key):
+        if event == 'cleared':
+            self.clear()
+
+    def clear(self):
+        for step in self.undo_steps + self.redo_steps:
+            step.discard()
+        self.undo_steps = []
+        self.redo_steps = []
+
+    @property
+    def nbytes(self):
+        return sum(step.nbytes for step in self.undo_steps + self.redo_steps)
+
+    def can_undo(self):
+        return bool(self.undo_steps)
+
+    def can_redo(self):
+        return bool(self.redo_steps)
+
+    def undo_text(self):
+        return self.undo_steps[-1].description if self.undo_steps else ''
+
+    def redo_text(self):
+        return self.redo_steps[-1].description if self.redo_steps else ''
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = int(max_bytes)
+        self._trim()
+
+    # Recording changes
+
+    @contextmanager
+    def modify(self, key, region=Ellipsis, description=''):
+        """Context giving the dataset of key, to be changed in place within region.
+
+        The chunks region touches are copied before the change::
+
+            with history.modify(key, np.s_[10:20], 'Zero rows') as data:
+                data[10:20] = 0
+
+        Raises ValueError, before anything is recorded, if the dataset
+        is read-only (e.g. read lazily from its file).
+        """
+        data = self.datasets.peek(key)
+        if not is_writable(data):
+            raise ValueError(f"{key} is read-only and can not be changed in place")
+        step = Step(description or f"Change {key}")
+        step.chunks = [[data, sl, np.array(data[sl])] for sl in chunk_slices(data, region)]
+        try:
+            yield data
+        except BaseException:
+            # Leave the dataset as it was: put back the chunks that were written
+            array = unwrap(data)
+            for _, sl, block in step.chunks:
+                if not np.array_equal(array[sl], block):
+                    array[sl] = block
+            raise
+        if hasattr(data, 'modified'):
+            data.modified()
+        self._push(step)
+        self.changed(key)
+
+    def apply(self, key, function, region=Ellipsis, description=''):
+        """Replace region of the dataset of key by function(region) in place."""
+        with self.modify(key, region, description) as data:
+            data[region] = function(np.asarray(data[region]))
+
+    def replace(self, key, data, description=''):
+        """Store data under key; the previous dataset is kept (not copied) for undo."""
+        step = Step(description or f"Replace {key}")
+        step.replaced = [[key, self.datasets.peek(key), self.datasets.release_scratch(key)]]
+        self.datasets[key] = data
+        self._push(step)
+
+    def remove(self, key, description=''):
+        """Remove the dataset of key; undo puts the same dataset back."""
+        step = Step(description or f"Remove {key}")
+        step.replaced = [[key, self.datasets.peek(key), self.datasets.release_scratch(key)]]
+        del self.datasets[key]
+        self._push(step)
+
+    def _push(self, step):
+        for dropped in self.redo_steps:
+            dropped.discard()
+        self.redo_steps = []
+        if step.nbytes > self.max_bytes:
+            if self.too_large is not None:
+                self.too_large(step)
+            step.discard()
+            return
+        self.undo_steps.append(step)
+        self._trim()
+
+    def _trim(self):
+        sizes = [step.nbytes for step in self.undo_steps]
+        total = sum(sizes) + sum(step.nbytes for step in self.redo_steps)
+        while self.undo_steps and total > self.max_bytes:
+            self.undo_steps.pop(0).discard()
+            total -= sizes.pop(0)
+        while self.redo_steps and total > self.max_bytes:
+            step = self.redo_steps.pop(0)
+            total -= step.nbytes
+            step.discard()
+
+    # Undo and redo
+
+    def undo(self):
+        """Undo the last change; returns its description, None if there is none."""
+        return self._swap(self.undo_steps, self.redo_steps)
+
+    def redo(self):
+        """Redo the last undone change; returns its description, None if there is none."""
+        return self._swap(self.redo_steps, self.undo_steps)
+
+    def _swap(self, source, target):
+        if not source:
+            return None
+        step = source.pop()
+        changed = []
+        for entry in reversed(step.chunks):
+            data, sl, block = entry
+            array = getattr(data, 'array', data)
+            entry[2] = np.array(array[sl])
+            array[sl] = block
+            if not any(data is other for other in changed):
+                changed.append(data)
+        for entry in reversed(step.replaced):
+            key, data, scratch = entry
+            entry[1] = self.datasets.peek(key)
+            entry[2] = self.datasets.release_scratch(key)
+            if data is None:
+                self.datasets.pop(key, None)
+            else:
+                self.datasets[key] = data
+                if scratch is not None:
+                    self.datasets.adopt_scratch(key, scratch)
+        for data in changed:
+            if hasattr(data, 'modified'):
+                data.modified()
+            key = next((key for key, value in self.datasets.items() if value is data), None)
+            if key is not None:
+                self.changed(key)
+        target.append(step)
+        return step.description
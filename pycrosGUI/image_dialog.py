@@ -8,6 +8,7 @@
 #       - FFT filtering
 #       - Deconvolution
 #       - Stack processing
+#       - Contrast and brightness through display levels
 #
 #####################################################################
 """
@@ -18,9 +19,18 @@ except ImportError:
 
 import numpy as np
 
+from .dataset_events import is_image
+from .display_levels import contrast_levels
+from .dataset_model import KEY_ROLE, set_combo_model
+from .dataset_store import unique_key
+from .provenance import OPERATIONS
+
 
 class ImageDialog(QtWidgets.QWidget):
     """Image processing dialog."""
+
+    # Results stored with the session
+    state_attributes = ('key',)
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -36,6 +46,9 @@ class ImageDialog(QtWidgets.QWidget):
         self.key = ''
         self.dataset = None
         self.fft_mag = None
+        # Slider moves are applied at most once per frame
+        if hasattr(parent, 'redraw'):
+            parent.redraw.add_layer('display_levels', self.apply_contrast)
 
     def get_sidebar(self):
         """Creates the sidebar layout for the image dialog."""
@@ -46,7 +59,7 @@ class ImageDialog(QtWidgets.QWidget):
 
         # Dataset selection
         self.main_list = QtWidgets.QComboBox(self)
-        self.main_list.addItem("None")
+        self.dataset_filter = set_combo_model(self.main_list, self.parent, is_image)
         layout.addWidget(self.main_list, row, 0, 1, 3)
         layout.setColumnStretch(0, 3)
         self.main_list.activated[str].connect(self.update_image_dataset)
@@ -154,6 +167,7 @@ class ImageDialog(QtWidgets.QWidget):
         self.contrast_slider.setValue(50)
         layout.addWidget(self.contrast_label, row, 0)
         layout.addWidget(self.contrast_slider, row, 1, 1, 2)
+        self.contrast_slider.valueChanged.connect(self.update_contrast)
 
         row += 1
         self.brightness_label = QtWidgets.QLabel("Brightness")
@@ -163,6 +177,13 @@ class ImageDialog(QtWidgets.QWidget):
         self.brightness_slider.setValue(50)
         layout.addWidget(self.brightness_label, row, 0)
         layout.addWidget(self.brightness_slider, row, 1, 1, 2)
+        self.brightness_slider.valueChanged.connect(self.update_contrast)
+
+        row += 1
+        self.auto_contrast_button = QtWidgets.QPushButton()
+        self.auto_contrast_button.setText("Auto Contrast")
+        layout.addWidget(self.auto_contrast_button, row, 0, 1, 3)
+        self.auto_contrast_button.clicked.connect(self.auto_contrast)
 
         # Add stretch to push everything up
         row += 1
@@ -171,38 +192,36 @@ class ImageDialog(QtWidgets.QWidget):
         return layout
 
     def update_sidebar(self):
-        """Update the sidebar with the current image dataset."""
-        # Update the image list
-        image_list = []
-        if hasattr(self.parent, 'datasets'):
-            for key, dataset in self.parent.datasets.items():
-                if hasattr(dataset, 'data_type'):
-                    if 'IMAGE' in dataset.data_type.name:
-                        image_list.append(f"{key}: {dataset.title}")
-
-        self.main_list.clear()
-        if len(image_list) == 0:
-            self.main_list.addItem("None")
-        else:
-            for item in image_list:
-                self.main_list.addItem(item)
+        """Update the sidebar; the image list follows the dataset events."""
 
     def update_image_dataset(self, value=0):
         """Update the image dataset based on the current selection."""
-        item_text = self.main_list.currentText()
-        if hasattr(self.parent, 'main'):
-            self.parent.main = item_text.split(':')[0]
+        key = self.main_list.currentData(KEY_ROLE)
+        if key is not None and hasattr(self.parent, 'main'):
+            self.parent.main = key
         if hasattr(self.parent, 'dataset') and self.parent.dataset is not None:
             self.dataset = self.parent.dataset
 
     def update_fft(self):
-        """Update the FFT view with the current dataset."""
+        """Update the FFT view with the current dataset; kept until the data or frame change."""
         if self.dataset is not None:
             try:
-                self.fft_mag = np.abs(np.fft.fftshift(np.fft.fft2(self.dataset)))
+                if hasattr(self.dataset, 'cached'):
+                    frame = self.parent.image_item.currentIndex if self.dataset.ndim > 2 else 0
+                    self.fft_mag = self.dataset.cached('fft', self.fft_magnitude, key=frame)
+                else:
+                    self.fft_mag = self.fft_magnitude()
             except Exception:
                 pass
 
+    def fft_magnitude(self):
+        """FFT magnitude of the displayed image."""
+        # Only the displayed frame is read from (lazy) storage
+        image = self.parent.get_displayed_image()
+        if image is None:
+            image = np.asarray(self.dataset)
+        return np.abs(np.fft.fftshift(np.fft.fft2(image)))
+
     def rigid_registration(self, value=0):
         """Perform rigid registration on the image stack."""
         try:
@@ -229,22 +248,33 @@ class ImageDialog(QtWidgets.QWidget):
             pass
         self.demon_reg_button.setChecked(False)
 
+    def is_stack(self):
+        """True if the current dataset is an image stack."""
+        if hasattr(self.dataset, 'data_type'):
+            return self.dataset.data_type.name == 'IMAGE_STACK'
+        return getattr(self.dataset, 'ndim', 0) == 3
+
+    def derive(self, operation, suffix):
+        """Result of a registered operation on the dataset; not recomputed if it is unchanged."""
+        source = next((key for key, data in self.parent.datasets.items() if data is self.dataset), None)
+        provenance = getattr(self.parent, 'provenance', None)
+        if provenance is None or source is None:
+            key = unique_key(self.parent.datasets, f"{self.parent.main}_{suffix}")
+            self.parent.add_dataset(key, OPERATIONS[operation](self.dataset))
+            return
+        key = provenance.derive(operation, [source], key=f"{source}_{suffix}")
+        self.parent.statusBar().showMessage(f"{key}: {operation} of {source}", 5000)
+
     def sum_stack(self, value=0):
         """Sum the image stack."""
-        if self.dataset is not None:
-            if hasattr(self.dataset, 'data_type'):
-                if self.dataset.data_type.name == 'IMAGE_STACK':
-                    # Sum stack
-                    pass
+        if self.dataset is not None and self.is_stack():
+            self.derive('sum_frames', 'sum')
         self.sum_button.setChecked(False)
 
     def average_stack(self, value=0):
         """Average the image stack."""
-        if self.dataset is not None:
-            if hasattr(self.dataset, 'data_type'):
-                if self.dataset.data_type.name == 'IMAGE_STACK':
-                    # Average stack
-                    pass
+        if self.dataset is not None and self.is_stack():
+            self.derive('average_frames', 'average')
         self.average_button.setChecked(False)
 
     def set_resolution(self):
@@ -299,6 +329,27 @@ class ImageDialog(QtWidgets.QWidget):
         """Show histogram of the image."""
         pass
 
+    def update_contrast(self, value=0):
+        """Apply contrast and brightness with the next redraw."""
+        if hasattr(self.parent, 'redraw'):
+            self.parent.redraw.request('display_levels')
+
+    def apply_contrast(self):
+        """Set the display levels from the sliders and the cached histogram of the image shown."""
+        stats = self.parent.display_stats()
+        if stats is None:
+            return
+        low, high = contrast_levels(stats.auto_levels, self.contrast_slider.value(), self.brightness_slider.value())
+        self.parent.set_display_levels(low, high)
+
+    def auto_contrast(self):
+        """Levels at the percentiles of the histogram (sliders to the middle)."""
+        for slider in [self.contrast_slider, self.brightness_slider]:
+            slider.blockSignals(True)
+            slider.setValue(50)
+            slider.blockSignals(False)
+        self.update_contrast()
+
     def get_additional_features(self):
         """Get additional features for the plot."""
         additional_features = {}
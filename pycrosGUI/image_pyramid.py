@@ -0,0 +1,338 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# image_pyramid: Display of images too large to show at once.
+#       - ImagePyramid: the image at 1/2, 1/4, ... resolution (means of
+#         2 x 2 pixels), built in the background and kept in .npy files
+#         next to the image file (or in the user cache); files of
+#         older versions of the image are deleted
+#       - TiledImageView: shows only the 256 x 256 tiles of the level
+#         matching the zoom that are in view, so pan and zoom cost the
+#         same for any image size
+#
+#####################################################################
+"""
+import hashlib
+import json
+import math
+import os
+from collections import OrderedDict
+
+try:
+    from PyQt6 import QtCore
+except ImportError:
+    from PyQt5 import QtCore
+
+import numpy as np
+import pyqtgraph as pg
+
+from . import autosave
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pycrosGUI', 'pyramids')
+
+# Images with more pixels are shown tiled
+TILED_PIXELS = 4096 * 4096
+TILE_SIZE = 256
+# Tiles kept in memory by a view
+TILE_CACHE = 512
+# Bytes read at a time while building a level
+STRIP_BYTES = 64 * 1024 * 1024
+
+
+def source_file(data):
+    """File an image is read from, with the dataset within it, or (None, '')."""
+    source = autosave.data_source(getattr(data, 'array', data)) or {}
+    for kind in ['hdf5', 'memmap', 'tiff', 'file']:
+        if isinstance(source.get(kind), str):
+            return source[kind], str(source.get('dataset', ''))
+    return None, ''
+
+
+def digest(values):
+    """Short hex digest of a JSON-serializable list."""
+    return hashlib.sha1(json.dumps(values).encode('utf-8')).hexdigest()[:12]
+
+
+def cache_folder(file_path):
+    """Folder for the pyramid files of file_path: next to it if possible, else in the user cache."""
+    folder = os.path.join(os.path.dirname(os.path.abspath(file_path)), '.pycrosGUI-pyramids')
+    if os.access(os.path.dirname(folder), os.W_OK):
+        return folder
+    return CACHE_DIR
+
+
+def downsample(source, target, max_bytes=STRIP_BYTES):
+    """Write means of 2 x 2 pixels of source (h, w) into target (ceil(h/2), ceil(w/2)), strip by strip.
+
+    Odd last rows and columns are averaged with themselves.
+    """
+    height, width = source.shape
+    rows = max(2, max_bytes // max(1, width * source.dtype.itemsize) // 2 * 2)
+    for start in range(0, height, rows):
+        strip = np.asarray(source[start:start + rows], dtype=np.float32)
+        if strip.shape[0] % 2:
+            strip = np.concatenate([strip, strip[-1:]])
+        if strip.shape[1] % 2:
+            strip = np.concatenate([strip, strip[:, -1:]], axis=1)
+        means = strip.reshape(strip.shape[0] // 2, 2, strip.shape[1] // 2, 2).mean(axis=(1, 3))
+        target[start // 2:start // 2 + means.shape[0]] = means
+    if hasattr(target, 'flush'):
+        target.flush()
+
+
+class ImagePyramid:
+    """An image (2D, possibly lazy) and its levels of halved resolution.
+
+    Level 0 is the image itself; level n has ``2 ** n`` times fewer
+    pixels per side, down to one tile. Levels of file-backed images are
+    stored as .npy files in ``folder`` and reused while the file does
+    not change; those of in-memory images are kept in memory. Tiles of
+    levels not built yet are sampled from the image.
+    """
+
+    def __init__(self, data, folder=None, tile_size=TILE_SIZE):
+        self.data = getattr(data, 'array', data)
+        self.tile_size = tile_size
+        self.shape = tuple(self.data.shape)
+        self.n_levels = 1 + max(0, math.ceil(math.log2(max(self.shape) / tile_size)))
+        self.levels = {0: self.data}
+        self.prefix = None
+        self.name_prefix = None
+        file_path, dataset_path = source_file(self.data)
+        if file_path is not None and os.path.exists(file_path):
+            stat = os.stat(file_path)
+            # Files of the same image share the name digest; the version digest follows its changes
+            name = digest([os.path.abspath(file_path), dataset_path])
+            version = digest([stat.st_size, stat.st_mtime_ns, list(self.shape)])
+            folder = folder or cache_folder(file_path)
+            self.name_prefix = os.path.join(folder, f"{os.path.basename(file_path)}-{name}-")
+            self.prefix = self.name_prefix + version
+            for level in range(1, self.n_levels):
+                try:
+                    self.levels[level] = np.load(self._level_file(level), mmap_mode='r')
+                except (OSError, ValueError):
+                    break
+
+    def _level_file(self, level):
+        return f"{self.prefix}-level{level}.npy"
+
+    def remove_stale_files(self):
+        """Delete the level files of older versions of the image."""
+        folder, start = os.path.split(self.name_prefix)
+        current = os.path.basename(self.prefix) + '-level'
+        try:
+            names = os.listdir(folder)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith(start) and not name.startswith(current):
+                try:
+                    os.remove(os.path.join(folder, name))
+                except OSError:
+                    pass
+
+    def level_shape(self, level):
+        shape = self.shape
+        for _ in range(level):
+            shape = tuple(-(-n // 2) for n in shape)
+        return shape
+
+    @property
+    def complete(self):
+        return len(self.levels) == self.n_levels
+
+    def build(self, progress=None):
+        """Build the missing levels, each from the one before; progress(level) after each.
+
+        A level file that cannot be completed is deleted before the
+        error is raised.
+        """
+        if self.prefix is not None and not self.complete:
+            os.makedirs(os.path.dirname(self.prefix), exist_ok=True)
+            self.remove_stale_files()
+        for level in range(1, self.n_levels):
+            if level in self.levels:
+                continue
+            shape = self.level_shape(level)
+            if self.prefix is not None:
+                partial = self._level_file(level) + '.part'
+                try:
+                    target = np.lib.format.open_memmap(partial, mode='w+', dtype=np.float32, shape=shape)
+                    downsample(self.levels[level - 1], target)
+                    del target
+                    os.replace(partial, self._level_file(level))
+                except BaseException:
+                    target = None
+                    if os.path.exists(partial):
+                        os.remove(partial)
+                    raise
+                self.levels[level] = np.load(self._level_file(level), mmap_mode='r')
+            else:
+                target = np.empty(shape, dtype=np.float32)
+                downsample(self.levels[level - 1], target)
+                self.levels[level] = target
+            if progress is not None:
+                progress(level)
+
+    def region(self, level, x0, x1, y0, y1):
+        """Pixels [x0:x1, y0:y1] of level (in its own pixels)."""
+        if level in self.levels:
+            return np.asarray(self.levels[level][x0:x1, y0:y1])
+        # Not built yet: sample the finest level that is
+        built = max(n for n in list(self.levels) if n < level)
+        step = 2 ** (level - built)
+        return np.asarray(self.levels[built][x0 * step:x1 * step:step, y0 * step:y1 * step:step])
+
+    def tile(self, level, tx, ty):
+        size = self.tile_size
+        return self.region(level, tx * size, (tx + 1) * size, ty * size, (ty + 1) * size)
+
+    def coarsest(self):
+        """The coarsest level (one tile), sampled if not built yet."""
+        return np.asarray(self.region(self.n_levels - 1, 0, self.tile_size, 0, self.tile_size), dtype=np.float32)
+
+    def levels_range(self):
+        """Display levels estimated from the coarsest level built."""
+        coarse = self.coarsest()
+        finite = coarse[np.isfinite(coarse)]
+        if not finite.size:
+            return 0.0, 1.0
+        return float(finite.min()), float(finite.max())
+
+
+class PyramidSignals(QtCore.QObject):
+    level_built = QtCore.pyqtSignal(int)
+    failed = QtCore.pyqtSignal(str)
+
+
+class PyramidBuilder(QtCore.QRunnable):
+    """Builds the missing levels of a pyramid in a worker thread; errors are emitted as failed."""
+
+    def __init__(self, pyramid, signals):
+        super().__init__()
+        self.pyramid = pyramid
+        self.signals = signals
+
+    def run(self):
+        try:
+            self.pyramid.build(progress=self.signals.level_built.emit)
+        except Exception as e:
+            self.signals.failed.emit(f"{type(e).__name__}: {e}")
+
+
+class TiledImageView(pg.GraphicsLayoutWidget):
+    """View of an ImagePyramid; only tiles in view, at the level of the zoom, are drawn.
+
+    Axes are those of the Image tab (first array axis horizontal, y
+    pointing down). If levels cannot be built, ``build_failed`` is
+    emitted with the error; tiles of them are then sampled.
+    """
+
+    build_failed = QtCore.pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.view = self.addViewBox(lockAspect=True, invertY=True)
+        self.pyramid = None
+        self.display_levels = (0.0, 1.0)
+        self.fixed_levels = False
+        self.items = {}
+        self.tiles = OrderedDict()
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = PyramidSignals()
+        self.signals.level_built.connect(self._level_built)
+        self.signals.failed.connect(self.build_failed)
+        self.view.sigRangeChanged.connect(self.update_tiles)
+
+    def set_pyramid(self, pyramid):
+        """Show pyramid, zoomed to fit; missing levels are built in the background."""
+        self.clear_tiles()
+        self.pyramid = pyramid
+        self.display_levels = pyramid.levels_range()
+        self.fixed_levels = False
+        self.view.setRange(QtCore.QRectF(0, 0, pyramid.shape[0], pyramid.shape[1]), padding=0)
+        if not pyramid.complete:
+            self.pool.start(PyramidBuilder(pyramid, self.signals))
+        self.update_tiles()
+
+    def clear_tiles(self):
+        for item in self.items.values():
+            self.view.removeItem(item)
+        self.items = {}
+        self.tiles.clear()
+
+    def _level_built(self, level):
+        # Tiles sampled before the level was built are replaced by its means
+        for key in [key for key in self.tiles if key[0] == level]:
+            del self.tiles[key]
+        for key in [key for key in self.items if key[0] == level]:
+            self.view.removeItem(self.items.pop(key))
+        if self.pyramid is not None and self.pyramid.complete and not self.fixed_levels:
+            self.display_levels = self.pyramid.levels_range()
+        self.update_tiles()
+
+    def set_levels(self, levels):
+        """Display levels of all tiles; only the tile items in view exist, so only they are redrawn."""
+        self.display_levels = tuple(levels)
+        self.fixed_levels = True
+        for item in self.items.values():
+            item.setLevels(self.display_levels)
+
+    def current_level(self):
+        """Level with about one image pixel per screen pixel."""
+        (x0, x1), _ = self.view.viewRange()
+        pixels = max(1.0, self.view.width())
+        ratio = (x1 - x0) / pixels
+        return int(min(self.pyramid.n_levels - 1, max(0, math.floor(math.log2(ratio)) if ratio > 1 else 0)))
+
+    def visible_tiles(self, level):
+        (x0, x1), (y0, y1) = self.view.viewRange()
+        extent = self.pyramid.tile_size * 2 ** level
+        width, height = self.pyramid.shape
+        x_tiles = range(max(0, int(x0 // extent)), min(-(-width // extent), int(x1 // extent) + 1))
+        y_tiles = range(max(0, int(y0 // extent)), min(-(-height // extent), int(y1 // extent) + 1))
+        return [(level, tx, ty) for tx in x_tiles for ty in y_tiles]
+
+    def update_tiles(self, *args):
+        """Show the tiles in view at the current level and drop the others."""
+        if self.pyramid is None:
+            return
+        level = self.current_level()
+        visible = self.visible_tiles(level)
+        for key in [key for key in self.items if key not in visible]:
+            self.view.removeItem(self.items.pop(key))
+        for key in visible:
+            if key not in self.items:
+                self.items[key] = self._tile_item(key)
+                self.view.addItem(self.items[key])
+
+    def _tile_item(self, key):
+        level, tx, ty = key
+        data = self.tiles.get(key)
+        if data is None:
+            data = self.pyramid.tile(level, tx, ty)
+            self.tiles[key] = data
+            while len(self.tiles) > TILE_CACHE:
+                self.tiles.popitem(last=False)
+        else:
+            self.tiles.move_to_end(key)
+        item = pg.ImageItem(data, levels=self.display_levels, axisOrder='col-major')
+        extent = self.pyramid.tile_size * 2 ** level
+        scale = 2 ** level
+        item.setRect(QtCore.QRectF(tx * extent, ty * extent, data.shape[0] * scale, data.shape[1] * scale))
+        item.setZValue(-level)
+        return item
+
+    def visible_image(self):
+        """Part of the image in view, at the resolution of the current level."""
+        if self.pyramid is None:
+            return None
+        level = self.current_level()
+        scale = 2 ** level
+        (x0, x1), (y0, y1) = self.view.viewRange()
+        width, height = self.pyramid.level_shape(level)
+        return self.pyramid.region(level, max(0, int(x0 // scale)), min(width, int(x1 // scale) + 1),
+                                   max(0, int(y0 // scale)), min(height, int(y1 // scale) + 1))
@@ -0,0 +1,377 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# image_stack: Streamed image stacks (in-situ movies).
+#       - Multi-page TIFF files, page offsets indexed once
+#       - Folders of image files
+#       - Frames decoded on demand with a bounded prefetch cache
+#       - Parallel decoding of whole stacks
+#       - Stacks grow while frames are acquired (live ingestion)
+#
+#####################################################################
+"""
+import io
+import os
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from .lazy_data import LazyArray, BLOCK_BYTES, expand_key
+
+# Decoded frames kept in memory per stack
+FRAME_CACHE_BYTES = 256 * 1024 * 1024
+# Frames decoded ahead of the last requested frame
+PREFETCH_FRAMES = 4
+# Rows of decoded images are copied out of PIL in strips of this size
+STRIP_BYTES = 4 * 1024 * 1024
+
+IMAGE_EXTENSIONS = ['.tif', '.tiff', '.png', '.jpg', '.jpeg', '.bmp']
+
+_prefetch_pool = None
+
+
+def _get_prefetch_pool():
+    global _prefetch_pool
+    if _prefetch_pool is None:
+        _prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='prefetch')
+    return _prefetch_pool
+
+
+def tiff_page_offsets(file_path):
+    """Walk the IFD chain of a TIFF file.
+
+    Returns (byte order, BigTIFF flag, list of IFD offsets). Only the
+    IFD headers are read, not the image data.
+    """
+    with open(file_path, 'rb') as fp:
+        head = fp.read(16)
+        order = {b'II': '<', b'MM': '>'}.get(head[:2])
+        if order is None:
+            raise ValueError(f"Not a TIFF file: {file_path}")
+        version = struct.unpack(order + 'H', head[2:4])[0]
+        if version == 42:
+            big, count_fmt, entry_size, next_fmt = False, 'H', 12, 'I'
+            offset = struct.unpack(order + 'I', head[4:8])[0]
+        elif version == 43:
+            big, count_fmt, entry_size, next_fmt = True, 'Q', 20, 'Q'
+            offset = struct.unpack(order + 'Q', head[8:16])[0]
+        else:
+            raise ValueError(f"Not a TIFF file: {file_path}")
+        count_size = struct.calcsize(count_fmt)
+        next_size = struct.calcsize(next_fmt)
+
+        offsets = []
+        seen = set()
+        while offset and offset not in seen:
+            seen.add(offset)
+            offsets.append(offset)
+            fp.seek(offset)
+            count = struct.unpack(order + count_fmt, fp.read(count_size))[0]
+            fp.seek(offset + count_size + count * entry_size)
+            raw = fp.read(next_size)
+            offset = struct.unpack(order + next_fmt, raw)[0] if len(raw) == next_size else 0
+    return order, big, offsets
+
+
+def _page_header(head, order, big, offset):
+    """TIFF header whose first IFD is the page at offset."""
+    header = bytearray(head)
+    if big:
+        header[8:16] = struct.pack(order + 'Q', offset)
+    else:
+        header[4:8] = struct.pack(order + 'I', offset)
+    return bytes(header)
+
+
+class _TiffPage(io.RawIOBase):
+    """TIFF file seen through a header that points to one page."""
+
+    def __init__(self, file_path, header):
+        super().__init__()
+        self._fp = open(file_path, 'rb')
+        self._header = header
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def seek(self, pos, whence=0):
+        return self._fp.seek(pos, whence)
+
+    def tell(self):
+        return self._fp.tell()
+
+    def readinto(self, buffer):
+        pos = self._fp.tell()
+        n = self._fp.readinto(buffer)
+        if pos < len(self._header) and n:
+            end = min(n, len(self._header) - pos)
+            buffer[:end] = self._header[pos:pos + end]
+        return n
+
+    def close(self):
+        self._fp.close()
+        super().close()
+
+
+def decode_tiff_page(file_path, header):
+    """Decode the TIFF page selected by header."""
+    from PIL import Image
+    with _TiffPage(file_path, header) as fp:
+        with Image.open(fp) as img:
+            img.load()
+            return image_to_array(img)
+
+
+def image_to_array(img, max_bytes=STRIP_BYTES):
+    """Pixels of a PIL image as array, converted in strips of rows.
+
+    ``np.asarray(img)`` goes through ``img.tobytes()``, which joins a list
+    of encoded chunks and so holds up to three copies of the image at
+    once; converting strips fills the result with only small temporaries.
+    """
+    width, height = img.size
+    first = np.asarray(img.crop((0, 0, width, min(1, height))))
+    out = np.empty((height,) + first.shape[1:], dtype=first.dtype)
+    rows = max(1, max_bytes // max(1, first.nbytes))
+    for top in range(0, height, rows):
+        bottom = min(height, top + rows)
+        out[top:bottom] = np.asarray(img.crop((0, top, width, bottom)))
+    return out
+
+
+def decode_image_file(file_path):
+    """Decode a single image file."""
+    from PIL import Image
+    with Image.open(file_path) as img:
+        img.load()
+        return image_to_array(img)
+
+
+class FrameCache:
+    """Least recently used cache of decoded frames with a size limit."""
+
+    def __init__(self, max_bytes=FRAME_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.frames = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, index):
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is not None:
+                self.frames.move_to_end(index)
+            return frame
+
+    def put(self, index, frame):
+        with self.lock:
+            if index in self.frames:
+                return
+            self.frames[index] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.max_bytes and len(self.frames) > 1:
+                _, old = self.frames.popitem(last=False)
+                self.nbytes -= old.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.nbytes = 0
+
+
+class StreamedStack(LazyArray):
+    """Stack of frames decoded on demand.
+
+    Subclasses provide ``_decode_args(index)`` returning a picklable
+    module-level decode function and its arguments for one frame.
+    ``version`` is bumped whenever frames are added.
+    """
+
+    def __init__(self, n_frames, first_frame, cache_bytes=FRAME_CACHE_BYTES, prefetch=PREFETCH_FRAMES):
+        super().__init__((n_frames,) + first_frame.shape, first_frame.dtype)
+        self.version = 0
+        self.cache = FrameCache(cache_bytes)
+        self.cache.put(0, first_frame)
+        self.prefetch = prefetch
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _decode_args(self, index):
+        raise NotImplementedError
+
+    def _decode(self, index):
+        function, args = self._decode_args(index)
+        return function(*args)
+
+    def _submit(self, index):
+        with self._lock:
+            future = self._pending.get(index)
+            if future is None:
+                future = _get_prefetch_pool().submit(self._decode, index)
+                self._pending[index] = future
+        return future
+
+    def frame(self, index):
+        """Decoded frame index, from the cache if possible."""
+        index = int(index) % self.shape[0]
+        frame = self.cache.get(index)
+        if frame is None:
+            with self._lock:
+                future = self._pending.get(index)
+            frame = future.result() if future is not None else self._decode(index)
+            self.cache.put(index, frame)
+            with self._lock:
+                self._pending.pop(index, None)
+        self._prefetch(index)
+        return frame
+
+    def _prefetch(self, index):
+        for ahead in range(index + 1, min(index + 1 + self.prefetch, self.shape[0])):
+            if self.cache.get(ahead) is None:
+                future = self._submit(ahead)
+                future.add_done_callback(lambda f, i=ahead: self._prefetched(i, f))
+
+    def _prefetched(self, index, future):
+        with self._lock:
+            self._pending.pop(index, None)
+        if future.exception() is None:
+            self.cache.put(index, future.result())
+
+    def _read(self, key):
+        key = expand_key(key, self.ndim)
+        if isinstance(key[0], slice):
+            frames = [self.frame(i) for i in range(*key[0].indices(self.shape[0]))]
+            data = np.stack(frames) if frames else np.empty((0,) + self.shape[1:], self.dtype)
+            return data[(slice(None),) + key[1:]]
+        return self.frame(key[0])[key[1:]]
+
+    def decode_frames(self, indices=None, max_workers=None, processes=False, out=None):
+        """Decode many frames in parallel into one array (or into out).
+
+        Frames are decoded in a thread pool (the decoders release the
+        GIL) or, with processes=True, in a process pool.
+        """
+        if indices is None:
+            indices = range(self.shape[0])
+        indices = list(indices)
+        if out is None:
+            out = np.empty((len(indices),) + self.shape[1:], dtype=self.dtype)
+        missing = []
+        for n, index in enumerate(indices):
+            frame = self.cache.get(index)
+            if frame is None:
+                missing.append(n)
+            else:
+                out[n] = frame
+        if not missing:
+            return out
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+        with executor(max_workers=max_workers) as pool:
+            jobs = [self._decode_args(indices[n]) for n in missing]
+            results = pool.map(_call, [job[0] for job in jobs], [job[1] for job in jobs])
+            for n, frame in zip(missing, results):
+                out[n] = frame
+        return out
+
+    def read_into(self, out, key):
+        """Decode the frames of key in parallel straight into out[key]."""
+        key = expand_key(key, self.ndim)
+        if isinstance(key[0], slice) and all(k == slice(None) for k in key[1:]):
+            self.decode_frames(range(*key[0].indices(self.shape[0])), out=out[key])
+        else:
+            super().read_into(out, key)
+
+    def iter_blocks(self, max_bytes=BLOCK_BYTES):
+        """Yield ``(slice, block)`` pairs, each block decoded in parallel."""
+        frame_bytes = max(1, self.nbytes // max(1, self.shape[0]))
+        step = max(1, max_bytes // frame_bytes)
+        for start in range(0, self.shape[0], step):
+            sl = slice(start, min(start + step, self.shape[0]))
+            yield sl, self.decode_frames(range(sl.start, sl.stop))
+
+    def _grow(self, n_frames):
+        """Set the number of frames after frames were added."""
+        if n_frames != self.shape[0]:
+            self.shape = (n_frames,) + self.shape[1:]
+            self.version += 1
+
+    def close(self):
+        self.cache.clear()
+
+
+def _call(function, args):
+    return function(*args)
+
+
+class TiffStack(StreamedStack):
+    """Multi-page TIFF file read page by page."""
+
+    def __init__(self, file_path, **kwargs):
+        self.file_path = file_path
+        self._order, self._big, self.offsets = tiff_page_offsets(file_path)
+        with open(file_path, 'rb') as fp:
+            self._head = fp.read(16)
+        super().__init__(len(self.offsets), self._decode(0), **kwargs)
+
+    def _decode_args(self, index):
+        header = _page_header(self._head, self._order, self._big, self.offsets[index])
+        return decode_tiff_page, (self.file_path, header)
+
+    def refresh(self):
+        """Index pages appended to the file since it was opened; returns the number of new frames."""
+        offsets = tiff_page_offsets(self.file_path)[2]
+        added = len(offsets) - len(self.offsets)
+        if added > 0:
+            self.offsets = offsets
+            self._grow(len(offsets))
+        return max(added, 0)
+
+
+class ImageSequence(StreamedStack):
+    """Folder (or list) of image files read as a stack, in sorted order."""
+
+    def __init__(self, files, first_frame=None, **kwargs):
+        if isinstance(files, str):
+            folder = files
+            files = [os.path.join(folder, name) for name in os.listdir(folder)
+                     if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS]
+        self.files = sorted(files)
+        if not self.files:
+            raise ValueError("No image files found")
+        if first_frame is None:
+            first_frame = decode_image_file(self.files[0])
+        super().__init__(len(self.files), first_frame, **kwargs)
+
+    def _decode_args(self, index):
+        return decode_image_file, (self.files[index],)
+
+    def append(self, file_path, frame=None):
+        """Add a frame at the end; an already decoded frame goes into the cache."""
+        if frame is not None and (frame.shape != self.shape[1:] or frame.dtype != self.dtype):
+            raise ValueError(f"Frame {frame.shape} does not fit stack {self.shape}")
+        self.files.append(file_path)
+        if frame is not None:
+            self.cache.put(len(self.files) - 1, frame)
+        self._grow(len(self.files))
+
+
+def open_tiff(file_path, lazy=True):
+    """Open a TIFF file; multi-page files become a streamed TiffStack."""
+    try:
+        offsets = tiff_page_offsets(file_path)[2]
+    except ValueError:
+        offsets = []
+    if len(offsets) > 1:
+        stack = TiffStack(file_path)
+        return stack if lazy else stack.decode_frames()
+    return decode_image_file(file_path)
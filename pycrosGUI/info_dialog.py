@@ -23,9 +23,14 @@ except ImportError:
 
 import numpy as np
 
+from .dataset_model import KEY_ROLE, set_combo_model
+
 
 class InfoDialog(QtWidgets.QWidget):
     """Dialog to display and edit information about the dataset."""
+
+    # Results stored with the session
+    state_attributes = ('info_key', 'info_index')
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -53,7 +58,7 @@ class InfoDialog(QtWidgets.QWidget):
 
         # Dataset selection
         self.main_list = QtWidgets.QComboBox(self)
-        self.main_list.addItem("None")
+        self.dataset_filter = set_combo_model(self.main_list, self.parent)
         layout.addWidget(self.main_list, row, 0, 1, 3)
         layout.setColumnStretch(0, 3)
         self.main_list.activated[str].connect(self.set_dataset)
@@ -183,12 +188,9 @@ class InfoDialog(QtWidgets.QWidget):
 
     def set_dataset(self, text=None):
         """Set the main dataset."""
-        if text:
-            item_text = text
-        else:
-            item_text = self.main_list.currentText()
-        if hasattr(self.parent, 'main'):
-            self.parent.main = item_text.split(':')[0]
+        key = self.main_list.currentData(KEY_ROLE)
+        if key is not None and hasattr(self.parent, 'main'):
+            self.parent.main = key
         self.update_info()
 
     def show_metadata(self):
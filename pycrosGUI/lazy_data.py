@@ -0,0 +1,384 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# lazy_data: Out-of-core access to large datasets.
+#       - Memory-mapped .npy files
+#       - On-demand .npz members
+#       - Chunk-aware HDF5 datasets and dask arrays (lazy DM files)
+#       - Navigator images and ROI sums of spectrum images, block by block
+#       - Frame sampling for display levels
+#
+#####################################################################
+"""
+import struct
+import zipfile
+
+import numpy as np
+
+# Size of blocks read by chunked reductions over lazy arrays
+BLOCK_BYTES = 64 * 1024 * 1024
+# Raw chunk cache of HDF5 files kept open for lazy reading
+H5_CHUNK_CACHE = 64 * 1024 * 1024
+
+
+class LazyArray:
+    """Array-like proxy that only reads the slices it is indexed with.
+
+    Subclasses implement ``_read(key)`` which returns a numpy array for
+    any numpy-style index. Everything else (shape bookkeeping, chunked
+    reductions, conversion with ``np.asarray``) is provided here.
+    Subclasses with ``chunks`` get blocks aligned to the chunks of the
+    first axis.
+    """
+
+    chunks = None
+
+    def __init__(self, shape, dtype):
+        self.shape = tuple(int(n) for n in shape)
+        self.dtype = np.dtype(dtype)
+
+    @property
+    def ndim(self):
+        return len(self.shape)
+
+    @property
+    def size(self):
+        return int(np.prod(self.shape, dtype=np.int64))
+
+    @property
+    def nbytes(self):
+        return self.size * self.dtype.itemsize
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        return self._read(key)
+
+    def __array__(self, dtype=None, copy=None):
+        data = self._read(Ellipsis)
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def __repr__(self):
+        return f"{type(self).__name__}(shape={self.shape}, dtype={self.dtype})"
+
+    def _read(self, key):
+        raise NotImplementedError
+
+    def transpose(self, *axes):
+        """Lazy transpose; data are only reordered once they are read."""
+        if len(axes) == 1 and not isinstance(axes[0], int):
+            axes = axes[0]
+        axes = tuple(axes) if axes else tuple(reversed(range(self.ndim)))
+        if axes == tuple(range(self.ndim)):
+            return self
+        return LazyTranspose(self, axes)
+
+    @property
+    def T(self):
+        return self.transpose()
+
+    def iter_blocks(self, max_bytes=BLOCK_BYTES):
+        """Yield ``(slice, block)`` pairs covering the first axis."""
+        if self.ndim == 0:
+            yield slice(None), self._read(Ellipsis)
+            return
+        for sl in block_slices(self, 0, self.shape[0], max_bytes):
+            yield sl, self._read(sl)
+
+    def read_into(self, out, key):
+        """Read data[key] into out[key] of a preallocated array."""
+        out[key] = self._read(key)
+
+    def min(self):
+        """Minimum over all elements, computed block by block."""
+        return min(block.min() for _, block in self.iter_blocks())
+
+    def max(self):
+        """Maximum over all elements, computed block by block."""
+        return max(block.max() for _, block in self.iter_blocks())
+
+    def close(self):
+        """Release any file handle held by the array."""
+        pass
+
+
+def expand_key(key, ndim):
+    """Expand a basic numpy index into one int or slice per axis."""
+    if not isinstance(key, tuple):
+        key = (key,)
+    if any(k is Ellipsis for k in key):
+        i = next(n for n, k in enumerate(key) if k is Ellipsis)
+        key = key[:i] + (slice(None),) * (ndim - len(key) + 1) + key[i + 1:]
+    key = key + (slice(None),) * (ndim - len(key))
+    for k in key:
+        if not isinstance(k, (slice, int, np.integer)):
+            raise IndexError('lazy arrays support only integer and slice indices')
+    return key
+
+
+class LazyTranspose(LazyArray):
+    """Transposed view of a lazy array."""
+
+    def __init__(self, base, axes):
+        super().__init__([base.shape[ax] for ax in axes], base.dtype)
+        self.base = base
+        self.axes = axes
+
+    def _read(self, key):
+        key = expand_key(key, self.ndim)
+        base_key = [None] * self.ndim
+        for out_axis, base_axis in enumerate(self.axes):
+            base_key[base_axis] = key[out_axis]
+        data = self.base[tuple(base_key)]
+        kept = [ax for ax in self.axes if isinstance(base_key[ax], slice)]
+        return data.transpose([sorted(kept).index(ax) for ax in kept])
+
+    def close(self):
+        self.base.close()
+
+
+class NpzMember(LazyArray):
+    """Compressed member of an .npz archive, decompressed on first access."""
+
+    def __init__(self, file_path, name, shape, dtype):
+        super().__init__(shape, dtype)
+        self.file_path = file_path
+        self.name = name
+        self._data = None
+
+    def _read(self, key):
+        if self._data is None:
+            with zipfile.ZipFile(self.file_path) as archive:
+                with archive.open(self.name) as member:
+                    self._data = np.lib.format.read_array(member, allow_pickle=True)
+        return self._data[key]
+
+    def close(self):
+        self._data = None
+
+
+class H5Array(LazyArray):
+    """HDF5 dataset kept open in its file and read slice by slice."""
+
+    def __init__(self, dataset):
+        super().__init__(dataset.shape, dataset.dtype)
+        self.dataset = dataset
+        self.file = dataset.file
+        self.name = dataset.name
+        self.chunks = dataset.chunks
+
+    @property
+    def attrs(self):
+        return self.dataset.attrs
+
+    def _read(self, key):
+        return self.dataset[key]
+
+    def read_into(self, out, key):
+        # HDF5 decodes straight into out, without a temporary block
+        self.dataset.read_direct(out, source_sel=key, dest_sel=key)
+
+    def close(self):
+        if self.file.id.valid:
+            self.file.close()
+
+
+class DaskArray(LazyArray):
+    """Dask array (e.g. of a lazy hyperspy signal) computed chunk by chunk.
+
+    ``axes`` describes the axes (name, scale, offset, units, navigate)
+    and ``file_path`` the file the data can be reopened from.
+    """
+
+    def __init__(self, array, axes=None, file_path=None):
+        super().__init__(array.shape, array.dtype)
+        self.array = array
+        self.chunks = tuple(int(c[0]) for c in array.chunks) if array.ndim else None
+        self.axes = axes or []
+        self.file_path = file_path
+
+    def _read(self, key):
+        return np.asarray(self.array[key].compute())
+
+    def min(self):
+        return self.array.min().compute()
+
+    def max(self):
+        return self.array.max().compute()
+
+
+def block_slices(data, start, stop, max_bytes=BLOCK_BYTES):
+    """Slices of about max_bytes covering rows start to stop of data.
+
+    Blocks are aligned to the chunks of the first axis, if data has any.
+    """
+    row_bytes = max(1, int(np.prod(data.shape[1:], dtype=np.int64)) * data.dtype.itemsize)
+    step = max(1, max_bytes // row_bytes)
+    chunks = getattr(data, 'chunks', None)
+    if isinstance(chunks, tuple) and chunks and isinstance(chunks[0], (int, np.integer)):
+        step = max(chunks[0], step - step % chunks[0])
+        start -= start % chunks[0]
+    for first in range(start, stop, step):
+        yield slice(first, min(first + step, stop, data.shape[0]))
+
+
+def navigator(data):
+    """Image of a spectrum image summed over its last axis, read block by block."""
+    if isinstance(data, DaskArray):
+        return np.asarray(data.array.sum(axis=-1, dtype=np.float64).compute())
+    out = np.empty(data.shape[:-1], dtype=np.float64)
+    for sl, block in iter_blocks(data):
+        out[sl] = block.sum(axis=-1, dtype=np.float64)
+    return out
+
+
+def roi_sum(data, mask):
+    """Summed spectrum of the pixels of a spectrum image where mask is True.
+
+    mask has the shape of the navigation (first two) axes; only the rows
+    and columns the ROI covers are read, block by block.
+    """
+    total = np.zeros(data.shape[2:], dtype=np.float64)
+    rows = np.flatnonzero(np.any(mask, axis=1))
+    if rows.size == 0:
+        return total
+    columns = np.flatnonzero(np.any(mask, axis=0))
+    first, last = int(columns[0]), int(columns[-1]) + 1
+    # Blocks of about BLOCK_BYTES of the columns read
+    max_bytes = BLOCK_BYTES * data.shape[1] // (last - first)
+    for sl in block_slices(data, int(rows[0]), int(rows[-1]) + 1, max_bytes):
+        block_mask = mask[sl, first:last]
+        if block_mask.any():
+            total += np.asarray(data[sl, first:last])[block_mask].sum(axis=0, dtype=np.float64)
+    return total
+
+
+def iter_blocks(data, max_bytes=BLOCK_BYTES):
+    """Yield ``(slice, block)`` pairs covering the first axis of any array."""
+    if hasattr(data, 'iter_blocks'):
+        yield from data.iter_blocks(max_bytes)
+        return
+    if data.ndim == 0:
+        yield slice(None), np.asarray(data)
+        return
+    for sl in block_slices(data, 0, data.shape[0], max_bytes):
+        yield sl, np.asarray(data[sl])
+
+
+def is_lazy(data):
+    """True if data is backed by a file rather than held in memory."""
+    return isinstance(data, (LazyArray, np.memmap))
+
+
+def _read_npy_header(fp):
+    """Read an .npy header; returns (shape, fortran_order, dtype) or None."""
+    version = np.lib.format.read_magic(fp)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(fp)
+    if version == (2, 0):
+        return np.lib.format.read_array_header_2_0(fp)
+    return None
+
+
+def open_npy(file_path, lazy=True):
+    """Open an .npy file, memory-mapped if possible."""
+    if lazy:
+        try:
+            return np.load(file_path, mmap_mode='r')
+        except ValueError:
+            # object arrays can not be memory-mapped
+            pass
+    return np.load(file_path, allow_pickle=True)
+
+
+def open_npz(file_path, lazy=True):
+    """Open all members of an .npz archive.
+
+    Returns a dict of member name to array. Uncompressed members are
+    memory-mapped directly inside the archive, compressed members become
+    ``NpzMember`` objects that are only decompressed when indexed.
+    """
+    if not lazy:
+        with np.load(file_path, allow_pickle=True) as loaded:
+            return {key: loaded[key] for key in loaded.keys()}
+
+    members = {}
+    with zipfile.ZipFile(file_path) as archive, open(file_path, 'rb') as raw:
+        for info in archive.infolist():
+            if not info.filename.endswith('.npy'):
+                continue
+            key = info.filename[:-4]
+            with archive.open(info) as member:
+                header = _read_npy_header(member)
+                header_size = member.tell()
+            if header is None:
+                members[key] = np.load(file_path, allow_pickle=True)[key]
+                continue
+            shape, fortran_order, dtype = header
+            if info.compress_type == zipfile.ZIP_STORED and not dtype.hasobject:
+                raw.seek(info.header_offset + 26)
+                name_length, extra_length = struct.unpack('<HH', raw.read(4))
+                offset = info.header_offset + 30 + name_length + extra_length + header_size
+                members[key] = np.memmap(file_path, dtype=dtype, mode='r', offset=offset,
+                                         shape=shape, order='F' if fortran_order else 'C')
+            else:
+                members[key] = NpzMember(file_path, info.filename, shape, dtype)
+    return members
+
+
+def open_hdf5(file_path, lazy=True, dataset_path=None):
+    """Open a dataset of an HDF5 file, by default the first one found.
+
+    With lazy loading the file stays open and an ``H5Array`` is returned,
+    otherwise the dataset is read into memory and the file is closed.
+    """
+    import h5py
+
+    def get_first_dataset(group):
+        for key in group.keys():
+            item = group[key]
+            if isinstance(item, h5py.Dataset):
+                return item
+            elif isinstance(item, h5py.Group):
+                result = get_first_dataset(item)
+                if result is not None:
+                    return result
+        return None
+
+    h5_file = h5py.File(file_path, 'r', rdcc_nbytes=H5_CHUNK_CACHE)
+    if dataset_path is None:
+        dataset = get_first_dataset(h5_file)
+    else:
+        dataset = h5_file.get(dataset_path)
+        if not isinstance(dataset, h5py.Dataset):
+            dataset = None
+    if dataset is None:
+        h5_file.close()
+        return None
+    if lazy:
+        return H5Array(dataset)
+    data = dataset[()]
+    h5_file.close()
+    return data
+
+
+def sample_frames(data, max_frames=8, max_size=1e6):
+    """Small subsample of data to estimate display levels.
+
+    Only a few evenly spaced frames along the first axis are read, so
+    estimating levels of a large stack does not touch the whole file.
+    """
+    if data.ndim >= 3 and data.shape[0] > max_frames:
+        index = np.linspace(0, data.shape[0] - 1, max_frames).astype(int)
+        data = np.stack([np.asarray(data[i]) for i in index])
+    else:
+        data = np.asarray(data[...]) if isinstance(data, LazyArray) else data
+    step = int(np.ceil((data.size / max_size) ** (1.0 / max(1, data.ndim - 1)))) if data.size > max_size else 1
+    if step > 1:
+        data = data[(slice(None),) + (slice(None, None, step),) * (data.ndim - 1)]
+    return np.asarray(data)
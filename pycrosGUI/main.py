@@ -68,6 +68,7 @@ class Application:
         self.main_window = BaseWidget()
         self.main_window.resize(1280, 800)
         self.main_window.show()
+        self.main_window.recover_autosave()
         
     def run(self):
         """Run the application."""
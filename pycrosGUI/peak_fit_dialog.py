@@ -17,9 +17,15 @@ except ImportError:
 
 import numpy as np
 
+from .dataset_events import is_spectrum
+from .dataset_model import KEY_ROLE, set_combo_model
+
 
 class PeakFitDialog(QtWidgets.QWidget):
     """Dialog for peak fitting."""
+
+    # Results stored with the session
+    state_attributes = ('peak_key', 'peaks', 'p_out', 'peak_out_list')
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -51,7 +57,7 @@ class PeakFitDialog(QtWidgets.QWidget):
 
         # Dataset selection
         self.main_list = QtWidgets.QComboBox(self)
-        self.main_list.addItem("None")
+        self.dataset_filter = set_combo_model(self.main_list, self.parent, is_spectrum)
         layout.addWidget(self.main_list, row, 0, 1, 3)
         layout.setColumnStretch(0, 3)
         self.main_list.activated[str].connect(self.set_dataset)
@@ -156,31 +162,13 @@ class PeakFitDialog(QtWidgets.QWidget):
 
     def set_dataset(self, text=None):
         """Set the dataset."""
-        if text:
-            item_text = text
-        else:
-            item_text = self.main_list.currentText()
-        if hasattr(self.parent, 'main'):
-            self.parent.main = item_text.split(':')[0]
+        key = self.main_list.currentData(KEY_ROLE)
+        if key is not None and hasattr(self.parent, 'main'):
+            self.parent.main = key
         self.update_peak_dataset()
 
     def update_peak_sidebar(self):
-        """Update the peak fit sidebar with the current dataset information."""
-        # Update the spectrum list
-        spectrum_list = []
-        if hasattr(self.parent, 'datasets'):
-            for key, dataset in self.parent.datasets.items():
-                if hasattr(dataset, 'data_type'):
-                    if 'SPEC' in dataset.data_type.name:
-                        spectrum_list.append(f"{key}: {dataset.title}")
-
-        self.main_list.clear()
-        if len(spectrum_list) == 0:
-            self.main_list.addItem("None")
-        else:
-            for item in spectrum_list:
-                self.main_list.addItem(item)
-        
+        """Update the peak fit sidebar; the spectrum list follows the dataset events."""
         self.update_peak_dataset()
 
     def update_peak_dataset(self, value=0):
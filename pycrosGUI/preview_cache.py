@@ -0,0 +1,159 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# preview_cache: Persistent previews of data files.
+#       - Downsampled image or spectrum plus basic statistics per dataset
+#       - Cached on disk per file, validated by size and mtime
+#       - List of recently opened files
+#
+#####################################################################
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from . import lazy_data
+from .dataset import DataType, guess_data_type
+
+CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'pycrosGUI', 'previews')
+RECENT_FILE = os.path.join(os.path.expanduser('~'), '.cache', 'pycrosGUI', 'recent_files.json')
+
+# Largest side of image previews and length of spectrum previews
+PREVIEW_SIZE = 128
+SPECTRUM_POINTS = 512
+MAX_RECENT = 20
+
+
+def _file_signature(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _cache_file(file_path):
+    digest = hashlib.sha1(os.path.abspath(file_path).encode('utf-8')).hexdigest()
+    return os.path.join(CACHE_DIR, digest + '.npz')
+
+
+def make_preview(data, size=PREVIEW_SIZE, data_type=None):
+    """Small preview of a dataset and its statistics.
+
+    Spectra are averaged down to SPECTRUM_POINTS, images are subsampled
+    to at most size pixels per side; of stacks only the first frame is
+    read, spectrum images are shown by their navigator (the sum over the
+    spectrum axis, read block by block). data_type defaults to that of
+    a Dataset or the one guessed from the shape. Returns (preview array,
+    stats dict).
+    """
+    stats = {'shape': [int(n) for n in data.shape], 'dtype': str(data.dtype),
+             'nbytes': int(data.size * data.dtype.itemsize)}
+    if data.ndim == 0 or data.size == 0:
+        return np.zeros(0, dtype=np.float32), stats
+    if data.ndim == 1:
+        spectrum = np.asarray(data[...], dtype=np.float32)
+        bins = int(np.ceil(spectrum.size / SPECTRUM_POINTS))
+        if bins > 1:
+            padded = np.pad(spectrum, (0, bins * SPECTRUM_POINTS - spectrum.size), mode='edge')
+            spectrum = padded.reshape(SPECTRUM_POINTS, bins).mean(axis=1)
+        preview = spectrum
+    else:
+        if data_type is None:
+            data_type = getattr(data, 'data_type', None) or guess_data_type(data.shape, getattr(data, 'axes', None))
+        if data_type == DataType.SPECTRAL_IMAGE and data.ndim == 3:
+            frame = lazy_data.navigator(getattr(data, 'array', data))
+        else:
+            frame = data
+        while frame.ndim > 2:
+            frame = frame[0]
+        step = max(1, int(np.ceil(max(frame.shape) / size)))
+        preview = np.asarray(frame[::step, ::step], dtype=np.float32)
+    finite = preview[np.isfinite(preview)]
+    if finite.size:
+        stats.update(min=float(finite.min()), max=float(finite.max()), mean=float(finite.mean()))
+    return preview, stats
+
+
+def load_previews(file_path):
+    """Cached previews of file_path as dict of key to (preview, stats), or None."""
+    cache_file = _cache_file(file_path)
+    try:
+        with np.load(cache_file) as cached:
+            meta = json.loads(str(cached['meta']))
+            if meta['signature'] != _file_signature(file_path):
+                return None
+            return {key: (cached[f'preview_{n}'], stats) for n, (key, stats) in enumerate(meta['datasets'])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def cached_preview(file_path, key, shape=None):
+    """Cached (preview, stats) of dataset key of file_path, None if the file changed or is not cached.
+
+    With shape, a preview of data of another shape is not returned.
+    """
+    previews = load_previews(file_path)
+    if not previews or key not in previews:
+        return None
+    preview, stats = previews[key]
+    if shape is not None and list(stats['shape']) != [int(n) for n in shape]:
+        return None
+    return preview, stats
+
+
+def store_previews(file_path, datasets):
+    """Compute and cache previews of the datasets read from file_path."""
+    previews = {key: make_preview(data) for key, data in datasets.items()}
+    meta = {'signature': _file_signature(file_path), 'path': os.path.abspath(file_path),
+            'datasets': [[key, stats] for key, (_, stats) in previews.items()]}
+    arrays = {f'preview_{n}': preview for n, (preview, _) in enumerate(previews.values())}
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write to a temporary file first, so readers never see a partial cache file
+    cache_file = _cache_file(file_path)
+    temp_file = cache_file + f'.{os.getpid()}.tmp'
+    with open(temp_file, 'wb') as fp:
+        np.savez(fp, meta=np.array(json.dumps(meta)), **arrays)
+    os.replace(temp_file, cache_file)
+    return previews
+
+
+def get_previews(file_path):
+    """Previews of file_path, from the cache or by opening the file lazily."""
+    previews = load_previews(file_path)
+    if previews is None:
+        from .file_loader import read_file
+        loaded = read_file(file_path, lazy=True)
+        previews = store_previews(file_path, loaded)
+        for data in loaded.values():
+            if isinstance(data, lazy_data.LazyArray):
+                data.close()
+    return previews
+
+
+def clear_cache():
+    """Delete all cached previews."""
+    if os.path.isdir(CACHE_DIR):
+        for name in os.listdir(CACHE_DIR):
+            os.remove(os.path.join(CACHE_DIR, name))
+
+
+def recent_files():
+    """Recently opened files that still exist, most recent first."""
+    try:
+        with open(RECENT_FILE, encoding='utf-8') as fp:
+            paths = json.load(fp)
+    except (OSError, ValueError):
+        return []
+    return [path for path in paths if os.path.exists(path)]
+
+
+def add_recent_file(file_path):
+    """Put file_path at the top of the recent files."""
+    file_path = os.path.abspath(file_path)
+    paths = [file_path] + [path for path in recent_files() if path != file_path]
+    os.makedirs(os.path.dirname(RECENT_FILE), exist_ok=True)
+    with open(RECENT_FILE, 'w', encoding='utf-8') as fp:
+        json.dump(paths[:MAX_RECENT], fp)
+    return paths[:MAX_RECENT]
@@ -20,6 +20,9 @@ import numpy as np
 
 class ProbeDialog(QtWidgets.QWidget):
     """Dialog for probe settings and aberration control."""
+
+    # Results stored with the session
+    state_attributes = ('key', 'aberrations')
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -0,0 +1,242 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# provenance: How derived datasets were made.
+#       - Operations registered by name, applied to datasets by key
+#       - ProvenanceGraph: operation, parameters and input versions of
+#         every derived dataset; repeating an operation on unchanged
+#         inputs returns the stored result without computing it
+#       - Evicted results are recomputed when they are read again
+#       - Saved with the session as a dialog-like state
+#
+#####################################################################
+"""
+import json
+import threading
+import weakref
+
+import numpy as np
+
+from . import lazy_data
+from .dataset import Dataset
+from .dataset_store import unique_key
+
+# Operations by name: function(*input datasets, **params) -> array
+OPERATIONS = {}
+
+
+def operation(name):
+    """Decorator registering a function as operation name."""
+    def register(function):
+        OPERATIONS[name] = function
+        return function
+    return register
+
+
+@operation('sum_frames')
+def sum_frames(data):
+    """Sum over the first axis, read block by block (decoded in parallel for streamed stacks)."""
+    total = np.zeros(data.shape[1:], dtype=np.float64)
+    for _, block in lazy_data.iter_blocks(data):
+        total += block.sum(axis=0)
+    return total
+
+
+@operation('average_frames')
+def average_frames(data):
+    """Average over the first axis."""
+    return sum_frames(data) / data.shape[0]
+
+
+def _stamp(data):
+    """Identity and version of a dataset, to tell whether it changed since."""
+    if data is None:
+        return None
+    return weakref.ref(data), getattr(data, 'version', 0)
+
+
+def _matches(stamp, data):
+    return stamp is not None and data is not None and stamp[0]() is data and stamp[1] == getattr(data, 'version', 0)
+
+
+class Step:
+    """Operation and parameters that made a derived dataset from its inputs."""
+
+    __slots__ = ('operation', 'params', 'inputs', 'input_stamps', 'result_stamp')
+
+    def __init__(self, operation, params, inputs):
+        self.operation = operation
+        self.params = params
+        self.inputs = list(inputs)
+        self.input_stamps = [None] * len(self.inputs)
+        self.result_stamp = None
+
+    @property
+    def signature(self):
+        return self.operation, json.dumps(self.params, sort_keys=True), tuple(self.inputs)
+
+    def __repr__(self):
+        return f"Step({self.operation!r}, {self.params!r}, inputs={self.inputs!r})"
+
+
+class DerivedArray(lazy_data.LazyArray):
+    """Stand-in for the array of an evicted result; recomputed when first read."""
+
+    def __init__(self, graph, key, shape, dtype):
+        super().__init__(shape, dtype)
+        self.graph = graph
+        self.key = key
+        self._array = None
+
+    def _read(self, key):
+        if self._array is None:
+            self._array = self.graph.recompute(self.key)
+        return self._array[key]
+
+
+class ProvenanceGraph:
+    """Steps of the derived datasets in ``datasets`` (a DatasetStore), by result key.
+
+    ``derive`` applies a registered operation to datasets given by key
+    and stores the result through ``add(key, data)`` (by default the
+    store itself). A result is current while it and all its inputs are
+    the same objects with the same versions as when it was made; asking
+    for the same operation, parameters and inputs again then returns
+    its key at once. Datasets that are removed take their step along.
+    """
+
+    def __init__(self, datasets, add=None):
+        self.datasets = datasets
+        self.add = add if add is not None else datasets.__setitem__
+        self.steps = {}
+        self._memo = {}
+        self._lock = threading.RLock()
+        datasets.subscribe(self._dataset_event)
+
+    def __contains__(self, key):
+        return key in self.steps
+
+    def _dataset_event(self, event, key):
+        if event == 'removed':
+            self.forget(key)
+        elif event == 'cleared':
+            self.steps.clear()
+            self._memo.clear()
+
+    def forget(self, key):
+        step = self.steps.pop(key, None)
+        if step is not None and self._memo.get(step.signature) == key:
+            del self._memo[step.signature]
+
+    def is_current(self, key):
+        """True if the result of key was made from the present versions of its inputs."""
+        step = self.steps.get(key)
+        if step is None or not _matches(step.result_stamp, self.datasets.peek(key)):
+            return False
+        return all(_matches(stamp, self.datasets.peek(name)) for name, stamp in zip(step.inputs, step.input_stamps))
+
+    def lookup(self, operation, inputs, params=None):
+        """Key of the current result of operation on inputs, or None."""
+        key = self._memo.get(Step(operation, params or {}, inputs).signature)
+        return key if key is not None and self.is_current(key) else None
+
+    def derive(self, operation, inputs, params=None, key=None, title=None):
+        """Key of operation applied to the datasets of inputs (a list of keys).
+
+        The stored result is returned if it is current; otherwise the
+        operation is computed and its result stored under key (by
+        default ``"<first input>_<operation>"``). A dataset under key
+        that is not an earlier result of the same step is not replaced;
+        the result then goes to ``key_1``, ``key_2``, ...
+        """
+        if operation not in OPERATIONS:
+            raise KeyError(f"Unknown operation {operation!r}")
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        params = params or {}
+        found = self.lookup(operation, inputs, params)
+        if found is not None:
+            return found
+        step = Step(operation, params, inputs)
+        sources = [self.datasets.peek(name) for name in inputs]
+        result = OPERATIONS[operation](*sources, **params)
+        if key is None:
+            key = f"{inputs[0]}_{operation}"
+        key = unique_key(self.datasets, key,
+                         lambda name: name in self.steps and self.steps[name].signature == step.signature)
+        if title is None:
+            title = f"{operation} of {', '.join(inputs)}"
+        self.add(key, Dataset(result, title=title, metadata={'provenance': self.describe(step)}))
+        step.input_stamps = [_stamp(data) for data in sources]
+        step.result_stamp = _stamp(self.datasets.peek(key))
+        self.forget(key)
+        self.steps[key] = step
+        self._memo[step.signature] = key
+        return key
+
+    def describe(self, step):
+        return {'operation': step.operation, 'params': step.params, 'inputs': step.inputs}
+
+    def lineage(self, key):
+        """Steps leading to key, inputs first, as (key, step) pairs."""
+        lineage, seen = [], set()
+
+        def visit(name):
+            if name in seen or name not in self.steps:
+                return
+            seen.add(name)
+            for source in self.steps[name].inputs:
+                visit(source)
+            lineage.append((name, self.steps[name]))
+
+        visit(key)
+        return lineage
+
+    # Eviction
+
+    def evict(self, key):
+        """Drop the array of a current result held in memory; True if dropped.
+
+        The dataset keeps its place (and identity and version); its data
+        are recomputed from the inputs when they are read again.
+        """
+        data = self.datasets.peek(key)
+        if not self.is_current(key) or not isinstance(data, Dataset) or lazy_data.is_lazy(data.array):
+            return False
+        data.array = DerivedArray(self, key, data.shape, data.dtype)
+        return True
+
+    def recompute(self, key):
+        """Compute the result of key again and put it back into its dataset."""
+        with self._lock:
+            step = self.steps[key]
+            data = self.datasets.peek(key)
+            if not isinstance(data.array, DerivedArray):
+                return data.array
+            sources = [self.datasets.peek(name) for name in step.inputs]
+            array = np.asarray(OPERATIONS[step.operation](*sources, **step.params))
+            data.array = array
+            return array
+
+    # Session state
+
+    def state(self):
+        """Steps as a JSON-able structure, for the session."""
+        return {'steps': [dict(self.describe(step), key=key, current=self.is_current(key))
+                          for key, step in self.steps.items()]}
+
+    def restore(self, state):
+        """Steps from a session state; results current when saved stay current."""
+        for entry in state.get('steps', []):
+            key = entry.get('key')
+            if key not in self.datasets or entry.get('operation') not in OPERATIONS:
+                continue
+            step = Step(entry['operation'], entry.get('params') or {}, entry.get('inputs') or [])
+            if entry.get('current') and all(name in self.datasets for name in step.inputs):
+                step.input_stamps = [_stamp(self.datasets.peek(name)) for name in step.inputs]
+                step.result_stamp = _stamp(self.datasets.peek(key))
+            self.forget(key)
+            self.steps[key] = step
+            self._memo[step.signature] = key
@@ -0,0 +1,153 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# RecentFilesPanel: Recently opened files with cached previews.
+#       - Previews read from the preview cache in the background, or
+#         computed there if missing
+#       - Opening a file moves (or adds) only its entry
+#       - Full data are loaded only when an entry is selected
+#
+#####################################################################
+"""
+import os
+
+try:
+    from PyQt6 import QtWidgets, QtCore, QtGui
+except ImportError:
+    from PyQt5 import QtWidgets, QtCore, QtGui
+
+import numpy as np
+
+from . import preview_cache
+from .style import format_bytes
+
+ICON_SIZE = 64
+
+
+def preview_icon(preview, size=ICON_SIZE):
+    """Icon of a preview: grey scale image or spectrum trace."""
+    pixmap = QtGui.QPixmap(size, size)
+    pixmap.fill(QtGui.QColor('white'))
+    if preview.ndim == 2 and preview.size:
+        low, high = np.nanmin(preview), np.nanmax(preview)
+        scaled = (preview - low) / (high - low) * 255 if high > low else np.zeros_like(preview)
+        image = np.ascontiguousarray(np.nan_to_num(scaled), dtype=np.uint8)
+        qimage = QtGui.QImage(image.data, image.shape[1], image.shape[0], image.strides[0],
+                              QtGui.QImage.Format.Format_Grayscale8)
+        pixmap = QtGui.QPixmap.fromImage(qimage.copy()).scaled(
+            size, size, QtCore.Qt.AspectRatioMode.KeepAspectRatio)
+    elif preview.ndim == 1 and preview.size > 1:
+        low, high = np.nanmin(preview), np.nanmax(preview)
+        y = (preview - low) / (high - low) if high > low else np.zeros_like(preview)
+        x = np.linspace(0, size - 1, preview.size)
+        painter = QtGui.QPainter(pixmap)
+        painter.setPen(QtGui.QPen(QtGui.QColor('#3498db'), 1))
+        painter.drawPolyline(QtGui.QPolygonF([QtCore.QPointF(float(a), float((1 - b) * (size - 1)))
+                                              for a, b in zip(x, np.nan_to_num(y))]))
+        painter.end()
+    return QtGui.QIcon(pixmap)
+
+
+def preview_tooltip(key, stats):
+    """Tooltip text with the basic statistics of a dataset."""
+    lines = [key, f"Shape: {tuple(stats['shape'])}", f"Type: {stats['dtype']}",
+             f"Size: {format_bytes(stats['nbytes'])}"]
+    if 'min' in stats:
+        lines.append(f"Range: {stats['min']:.4g} .. {stats['max']:.4g}")
+    return '\n'.join(lines)
+
+
+class PreviewSignals(QtCore.QObject):
+    """Signals of a preview job."""
+    finished = QtCore.pyqtSignal(str, dict)
+
+
+class PreviewTask(QtCore.QRunnable):
+    """Computes the previews of one file in a worker thread."""
+
+    def __init__(self, file_path, signals):
+        super().__init__()
+        self.file_path = file_path
+        self.signals = signals
+
+    def run(self):
+        try:
+            previews = preview_cache.get_previews(self.file_path)
+        except Exception:
+            previews = {}
+        self.signals.finished.emit(self.file_path, previews)
+
+
+class RecentFilesPanel(QtWidgets.QWidget):
+    """List of recently opened files; selecting an entry loads the file."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.parent = parent
+        self.name = 'Recent'
+        self.setWindowTitle(self.name)
+        self.items = {}
+
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(2)
+        self.signals = PreviewSignals()
+        self.signals.finished.connect(self._preview_ready)
+
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.setContentsMargins(10, 10, 10, 10)
+        self.file_list = QtWidgets.QListWidget()
+        self.file_list.setIconSize(QtCore.QSize(ICON_SIZE, ICON_SIZE))
+        self.file_list.itemActivated.connect(self._open_item)
+        self.file_list.itemDoubleClicked.connect(self._open_item)
+        layout.addWidget(self.file_list)
+        self.refresh()
+
+    def refresh(self):
+        """Fill the list from the recent files; previews are read from the cache in the background."""
+        self.file_list.clear()
+        self.items = {}
+        for file_path in preview_cache.recent_files():
+            self.file_list.addItem(self._new_item(file_path))
+
+    def add_file(self, file_path):
+        """Move file_path to the top of the recent files; only its entry is updated."""
+        paths = preview_cache.add_recent_file(file_path)
+        file_path = paths[0]
+        item = self.items.get(file_path)
+        if item is None:
+            item = self._new_item(file_path)
+        else:
+            self.file_list.takeItem(self.file_list.row(item))
+            # The file may have changed since its preview was read
+            self.pool.start(PreviewTask(file_path, self.signals))
+        self.file_list.insertItem(0, item)
+        kept = set(paths)
+        for path in [path for path in self.items if path not in kept]:
+            self.file_list.takeItem(self.file_list.row(self.items.pop(path)))
+
+    def _new_item(self, file_path):
+        item = QtWidgets.QListWidgetItem(os.path.basename(os.path.normpath(file_path)))
+        item.setData(QtCore.Qt.ItemDataRole.UserRole, file_path)
+        item.setToolTip(file_path)
+        self.items[file_path] = item
+        self.pool.start(PreviewTask(file_path, self.signals))
+        return item
+
+    def _set_preview(self, item, file_path, previews):
+        if not previews:
+            return
+        key, (preview, stats) = next(iter(previews.items()))
+        item.setIcon(preview_icon(preview))
+        item.setToolTip(file_path + '\n' + preview_tooltip(key, stats))
+
+    def _preview_ready(self, file_path, previews):
+        item = self.items.get(file_path)
+        if item is not None:
+            self._set_preview(item, file_path, previews)
+
+    def _open_item(self, item):
+        file_path = item.data(QtCore.Qt.ItemDataRole.UserRole)
+        if self.parent is not None and file_path:
+            self.parent.load_file(file_path)
@@ -0,0 +1,115 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# redraw: Scheduling of plot redraws.
+#       - Plots are layers with a draw function; requests only mark
+#         layers dirty
+#       - Requests are coalesced into at most one redraw per frame, so
+#         a burst of edits costs one redraw of each layer changed
+#       - Every redraw is timed per layer
+#
+#####################################################################
+"""
+import time
+
+try:
+    from PyQt6 import QtCore
+except ImportError:
+    from PyQt5 import QtCore
+
+# Shortest time between two redraws (60 frames per second)
+FRAME_MS = 16
+
+
+class LayerTiming:
+    """Number, last, longest and total duration (seconds) of the redraws of a layer."""
+
+    __slots__ = ('count', 'last', 'longest', 'total')
+
+    def __init__(self):
+        self.count = 0
+        self.last = 0.0
+        self.longest = 0.0
+        self.total = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.last = seconds
+        self.longest = max(self.longest, seconds)
+        self.total += seconds
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class RedrawScheduler(QtCore.QObject):
+    """Redraws dirty layers once per frame, in the order the layers were added.
+
+    ``request(name)`` marks a layer dirty and returns at once; the
+    layers marked until the next frame are drawn together by ``flush``
+    (called by a timer, or directly when a plot is needed right away).
+    ``requests`` counts the requests, ``timings`` the redraws.
+    """
+
+    redrawn = QtCore.pyqtSignal(str, float)
+
+    def __init__(self, parent=None, frame_ms=FRAME_MS):
+        super().__init__(parent)
+        self.frame_ms = frame_ms
+        self.layers = {}
+        self.timings = {}
+        self.dirty = set()
+        self.requests = 0
+        self._last_flush = None
+        self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self.flush)
+
+    def add_layer(self, name, draw):
+        """Register draw() as the function redrawing layer name."""
+        self.layers[name] = draw
+        self.timings[name] = LayerTiming()
+
+    def request(self, *names):
+        """Mark layers dirty; they are redrawn at the next frame."""
+        for name in names:
+            if name not in self.layers:
+                raise KeyError(f"Unknown layer {name!r}")
+            self.dirty.add(name)
+            self.requests += 1
+        if self.dirty and not self.timer.isActive():
+            delay = 0
+            if self._last_flush is not None:
+                elapsed = (time.perf_counter() - self._last_flush) * 1000
+                delay = max(0, int(self.frame_ms - elapsed))
+            self.timer.start(delay)
+
+    def is_dirty(self, name=None):
+        return bool(self.dirty) if name is None else name in self.dirty
+
+    def flush(self):
+        """Redraw the dirty layers now."""
+        self.timer.stop()
+        self._last_flush = time.perf_counter()
+        dirty, self.dirty = self.dirty, set()
+        for name, draw in self.layers.items():
+            if name in dirty:
+                start = time.perf_counter()
+                draw()
+                seconds = time.perf_counter() - start
+                self.timings[name].add(seconds)
+                self.redrawn.emit(name, seconds)
+        # Layers requested while drawing are drawn in the next frame
+        if self.dirty:
+            self.timer.start(self.frame_ms)
+
+    def summary(self):
+        """Number of requests, then one line per layer with its redraws and their durations."""
+        lines = [f"{self.requests} redraw requests"]
+        lines += [f"{name}: {timing.count} redraws, mean {timing.mean * 1000:.1f} ms, "
+                  f"longest {timing.longest * 1000:.1f} ms"
+                  for name, timing in self.timings.items() if timing.count]
+        return '\n'.join(lines)
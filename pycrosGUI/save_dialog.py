@@ -0,0 +1,164 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# H5SaveDialog: Options for saving datasets as HDF5.
+#       - Compression (none, gzip, lzf) and byte shuffle
+#       - Chunk shape (automatic or explicit)
+#       - Codec benchmark on the current dataset
+#
+#####################################################################
+"""
+try:
+    from PyQt6 import QtWidgets, QtCore
+except ImportError:
+    from PyQt5 import QtWidgets, QtCore
+
+from . import h5_writer
+from .style import COLORS
+
+
+class H5SaveDialog(QtWidgets.QDialog):
+    """Dialog for HDF5 chunking and compression options."""
+
+    def __init__(self, data=None, parent=None):
+        super().__init__(parent)
+        self.data = data
+
+        self.setWindowTitle("HDF5 Save Options")
+        self.setMinimumWidth(420)
+        self._init_ui()
+
+    def _init_ui(self):
+        """Initialize the user interface."""
+        layout = QtWidgets.QGridLayout(self)
+        row = 0
+
+        layout.addWidget(QtWidgets.QLabel("Compression"), row, 0)
+        self.compression_box = QtWidgets.QComboBox()
+        self.compression_box.addItems(['gzip', 'lzf', 'none'])
+        self.compression_box.currentTextChanged.connect(self._compression_changed)
+        layout.addWidget(self.compression_box, row, 1)
+
+        row += 1
+        layout.addWidget(QtWidgets.QLabel("gzip Level"), row, 0)
+        self.level_box = QtWidgets.QSpinBox()
+        self.level_box.setRange(0, 9)
+        self.level_box.setValue(4)
+        layout.addWidget(self.level_box, row, 1)
+
+        row += 1
+        self.shuffle_box = QtWidgets.QCheckBox("Byte shuffle")
+        self.shuffle_box.setChecked(True)
+        layout.addWidget(self.shuffle_box, row, 0, 1, 2)
+
+        row += 1
+        layout.addWidget(QtWidgets.QLabel("Chunks"), row, 0)
+        self.chunks_edit = QtWidgets.QLineEdit("auto")
+        if self.data is not None:
+            guess = h5_writer.guess_chunks(self.data.shape, self.data.dtype)
+            self.chunks_edit.setToolTip(f"auto: {guess}")
+        layout.addWidget(self.chunks_edit, row, 1)
+
+        row += 1
+        self.benchmark_button = QtWidgets.QPushButton("Benchmark Codecs")
+        self.benchmark_button.clicked.connect(self.run_benchmark)
+        self.benchmark_button.setEnabled(self.data is not None)
+        layout.addWidget(self.benchmark_button, row, 0, 1, 2)
+
+        row += 1
+        self.results = QtWidgets.QTableWidget(0, 3)
+        self.results.setHorizontalHeaderLabels(['Codec', 'MB/s', 'Ratio'])
+        self.results.verticalHeader().setVisible(False)
+        self.results.setVisible(False)
+        self.results.cellDoubleClicked.connect(self._use_codec)
+        layout.addWidget(self.results, row, 0, 1, 2)
+
+        row += 1
+        button_layout = QtWidgets.QHBoxLayout()
+        button_layout.addStretch()
+        ok_btn = QtWidgets.QPushButton("Save")
+        ok_btn.setStyleSheet(f"QPushButton {{background-color: {COLORS['success']}; color: white;}}")
+        ok_btn.clicked.connect(self.accept)
+        button_layout.addWidget(ok_btn)
+        cancel_btn = QtWidgets.QPushButton("Cancel")
+        cancel_btn.setStyleSheet(f"QPushButton {{background-color: {COLORS['danger']}; color: white;}}")
+        cancel_btn.clicked.connect(self.reject)
+        button_layout.addWidget(cancel_btn)
+        layout.addLayout(button_layout, row, 0, 1, 2)
+
+    def _compression_changed(self, text):
+        self.level_box.setEnabled(text == 'gzip')
+        self.shuffle_box.setEnabled(text != 'none')
+
+    def chunks(self):
+        """Chunk shape entered by the user, None for automatic.
+
+        Raises ValueError if the entry is not a chunk shape of the dataset.
+        """
+        text = self.chunks_edit.text().strip().lower()
+        if text in ['', 'auto']:
+            return None
+        try:
+            chunks = tuple(int(n) for n in text.replace('x', ',').split(',') if n.strip())
+        except ValueError:
+            raise ValueError(f"'{self.chunks_edit.text()}' is not a chunk shape; "
+                             "enter sizes separated by commas, e.g. 1, 256, 256, or auto") from None
+        if not chunks or min(chunks) < 1:
+            raise ValueError("Chunk sizes must be positive integers")
+        if self.data is not None and len(chunks) != self.data.ndim:
+            raise ValueError(f"The dataset has {self.data.ndim} dimensions, "
+                             f"but {len(chunks)} chunk sizes were entered")
+        return chunks
+
+    def _check_chunks(self):
+        """True if the chunk entry is valid; warns and selects it if not."""
+        try:
+            self.chunks()
+        except ValueError as e:
+            QtWidgets.QMessageBox.warning(self, "Invalid Chunks", str(e))
+            self.chunks_edit.setFocus()
+            self.chunks_edit.selectAll()
+            return False
+        return True
+
+    def accept(self):
+        """Close the dialog only if the options are valid."""
+        if self._check_chunks():
+            super().accept()
+
+    def options(self):
+        """Keyword arguments for h5_writer.write_hdf5."""
+        compression = self.compression_box.currentText()
+        return {
+            'chunks': self.chunks(),
+            'compression': None if compression == 'none' else compression,
+            'compression_opts': self.level_box.value() if compression == 'gzip' else None,
+            'shuffle': self.shuffle_box.isChecked() and compression != 'none',
+        }
+
+    def run_benchmark(self):
+        """Write a sample of the dataset with every codec and list speed and ratio."""
+        if not self._check_chunks():
+            return
+        QtWidgets.QApplication.setOverrideCursor(QtCore.Qt.CursorShape.WaitCursor)
+        try:
+            results = h5_writer.benchmark_codecs(self.data, chunks=self.chunks())
+        finally:
+            QtWidgets.QApplication.restoreOverrideCursor()
+        self.results.setRowCount(len(results))
+        for row, result in enumerate(results):
+            self.results.setItem(row, 0, QtWidgets.QTableWidgetItem(result['name']))
+            self.results.setItem(row, 1, QtWidgets.QTableWidgetItem(f"{result['mb_per_s']:.0f}"))
+            self.results.setItem(row, 2, QtWidgets.QTableWidgetItem(f"{result['ratio']:.2f}"))
+        self.results.resizeColumnsToContents()
+        self.results.setToolTip("Double click a codec to use it")
+        self.results.setVisible(True)
+
+    def _use_codec(self, row, column):
+        name, compression, compression_opts, shuffle = h5_writer.CODECS[row]
+        self.compression_box.setCurrentText(compression or 'none')
+        if compression_opts is not None:
+            self.level_box.setValue(compression_opts)
+        self.shuffle_box.setChecked(shuffle)
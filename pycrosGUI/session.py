@@ -0,0 +1,379 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# session: One HDF5 container for a whole analysis session.
+#       - All datasets (chunked and compressed)
+#       - State of every dialog (edits, fit results)
+#       - Incremental saves: only changed datasets and states are written,
+#         in place where their shape and dtype are unchanged
+#       - Save as: stored datasets are copied without decoding them; also
+#         compacts a session file that grew by rewritten datasets
+#
+#####################################################################
+"""
+import hashlib
+import json
+import os
+import weakref
+
+try:
+    from PyQt6 import QtWidgets
+except ImportError:
+    from PyQt5 import QtWidgets
+
+import numpy as np
+
+from . import h5_writer
+from . import lazy_data
+from .dataset import Dataset, unwrap
+
+SESSION_VERSION = 1
+
+# Codec of session datasets, favouring speed over ratio
+SESSION_CODEC = {'compression': 'lzf', 'shuffle': True}
+
+# A session file is compacted once this fraction of it (and at least
+# COMPACT_MIN_BYTES) is no longer used by any dataset
+COMPACT_FRACTION = 0.5
+COMPACT_MIN_BYTES = 16 * 1024 * 1024
+
+
+def encode_state(value, arrays, path='state'):
+    """Split a state into a JSON-able structure and a dict of arrays.
+
+    Arrays are replaced by ``{'__array__': name}`` references; values that
+    can not be stored are dropped.
+    """
+    if isinstance(value, np.ndarray):
+        arrays[path] = value
+        return {'__array__': path}
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, dict):
+        encoded = {}
+        for key, item in value.items():
+            try:
+                encoded[str(key)] = encode_state(item, arrays, f'{path}.{key}')
+            except TypeError:
+                continue
+        return encoded
+    if isinstance(value, (list, tuple)):
+        return [encode_state(item, arrays, f'{path}.{n}') for n, item in enumerate(value)]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"Can not store {type(value).__name__} in a session")
+
+
+def decode_state(value, arrays):
+    """Inverse of encode_state."""
+    if isinstance(value, dict):
+        if set(value) == {'__array__'}:
+            return arrays.get(value['__array__'])
+        return {key: decode_state(item, arrays) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_state(item, arrays) for item in value]
+    return value
+
+
+def dialog_state(dialog):
+    """Texts of all line edits (and lists of them) and the result attributes of a dialog.
+
+    Result attributes are listed in the ``state_attributes`` of the dialog.
+    """
+    edits = {}
+    for name, widget in vars(dialog).items():
+        if isinstance(widget, QtWidgets.QLineEdit):
+            edits[name] = widget.text()
+        elif isinstance(widget, list) and widget and all(isinstance(w, QtWidgets.QLineEdit) for w in widget):
+            edits[name] = [w.text() for w in widget]
+    attributes = {name: getattr(dialog, name, None) for name in getattr(dialog, 'state_attributes', ())}
+    return {'edits': edits, 'attributes': attributes}
+
+
+def restore_dialog_state(dialog, state):
+    """Set line edits and result attributes of a dialog from a saved state."""
+    for name, text in state.get('edits', {}).items():
+        widget = getattr(dialog, name, None)
+        if isinstance(widget, QtWidgets.QLineEdit):
+            widget.setText(text)
+        elif isinstance(widget, list) and isinstance(text, list):
+            for w, t in zip(widget, text):
+                if isinstance(w, QtWidgets.QLineEdit):
+                    w.setText(t)
+    for name, value in state.get('attributes', {}).items():
+        if name in getattr(dialog, 'state_attributes', ()):
+            setattr(dialog, name, value)
+
+
+def pack_state(state):
+    """JSON text, arrays and digest of a state."""
+    arrays = {}
+    text = json.dumps(encode_state(state, arrays), sort_keys=True)
+    digest = hashlib.sha1(text.encode('utf-8'))
+    for path in sorted(arrays):
+        digest.update(np.ascontiguousarray(arrays[path]).tobytes())
+    return text, arrays, digest.hexdigest()
+
+
+def _reference(data):
+    try:
+        return weakref.ref(data)
+    except TypeError:
+        return lambda: None
+
+
+def _attributes(data):
+    return data.attrs if isinstance(data, Dataset) else None
+
+
+class ChangeTracker:
+    """Remembers which dataset objects (and versions) were stored under a key.
+
+    Datasets are compared by identity, plus their ``version`` if they have
+    one; the attributes of a Dataset are compared on their own, so that
+    a change of metadata only does not rewrite the array. In-place
+    changes of plain arrays have to be marked with ``forget``.
+    """
+
+    def __init__(self):
+        self._stored = {}
+
+    def array_stored(self, key, data):
+        """True if the array of data is stored under key (its attributes may differ)."""
+        reference, version, _ = self._stored.get(key, (None, None, None))
+        return reference is not None and reference() is data and version == getattr(data, 'version', None)
+
+    def is_stored(self, key, data):
+        return self.array_stored(key, data) and self._stored[key][2] == _attributes(data)
+
+    def stamp(self, data):
+        """Version and attributes of data, as compared by is_stored."""
+        return getattr(data, 'version', None), _attributes(data)
+
+    def remember(self, key, data, stamp=None):
+        """Mark data as stored under key; stamp (by default the present one) as taken when it was read."""
+        version, attributes = stamp if stamp is not None else self.stamp(data)
+        self._stored[key] = (_reference(data), version, attributes)
+
+    def forget(self, key):
+        self._stored.pop(key, None)
+
+
+class Session:
+    """Session container file, kept open while the session is in use.
+
+    Layout::
+
+        /datasets/dataset_0000   one HDF5 dataset per dataset, attrs: key and
+                                 the attributes of the Dataset
+        /state/<dialog name>     attrs: json, digest; datasets for arrays
+        /                        attrs: version, main
+
+    ``save`` only rewrites datasets that are new or changed since they
+    were last saved or loaded, and dialog states whose content changed.
+    Changed datasets of unchanged shape and dtype are overwritten in
+    place; space freed by others is only given back by rewriting the
+    file with ``save_as`` (see ``needs_compacting``).
+    """
+
+    def __init__(self, file_path):
+        import h5py
+
+        self.file_path = file_path
+        self.h5_file = h5py.File(file_path, 'a')
+        self.datasets_group = self.h5_file.require_group('datasets')
+        self.state_group = self.h5_file.require_group('state')
+        self.names = {self.datasets_group[name].attrs.get('key', name): name
+                      for name in self.datasets_group}
+        self.tracker = ChangeTracker()
+
+    def mark_changed(self, key):
+        """Force key to be written at the next save (e.g. after in-place edits)."""
+        self.tracker.forget(key)
+
+    def _new_name(self):
+        n = len(self.names)
+        while f'dataset_{n:04d}' in self.datasets_group:
+            n += 1
+        return f'dataset_{n:04d}'
+
+    def load(self):
+        """Datasets (of lazy arrays), dialog states and main key of the session."""
+        datasets = {}
+        for key, name in self.names.items():
+            array = lazy_data.H5Array(self.datasets_group[name])
+            data = Dataset.from_attrs(array, array.attrs)
+            datasets[key] = data
+            self.tracker.remember(key, data)
+        states = {}
+        for name, group in self.state_group.items():
+            arrays = {path: group[path][()] for path in group}
+            states[name] = decode_state(json.loads(group.attrs['json']), arrays)
+        main = self.h5_file.attrs.get('main', '')
+        return datasets, states, main
+
+    def save(self, datasets, states=None, main='', progress=None, **options):
+        """Write changed datasets and states; returns (written, unchanged) keys."""
+        options = {**SESSION_CODEC, **options}
+        written, unchanged = [], []
+
+        for key in list(self.names):
+            if key not in datasets:
+                del self.datasets_group[self.names.pop(key)]
+                self.tracker.forget(key)
+
+        changed = [key for key, data in datasets.items() if not self.tracker.is_stored(key, data)]
+        unchanged = [key for key in datasets if key not in changed]
+
+        # Only the attributes changed: update them in place, the array stays
+        for key in list(changed):
+            data = datasets[key]
+            if key not in self.names or not self.tracker.array_stored(key, data):
+                continue
+            changed.remove(key)
+            self.datasets_group[self.names[key]].attrs.update(data.attrs)
+            written.append(key)
+            self.tracker.remember(key, data)
+
+        for index, key in enumerate(changed):
+            data = datasets[key]
+            array = unwrap(data)
+            name = self.names.get(key)
+            dataset = self.datasets_group[name] if name is not None else None
+            if dataset is not None and (dataset.shape != tuple(array.shape) or dataset.dtype != array.dtype):
+                del self.datasets_group[name]
+                dataset = None
+            elif name is None:
+                name = self.names[key] = self._new_name()
+
+            def report(fraction):
+                if progress is not None:
+                    progress((index + fraction) / len(changed))
+
+            try:
+                if dataset is not None:
+                    h5_writer.overwrite_dataset(dataset, array, progress=report)
+                else:
+                    dataset = h5_writer.write_dataset(self.datasets_group, name, array, progress=report,
+                                                      **options)
+            except BaseException:
+                # Do not leave a partial dataset behind
+                if name in self.datasets_group:
+                    del self.datasets_group[name]
+                self.names.pop(key)
+                self.tracker.forget(key)
+                raise
+            dataset.attrs['key'] = str(key)
+            if isinstance(data, Dataset):
+                dataset.attrs.update(data.attrs)
+            written.append(key)
+            self.tracker.remember(key, data)
+
+        for name, state in (states or {}).items():
+            self._save_state(name, state)
+
+        self.h5_file.attrs['version'] = SESSION_VERSION
+        self.h5_file.attrs['main'] = str(main)
+        self.h5_file.flush()
+        return written, unchanged
+
+    def _save_state(self, name, state):
+        text, arrays, digest = pack_state(state)
+        group = self.state_group.require_group(name)
+        if group.attrs.get('digest') == digest:
+            return
+        for path in list(group):
+            if path not in arrays:
+                del group[path]
+        for path, array in arrays.items():
+            array = np.asarray(array)
+            if path in group and group[path].shape == array.shape and group[path].dtype == array.dtype:
+                group[path][...] = array
+            else:
+                if path in group:
+                    del group[path]
+                group.create_dataset(path, data=array)
+        group.attrs['json'] = text
+        group.attrs['digest'] = digest
+
+    def wasted_bytes(self):
+        """Bytes of the file not taken by any dataset, e.g. left by deleted or resized ones."""
+        used = []
+
+        def add(_, item):
+            if hasattr(item, 'id') and hasattr(item.id, 'get_storage_size'):
+                used.append(item.id.get_storage_size())
+
+        self.h5_file.flush()
+        self.h5_file.visititems(add)
+        return max(0, os.path.getsize(self.file_path) - sum(used))
+
+    def needs_compacting(self):
+        """True if so much of the file is unused that it is worth rewriting with save_as."""
+        wasted = self.wasted_bytes()
+        return wasted >= COMPACT_MIN_BYTES and wasted >= COMPACT_FRACTION * os.path.getsize(self.file_path)
+
+    def close(self):
+        """Close the session file."""
+        if self.h5_file.id.valid:
+            self.h5_file.close()
+
+
+def save_as(file_path, datasets, states=None, main='', progress=None, source=None, **options):
+    """Save a session into a new file_path; returns (session, written, unchanged).
+
+    Datasets stored unchanged in the source session are copied as
+    stored, the others are written. The file is built next to
+    file_path while source stays open (its lazy arrays are still read)
+    and moved to file_path once complete. Lazy arrays of the datasets
+    read from source are then pointed at the new file and source is
+    closed; if saving fails, source is left as it was.
+
+    Saving to the file of source compacts it: only the space in use is
+    copied into the new file.
+    """
+    partial = file_path + '.part'
+    if os.path.exists(partial):
+        os.remove(partial)
+    target = Session(partial)
+    try:
+        if source is not None:
+            for key, data in datasets.items():
+                name = source.names.get(key)
+                if name is not None and source.tracker.array_stored(key, data):
+                    source.h5_file.copy(source.datasets_group[name], target.datasets_group, name=name)
+                    if isinstance(data, Dataset):
+                        target.datasets_group[name].attrs.update(data.attrs)
+                    target.names[key] = name
+                    target.tracker.remember(key, data)
+        written, unchanged = target.save(datasets, states, main, progress=progress, **options)
+    except BaseException:
+        target.close()
+        os.remove(partial)
+        raise
+    target.close()
+    # Lazy arrays reading from source, to be pointed at the new file
+    moved = []
+    for key, data in datasets.items():
+        array = unwrap(data)
+        if (source is not None and isinstance(array, lazy_data.H5Array) and array.file.id.valid
+                and array.file == source.h5_file):
+            moved.append(key)
+    if source is not None and os.path.abspath(source.file_path) == os.path.abspath(file_path):
+        # The file is replaced by its compacted copy
+        source.close()
+    os.replace(partial, file_path)
+
+    session = Session(file_path)
+    for key, data in datasets.items():
+        if key in moved:
+            array = unwrap(data)
+            array.dataset = session.datasets_group[session.names[key]]
+            array.file = session.h5_file
+            array.name = array.dataset.name
+        session.tracker.remember(key, data)
+    if source is not None:
+        source.close()
+    return session, written, unchanged
@@ -0,0 +1,295 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# si_view: Viewer of spectrum images (Spectral Image tab).
+#       - Navigator image: sum over the spectrum axis, computed once per
+#         dataset version in the background, or any image of the same
+#         size (e.g. an ADF image)
+#       - Spectrum of the pixel under the cursor, read directly from the
+#         (lazy or memory-mapped) data at most 60 times a second
+#       - Summed spectrum of a rectangular ROI, reduced block by block
+#
+#####################################################################
+"""
+try:
+    from PyQt6 import QtCore, QtWidgets
+except ImportError:
+    from PyQt5 import QtCore, QtWidgets
+
+import numpy as np
+import pyqtgraph as pg
+
+from . import lazy_data
+
+# Shortest time between two pixel spectra shown while hovering (60 Hz)
+HOVER_INTERVAL_MS = 16
+# ROIs up to this many bytes are summed while they are dragged; larger
+# ones in the background once they are dropped
+LIVE_ROI_BYTES = 16 * 1024 * 1024
+
+
+def roi_mask(shape, x0, x1, y0, y1):
+    """Mask of the navigation pixels [x0:x1, y0:y1], clipped to shape."""
+    mask = np.zeros(shape, dtype=bool)
+    mask[max(0, x0):max(0, x1), max(0, y0):max(0, y1)] = True
+    return mask
+
+
+class SIViewSignals(QtCore.QObject):
+    """Results of background jobs: (stamp, navigator) and (request, ROI spectrum)."""
+    navigator_ready = QtCore.pyqtSignal(object, object)
+    roi_ready = QtCore.pyqtSignal(int, object)
+
+
+class NavigatorTask(QtCore.QRunnable):
+    """Sums a spectrum image over its last axis in a worker thread."""
+
+    def __init__(self, stamp, array, signals):
+        super().__init__()
+        self.stamp = stamp
+        self.array = array
+        self.signals = signals
+
+    def run(self):
+        try:
+            result = lazy_data.navigator(self.array)
+        except Exception:
+            result = None
+        self.signals.navigator_ready.emit(self.stamp, result)
+
+
+class RoiTask(QtCore.QRunnable):
+    """Sums the spectra of the pixels of a mask in a worker thread."""
+
+    def __init__(self, request, array, mask, signals):
+        super().__init__()
+        self.request = request
+        self.array = array
+        self.mask = mask
+        self.signals = signals
+
+    def run(self):
+        try:
+            result = lazy_data.roi_sum(self.array, self.mask)
+        except Exception:
+            result = None
+        self.signals.roi_ready.emit(self.request, result)
+
+
+class SpectrumImageView(QtWidgets.QWidget):
+    """Navigator image of a spectrum image next to the spectra at the cursor and ROI.
+
+    Axes of the navigator are those of the Image tab (first array axis
+    horizontal, y pointing down). The spectrum of the pixel under the
+    cursor is drawn in blue, the sum of the ROI in red.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.dataset = None
+        self.images = {}
+        self.pixel = None
+        self._hover = None
+        self._stamp = None
+        self._roi_request = 0
+        self._roi_running = False
+        self._roi_next = None
+
+        layout = QtWidgets.QGridLayout(self)
+        self.navigator_box = QtWidgets.QComboBox()
+        self.navigator_box.addItem('Sum')
+        self.navigator_box.activated.connect(self.update_navigator)
+        self.pixel_label = QtWidgets.QLabel('')
+        layout.addWidget(QtWidgets.QLabel('Navigator:'), 0, 0)
+        layout.addWidget(self.navigator_box, 0, 1)
+        layout.addWidget(self.pixel_label, 0, 2)
+
+        self.navigator = pg.GraphicsLayoutWidget()
+        self.view = self.navigator.addViewBox(lockAspect=True, invertY=True)
+        self.image = pg.ImageItem(axisOrder='col-major')
+        self.view.addItem(self.image)
+        self.roi = pg.RectROI([0, 0], [1, 1], pen='r')
+        self.roi.setVisible(False)
+        self.view.addItem(self.roi)
+        self.spectrum_plot = pg.PlotWidget()
+        self.pixel_curve = self.spectrum_plot.plot(pen='b', skipFiniteCheck=True)
+        self.roi_curve = self.spectrum_plot.plot(pen='r', skipFiniteCheck=True)
+
+        splitter = QtWidgets.QSplitter(QtCore.Qt.Orientation.Horizontal)
+        splitter.addWidget(self.navigator)
+        splitter.addWidget(self.spectrum_plot)
+        layout.addWidget(splitter, 1, 0, 1, 3)
+        layout.setColumnStretch(2, 1)
+
+        self.pool = QtCore.QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        self.signals = SIViewSignals()
+        self.signals.navigator_ready.connect(self._navigator_ready)
+        self.signals.roi_ready.connect(self._roi_ready)
+
+        self.hover_timer = QtCore.QTimer(self)
+        self.hover_timer.setSingleShot(True)
+        self.hover_timer.setInterval(HOVER_INTERVAL_MS)
+        self.hover_timer.timeout.connect(self._show_hover)
+        self.navigator.scene().sigMouseMoved.connect(self._mouse_moved)
+        self.roi.sigRegionChanged.connect(lambda: self.update_roi(live=True))
+        self.roi.sigRegionChangeFinished.connect(lambda: self.update_roi(live=False))
+
+    @property
+    def array(self):
+        return getattr(self.dataset, 'array', self.dataset)
+
+    @property
+    def nav_shape(self):
+        return tuple(self.dataset.shape[:2])
+
+    def set_dataset(self, data, images=None):
+        """Show a spectrum image (a Dataset of 3 dimensions, spectrum last).
+
+        images are the datasets (by key) offered as navigator besides the
+        sum; only those of the size of the navigation axes are listed.
+        The ROI and the pixel shown are kept if the size did not change.
+        """
+        same_size = self.dataset is not None and self.nav_shape == tuple(data.shape[:2])
+        self.dataset = data
+        self.images = {key: image for key, image in (images or {}).items()
+                       if image.ndim == 2 and tuple(image.shape) == self.nav_shape}
+        selected = self.navigator_box.currentText()
+        self.navigator_box.clear()
+        self.navigator_box.addItems(['Sum'] + list(self.images))
+        if selected in self.images:
+            self.navigator_box.setCurrentText(selected)
+
+        width, height = self.nav_shape
+        if not same_size:
+            self.pixel = (width // 2, height // 2)
+            self.roi.blockSignals(True)
+            self.roi.maxBounds = QtCore.QRectF(0, 0, width, height)
+            self.roi.setPos([width // 4, height // 4])
+            self.roi.setSize([max(1, width // 8), max(1, height // 8)])
+            self.roi.blockSignals(False)
+            self.view.setRange(QtCore.QRectF(0, 0, width, height), padding=0)
+        self.roi.setVisible(True)
+        self.update_navigator()
+        self.show_pixel(*self.pixel)
+        self.update_roi(live=False)
+
+    # Navigator
+
+    def update_navigator(self, *args):
+        """Show the navigator chosen in the combo box; the sum is computed if not kept."""
+        key = self.navigator_box.currentText()
+        if key in self.images:
+            self._set_navigator(np.asarray(self.images[key].array))
+            return
+        data = self.dataset
+        if not hasattr(data, 'cached'):
+            self._set_navigator(lazy_data.navigator(data))
+        elif data.has_cached('navigator') or data.nbytes <= lazy_data.BLOCK_BYTES:
+            self._set_navigator(data.cached('navigator', lambda: lazy_data.navigator(data.array)))
+        else:
+            stamp = (id(data), data.version)
+            if stamp != self._stamp:
+                self._stamp = stamp
+                self.image.clear()
+                self.pixel_label.setText('Computing navigator...')
+                self.pool.start(NavigatorTask(stamp, data.array, self.signals))
+
+    def _navigator_ready(self, stamp, image):
+        data = self.dataset
+        if data is None or stamp != (id(data), data.version):
+            return
+        self._stamp = None
+        if image is None:
+            # Asked for again with the next update_navigator
+            self.pixel_label.setText('Navigator could not be computed')
+            return
+        data.cached('navigator', lambda: image)
+        if self.navigator_box.currentText() == 'Sum':
+            self._set_navigator(image)
+        self.pixel_label.setText(self._pixel_text())
+
+    def _set_navigator(self, image):
+        finite = image[np.isfinite(image)]
+        levels = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 1.0)
+        self.image.setImage(image, levels=levels)
+
+    # Pixel spectrum
+
+    def _mouse_moved(self, position):
+        if self.dataset is None or not self.view.sceneBoundingRect().contains(position):
+            return
+        point = self.view.mapSceneToView(position)
+        x, y = int(np.floor(point.x())), int(np.floor(point.y()))
+        width, height = self.nav_shape
+        if 0 <= x < width and 0 <= y < height:
+            self._hover = (x, y)
+            if not self.hover_timer.isActive():
+                self.hover_timer.start()
+
+    def _show_hover(self):
+        if self._hover is not None and self._hover != self.pixel:
+            self.show_pixel(*self._hover)
+
+    def show_pixel(self, x, y):
+        """Draw the spectrum of navigation pixel (x, y), read directly from the data."""
+        self.pixel = (x, y)
+        self.pixel_curve.setData(np.asarray(self.array[x, y], dtype=np.float64))
+        self.pixel_label.setText(self._pixel_text())
+
+    def _pixel_text(self):
+        return f"Pixel ({self.pixel[0]}, {self.pixel[1]})" if self.pixel is not None else ''
+
+    # ROI spectrum
+
+    def roi_bounds(self):
+        """Navigation pixels [x0:x1, y0:y1] of the ROI."""
+        x, y = self.roi.pos()
+        w, h = self.roi.size()
+        return int(round(x)), int(round(x + w)), int(round(y)), int(round(y + h))
+
+    def update_roi(self, live=False):
+        """Draw the summed spectrum of the ROI.
+
+        Small ROIs are summed at once (also while dragged); larger ones
+        in the background when dropped, the latest ROI winning.
+        """
+        if self.dataset is None:
+            return
+        x0, x1, y0, y1 = self.roi_bounds()
+        mask = roi_mask(self.nav_shape, x0, x1, y0, y1)
+        columns = np.flatnonzero(mask.any(axis=0))
+        rows = np.flatnonzero(mask.any(axis=1))
+        nbytes = rows.size * columns.size * int(np.prod(self.dataset.shape[2:])) * self.dataset.dtype.itemsize
+        self._roi_request += 1
+        if nbytes <= LIVE_ROI_BYTES:
+            self.roi_curve.setData(lazy_data.roi_sum(self.array, mask))
+        elif not live:
+            self._roi_next = (self._roi_request, mask)
+            self._start_roi()
+
+    def _start_roi(self):
+        if self._roi_running or self._roi_next is None:
+            return
+        request, mask = self._roi_next
+        self._roi_next = None
+        self._roi_running = True
+        self.pool.start(RoiTask(request, self.array, mask, self.signals))
+
+    def _roi_ready(self, request, spectrum):
+        self._roi_running = False
+        if spectrum is not None and request == self._roi_request:
+            self.roi_curve.setData(spectrum)
+        self._start_roi()
+
+    def clear(self):
+        self.dataset = None
+        self.images = {}
+        self.pixel = None
+        self.image.clear()
+        self.roi.setVisible(False)
+        self.pixel_curve.setData([])
+        self.roi_curve.setData([])
+        self.pixel_label.setText('')
@@ -0,0 +1,134 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# spectrum_plot: Drawing of very long spectra.
+#       - MinMaxPyramid: minimum and maximum of bins of 8, 16, 32, ...
+#         channels, computed once per spectrum (block by block)
+#       - SpectrumCurve: plot curve showing the envelope of the visible
+#         channels at about one bin per screen pixel, so that redrawing
+#         costs the same for any number of channels
+#
+#####################################################################
+"""
+import numpy as np
+import pyqtgraph as pg
+
+from . import lazy_data
+
+# Channels per bin of the finest level
+BASE_BIN = 8
+# Bins of the coarsest level
+MIN_BINS = 1024
+
+
+def _pair_reduce(function, values):
+    """function of neighbouring pairs; an odd last value is kept."""
+    even = len(values) // 2 * 2
+    reduced = function(values[0:even:2], values[1:even:2])
+    return np.concatenate([reduced, values[even:]]) if even < len(values) else reduced
+
+
+class MinMaxPyramid:
+    """Minima and maxima of a spectrum at bin sizes BASE_BIN, 2 * BASE_BIN, ...
+
+    ``data`` may be any 1D array, also a lazy one; it is read once to
+    build the levels and afterwards only where a view needs channels at
+    full resolution. NaN values are ignored.
+    """
+
+    def __init__(self, data, base=BASE_BIN, max_bytes=lazy_data.BLOCK_BYTES):
+        self.data = data
+        self.size = data.shape[0]
+        step = max(base, max_bytes // data.dtype.itemsize // base * base)
+        mins, maxs = [], []
+        for start in range(0, self.size, step):
+            block = np.asarray(data[start:start + step])
+            pad = -len(block) % base
+            if pad:
+                block = np.concatenate([block, np.full(pad, block[-1], dtype=block.dtype)])
+            block = block.reshape(-1, base)
+            mins.append(np.fmin.reduce(block, axis=1))
+            maxs.append(np.fmax.reduce(block, axis=1))
+        mins = np.concatenate(mins) if mins else np.zeros(0, dtype=data.dtype)
+        maxs = np.concatenate(maxs) if maxs else np.zeros(0, dtype=data.dtype)
+
+        self.levels = [(base, mins, maxs)]
+        while len(mins) > MIN_BINS:
+            mins, maxs = _pair_reduce(np.fmin, mins), _pair_reduce(np.fmax, maxs)
+            self.levels.append((self.levels[-1][0] * 2, mins, maxs))
+        self.bounds = ((float(np.nanmin(mins)), float(np.nanmax(maxs))) if len(mins) and np.isfinite(mins).any()
+                       else (0.0, 0.0))
+
+    @property
+    def nbytes(self):
+        return sum(mins.nbytes + maxs.nbytes for _, mins, maxs in self.levels)
+
+    def envelope(self, start, stop, columns):
+        """x and y of the channels start to stop drawn in columns pixels.
+
+        Where there are fewer than two channels per pixel the channels
+        themselves are returned; otherwise the minimum and maximum of
+        the bins of the coarsest level with at least one bin per pixel,
+        as pairs of points at the bin centers.
+        """
+        start = max(0, int(np.floor(start)))
+        stop = min(self.size, int(np.ceil(stop)) + 1)
+        if stop <= start:
+            return np.zeros(0), np.zeros(0)
+        per_column = (stop - start) / max(1, columns)
+        if per_column < 2 * self.levels[0][0]:
+            return np.arange(start, stop, dtype=np.float64), np.asarray(self.data[start:stop], dtype=np.float64)
+        factor, mins, maxs = next(level for level in reversed(self.levels) if level[0] <= per_column)
+        first, last = start // factor, -(-stop // factor)
+        x = np.repeat(np.arange(first, last) * factor + (factor - 1) / 2, 2)
+        y = np.empty(len(x), dtype=np.float64)
+        y[0::2] = mins[first:last]
+        y[1::2] = maxs[first:last]
+        return x, y
+
+
+class SpectrumCurve(pg.PlotCurveItem):
+    """Curve of a 1D spectrum drawn from its MinMaxPyramid.
+
+    Only the visible channels are drawn, at about one bin per pixel of
+    the view; the curve is recomputed when the view range changes. The
+    data bounds are those of the whole spectrum, so auto range is not
+    affected by what is drawn.
+    """
+
+    def __init__(self, pyramid, **kwargs):
+        super().__init__(**kwargs)
+        self.pyramid = pyramid
+        self._drawn = None
+        self.update_envelope()
+
+    def viewRangeChanged(self):
+        super().viewRangeChanged()
+        self.update_envelope()
+
+    def update_envelope(self):
+        view = self.getViewBox()
+        if view is None:
+            x_range, columns = (0, self.pyramid.size), 1024
+        else:
+            x_range, columns = view.viewRange()[0], max(1, int(view.width()))
+        drawn = (int(np.floor(x_range[0])), int(np.ceil(x_range[1])), columns)
+        if drawn == self._drawn:
+            return
+        self._drawn = drawn
+        x, y = self.pyramid.envelope(x_range[0], x_range[1], columns)
+        self.setData(x, y)
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        if ax == 0:
+            return 0, max(0, self.pyramid.size - 1)
+        return self.pyramid.bounds
+
+
+def spectrum_pyramid(data):
+    """MinMaxPyramid of a spectrum; of a Dataset built once per version."""
+    if hasattr(data, 'cached'):
+        return data.cached('minmax', lambda: MinMaxPyramid(data.array))
+    return MinMaxPyramid(data)
@@ -0,0 +1,34 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# style: Colors and formatting shared by the dialogs.
+#       - COLORS: palette of the stylesheets
+#       - format_bytes: human readable sizes
+#
+#####################################################################
+"""
+
+# Consistent color palette
+COLORS = {
+    'primary': '#3498db',
+    'primary_hover': '#2980b9',
+    'secondary': '#2c3e50',
+    'background': '#f8f9fa',
+    'text': '#2c3e50',
+    'text_light': '#7f8c8d',
+    'border': '#bdc3c7',
+    'success': '#27ae60',
+    'danger': '#e74c3c',
+    'warning': '#f39c12',
+}
+
+
+def format_bytes(n_bytes):
+    """Human readable size of n_bytes."""
+    for unit in ['B', 'kB', 'MB', 'GB']:
+        if n_bytes < 1024:
+            return f"{n_bytes:.0f} {unit}" if unit == 'B' else f"{n_bytes:.1f} {unit}"
+        n_bytes /= 1024
+    return f"{n_bytes:.1f} TB"
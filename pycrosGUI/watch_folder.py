@@ -0,0 +1,194 @@
+"""
+#####################################################################
+#
+# Part of pycrosGUI
+#
+# watch_folder: Live ingestion of files written during an acquisition.
+#       - FolderWatcher: polls a folder for new and grown files in a
+#         worker thread, so slow (network) folders do not block the GUI
+#       - LiveIngest: appends new frames to a live image stack,
+#         decoded in a worker thread, and hands other files to the loader
+#
+#####################################################################
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PyQt6 import QtCore
+except ImportError:
+    from PyQt5 import QtCore
+
+from . import image_stack
+from .dataset import unwrap
+from .dataset_store import unique_key
+
+# Milliseconds between scans of the watched folder
+POLL_INTERVAL = 500
+
+FRAME_EXTENSIONS = image_stack.IMAGE_EXTENSIONS
+
+
+class FolderWatcher(QtCore.QObject):
+    """Polls a folder and reports files once they stopped changing.
+
+    A file is reported when its size and mtime are the same in two
+    consecutive scans, so files still being written are not read.
+    Polling (instead of file system notifications) also works on
+    network shares. Files present when watching starts are ignored.
+    The timer only starts scans in a worker thread, one at a time; the
+    signals are emitted from there and queued to the receivers.
+    """
+
+    new_files = QtCore.pyqtSignal(list)
+    grown_files = QtCore.pyqtSignal(list)
+
+    def __init__(self, folder, interval=POLL_INTERVAL, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self.known = self._scan()
+        self.pending = {}
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='watch')
+        self.scan_future = None
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.start_poll)
+        self.timer.start(interval)
+
+    def start_poll(self):
+        """Start a scan in the worker thread, unless the last one is still running."""
+        if self.scan_future is None or self.scan_future.done():
+            self.scan_future = self.executor.submit(self.poll)
+
+    def _scan(self):
+        state = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    state[entry.path] = (stat.st_size, stat.st_mtime_ns)
+        return state
+
+    def poll(self):
+        """Scan the folder once; emits settled new and grown files."""
+        try:
+            state = self._scan()
+        except OSError:
+            return
+        new, grown = [], []
+        for path, signature in state.items():
+            if self.known.get(path) == signature:
+                continue
+            if self.pending.get(path) != signature:
+                # Still being written, check again at the next scan
+                self.pending[path] = signature
+                continue
+            del self.pending[path]
+            (grown if path in self.known else new).append(path)
+            self.known[path] = signature
+        if new:
+            self.new_files.emit(sorted(new))
+        if grown:
+            self.grown_files.emit(sorted(grown))
+
+    def stop(self):
+        self.timer.stop()
+        self.executor.shutdown(wait=False)
+
+
+def _inspect(file_path):
+    """Decode a single-frame image file; multi-page TIFF files are not frames."""
+    if os.path.splitext(file_path)[1].lower() in ['.tif', '.tiff']:
+        try:
+            if len(image_stack.tiff_page_offsets(file_path)[2]) > 1:
+                return None
+        except ValueError:
+            return None
+    return image_stack.decode_image_file(file_path)
+
+
+class LiveIngest(QtCore.QObject):
+    """Ingests the files reported by a FolderWatcher.
+
+    Single-frame images are decoded in a worker thread and appended, in
+    file name order, to one live ImageSequence per frame shape. Other
+    files (spectra, multi-page TIFF, HDF5, ...) are passed to
+    ``load_files``; TIFF stacks among ``datasets()`` that grew get their
+    new pages.
+    """
+
+    frames_added = QtCore.pyqtSignal(str, object)
+    _decoded = QtCore.pyqtSignal(str, object)
+
+    def __init__(self, folder, load_files, datasets=None, interval=POLL_INTERVAL, parent=None):
+        super().__init__(parent)
+        self.folder = folder
+        self.load_files = load_files
+        self.datasets = datasets if datasets is not None else dict
+        self.stacks = {}
+        self.n_files = 0
+        self.queue = []
+        self.results = {}
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='ingest')
+        self._decoded.connect(self._frame_decoded)
+        self.watcher = FolderWatcher(folder, interval, self)
+        self.watcher.new_files.connect(self.ingest)
+        self.watcher.grown_files.connect(self.ingest_grown)
+
+    def stack_key(self, frame):
+        """Dataset key of a new live stack, taken by no dataset; kept while the folder is watched."""
+        key = f"{os.path.basename(os.path.normpath(self.folder))}_live"
+        if key in self.stacks:
+            key += '_' + 'x'.join(str(n) for n in frame.shape)
+        return unique_key(set(self.datasets()) | set(self.stacks), key)
+
+    def ingest(self, file_paths):
+        """Queue new files; frames keep their order even if decoded out of order."""
+        others = []
+        for file_path in file_paths:
+            self.n_files += 1
+            if os.path.splitext(file_path)[1].lower() in FRAME_EXTENSIONS:
+                self.queue.append(file_path)
+                future = self.executor.submit(_inspect, file_path)
+                future.add_done_callback(lambda f, path=file_path: self._decoded.emit(
+                    path, f.result() if f.exception() is None else f.exception()))
+            else:
+                others.append(file_path)
+        if others:
+            self.load_files(others)
+
+    def _frame_decoded(self, file_path, frame):
+        self.results[file_path] = frame
+        others = []
+        while self.queue and self.queue[0] in self.results:
+            path = self.queue.pop(0)
+            frame = self.results.pop(path)
+            if frame is None or isinstance(frame, Exception):
+                others.append(path)
+                continue
+            self._append(path, frame)
+        if others:
+            self.load_files(others)
+
+    def _append(self, file_path, frame):
+        for key, stack in self.stacks.items():
+            if stack.shape[1:] == frame.shape and stack.dtype == frame.dtype:
+                stack.append(file_path, frame)
+                self.frames_added.emit(key, stack)
+                return
+        key = self.stack_key(frame)
+        stack = image_stack.ImageSequence([file_path], first_frame=frame)
+        self.stacks[key] = stack
+        self.frames_added.emit(key, stack)
+
+    def ingest_grown(self, file_paths):
+        """Index new pages of growing TIFF stacks."""
+        for file_path in file_paths:
+            for key, data in list(self.datasets().items()):
+                stack = unwrap(data)
+                if isinstance(stack, image_stack.TiffStack) and os.path.samefile(stack.file_path, file_path):
+                    if stack.refresh():
+                        self.frames_added.emit(key, stack)
+
+    def stop(self):
+        self.watcher.stop()
+        self.executor.shutdown(wait=False)
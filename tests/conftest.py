@@ -2,9 +2,44 @@
 Configuration and fixtures for pytest
 """
 
+import os
+
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def user_cache(tmp_path, monkeypatch):
+    """Keep caches, recent files and autosave journals of the tests out of the user's home."""
+    try:
+        from pycrosGUI import autosave, h5_index, image_pyramid, preview_cache
+    except ImportError:
+        return
+    monkeypatch.setattr(preview_cache, 'CACHE_DIR', str(tmp_path / 'cache' / 'previews'))
+    monkeypatch.setattr(preview_cache, 'RECENT_FILE', str(tmp_path / 'cache' / 'recent_files.json'))
+    monkeypatch.setattr(h5_index, 'CACHE_DIR', str(tmp_path / 'cache' / 'h5_index'))
+    monkeypatch.setattr(image_pyramid, 'CACHE_DIR', str(tmp_path / 'cache' / 'pyramids'))
+    monkeypatch.setattr(autosave, 'AUTOSAVE_DIR', str(tmp_path / 'cache' / 'autosave'))
+
+
+@pytest.fixture
+def widget(monkeypatch):
+    """Main window with message boxes recorded in its warnings instead of shown."""
+    QtCore = pytest.importorskip('PyQt5.QtCore')
+    QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    from pycrosGUI import BaseWidget
+    warnings = []
+    monkeypatch.setattr(QtWidgets.QMessageBox, 'warning', lambda parent, title, text: warnings.append(text))
+    monkeypatch.setattr(QtWidgets.QMessageBox, 'critical', lambda parent, title, text: warnings.append(text))
+    widget = BaseWidget()
+    widget.warnings = warnings
+    yield widget
+    widget.close()
+    widget.deleteLater()
+    QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.Type.DeferredDelete)
+
+
 @pytest.fixture
 def sample_data():
     """Fixture providing sample data for tests."""
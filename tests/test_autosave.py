@@ -0,0 +1,94 @@
+"""
+Tests for the crash recovery journal
+"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pycrosGUI import autosave
+
+
+@pytest.fixture
+def autosave_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(autosave, 'AUTOSAVE_DIR', str(tmp_path / 'autosave'))
+    return tmp_path / 'autosave'
+
+
+class TestJournal:
+    """Test journaling and restoring."""
+
+    def test_restore_after_crash(self, autosave_dir, tmp_path):
+        """Test that a journal left behind restores datasets and states."""
+        np.save(tmp_path / 'raw.npy', np.arange(1000.0).reshape(10, 100))
+        raw = np.load(tmp_path / 'raw.npy', mmap_mode='r')
+        derived = np.ones((10, 10))
+        states = {'LowLoss': {'edits': {'offset': '0.5'}, 'attributes': {'drude_fit': np.arange(5.0)}}}
+
+        folder = str(autosave_dir / '999999999-crashed')
+        journal = autosave.Journal(folder)
+        journal.submit(journal.changes({'raw': raw, 'derived': derived}, states, 'derived')).result()
+        # Unchanged datasets are not handed over again, unchanged states are not written again
+        deltas = journal.changes({'raw': raw, 'derived': derived}, states, 'derived')
+        assert [delta['op'] for delta in deltas] == ['state']
+        lines = open(journal.path).readlines()
+        journal.submit(deltas).result()
+        assert open(journal.path).readlines() == lines
+        derived = derived * 2
+        journal.submit(journal.changes({'raw': raw, 'derived': derived}, states, 'derived')).result()
+        journal.close(delete=False)
+
+        # The raw data are referenced, only the derived dataset is copied (once)
+        assert sorted(name for name in os.listdir(folder) if name.endswith('.npy')) == ['000003.npy']
+        assert autosave.crashed_journals() == [folder]
+
+        journal = autosave.Journal(folder)
+        datasets, restored, main = journal.restore()
+        assert main == 'derived'
+        assert np.array_equal(datasets['raw'], raw)
+        assert np.array_equal(datasets['derived'], derived)
+        assert restored['LowLoss']['edits'] == {'offset': '0.5'}
+        assert np.array_equal(restored['LowLoss']['attributes']['drude_fit'], np.arange(5.0))
+        assert [delta['op'] for delta in journal.changes(datasets, restored, main)] == ['state']
+        journal.close(delete=True)
+        assert autosave.crashed_journals() == []
+
+    def test_running_session_is_not_crashed(self, autosave_dir):
+        """Test that the journal of this process is not offered for recovery."""
+        journal = autosave.Journal(autosave.new_journal_folder())
+        journal.submit(journal.changes({'data': np.zeros(4)}, {}, 'data')).result()
+        assert autosave.crashed_journals() == []
+        journal.close()
+
+    def test_failed_write_is_retried(self, autosave_dir, monkeypatch):
+        """Test that deltas of a failed write are not counted as journaled."""
+        journal = autosave.Journal(str(autosave_dir / 'session'))
+        data = np.zeros(4)
+
+        def fail(file_path, array):
+            raise OSError('disk full')
+
+        monkeypatch.setattr(autosave, 'write_array', fail)
+        future = journal.submit(journal.changes({'data': data}, {}, 'data'))
+        with pytest.raises(OSError):
+            future.result()
+        assert not os.path.exists(journal.path)
+        monkeypatch.undo()
+
+        deltas = journal.changes({'data': data}, {}, 'data')
+        assert [delta['op'] for delta in deltas] == ['dataset', 'main']
+        journal.submit(deltas).result()
+        assert journal.changes({'data': data}, {}, 'data') == []
+        journal.close()
+
+    def test_change_during_write(self, autosave_dir):
+        """Test that a dataset marked changed while its write runs is journaled again."""
+        journal = autosave.Journal(str(autosave_dir / 'session'))
+        data = np.zeros(4)
+        deltas = journal.changes({'data': data}, {}, 'data')
+        journal.mark_changed('data')
+        journal.submit(deltas).result()
+        assert [delta['op'] for delta in journal.changes({'data': data}, {}, 'data')] == ['dataset']
+        journal.close()
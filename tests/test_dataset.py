@@ -0,0 +1,54 @@
+"""
+Tests for the dataset wrapper
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pycrosGUI.dataset import Dataset, DataType, wrap, unwrap
+from pycrosGUI.dataset_store import DatasetStore
+
+
+class TestDataset:
+    """Test attributes, versions and cached results."""
+
+    def test_data_type_from_shape(self):
+        """Test that the data type is guessed from the shape."""
+        assert wrap(np.zeros(100)).data_type == DataType.SPECTRUM
+        assert wrap(np.zeros((8, 8))).data_type == DataType.IMAGE
+        assert wrap(np.zeros((10, 64, 64))).data_type == DataType.IMAGE_STACK
+        assert wrap(np.zeros((16, 16, 1024))).data_type == DataType.SPECTRAL_IMAGE
+
+    def test_version_invalidates_cache(self):
+        """Test that in-place changes bump the version and drop cached results."""
+        dataset = Dataset(np.zeros((4, 4)), title='image')
+        calls = []
+
+        def total():
+            calls.append(1)
+            return float(np.asarray(dataset).sum())
+
+        assert dataset.cached('sum', total) == 0 and dataset.cached('sum', total) == 0
+        assert len(calls) == 1
+        dataset[0, 0] = 2
+        assert dataset.version == 1
+        assert dataset.cached('sum', total) == 2 and len(calls) == 2
+        assert dataset.cached('sum', total, key=1) == 2 and len(calls) == 3
+
+    def test_attrs_round_trip(self):
+        """Test that attributes survive conversion to strings."""
+        dataset = Dataset(np.zeros(10), title='EELS', modality='EELS',
+                          axes=[{'name': 'energy', 'scale': 0.5}], metadata={'experiment': {'exposure_time': 0.1}})
+        restored = Dataset.from_attrs(unwrap(dataset), dataset.attrs)
+        assert restored.attrs == dataset.attrs
+        assert restored.data_type == DataType.SPECTRUM
+
+    def test_spilled_dataset_keeps_identity(self, tmp_path):
+        """Test that spilling replaces only the array of a dataset."""
+        store = DatasetStore(budget=0, scratch_dir=str(tmp_path))
+        dataset = wrap(np.ones((10, 10)), title='map')
+        store['map'] = dataset
+        assert store['map'] is dataset and store.is_spilled('map')
+        assert dataset.version == 0 and isinstance(dataset.array, np.memmap)
+        store.close()
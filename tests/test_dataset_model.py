@@ -0,0 +1,124 @@
+"""
+Tests for the dataset item model
+"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+QtCore = pytest.importorskip('PyQt5.QtCore')
+QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+
+from pycrosGUI import preview_cache
+from pycrosGUI.dataset import wrap
+from pycrosGUI.dataset_events import DatasetEvents, is_spectrum
+from pycrosGUI.dataset_model import KEY_ROLE, DatasetModel, DatasetFilter, category, set_combo_model
+from pycrosGUI.dataset_store import DatasetStore
+
+
+class Parent:
+    """Holder of datasets, their events and model, like BaseWidget."""
+
+    def __init__(self):
+        self.datasets = DatasetStore()
+        self.dataset_events = DatasetEvents(self.datasets)
+        self.dataset_model = DatasetModel(self.datasets, self.dataset_events)
+
+
+@pytest.fixture
+def parent():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    yield Parent()
+    app.processEvents()
+
+
+class TestDatasetModel:
+    """Test that the model follows the datasets row by row."""
+
+    def test_rows_by_key(self, parent):
+        """Test that rows are found by key, also for keys with a colon."""
+        model = parent.dataset_model
+        inserted = []
+        model.rowsInserted.connect(lambda index, first, last: inserted.append(first))
+        parent.datasets['a:b'] = wrap(np.zeros(8), 'first')
+        parent.datasets['c'] = wrap(np.zeros((4, 4)), 'c')
+        assert inserted == [0, 1]
+        assert model.row_of('c') == 1 and model.row_of('missing') == -1
+        assert model.index(0, 0).data() == 'a:b: first' and model.index(1, 0).data() == 'c'
+        assert model.index(0, 0).data(KEY_ROLE) == 'a:b'
+        assert model.index(1, 1).data() == '4 x 4' and model.index(1, 2).data() == 'float64'
+
+        del parent.datasets['a:b']
+        assert model.rowCount() == 1 and model.row_of('c') == 0
+        parent.datasets.clear()
+        assert model.rowCount() == 0
+
+    def test_thumbnails_on_demand(self, parent):
+        """Test that thumbnails are computed in the background when first asked for."""
+        model = parent.dataset_model
+        parent.datasets['image'] = wrap(np.arange(64.).reshape(8, 8), 'image')
+        index = model.index(0, 0)
+        assert index.data(QtCore.Qt.ItemDataRole.DecorationRole) is None
+        model.pool.waitForDone()
+        QtWidgets.QApplication.processEvents()
+        assert not index.data(QtCore.Qt.ItemDataRole.DecorationRole).isNull()
+        assert 'Range: 0 .. 63' in index.data(QtCore.Qt.ItemDataRole.ToolTipRole)
+
+    def test_thumbnails_from_preview_cache(self, parent, tmp_path, monkeypatch):
+        """Test that datasets as read from a file take their thumbnail from the preview cache."""
+        monkeypatch.setattr(preview_cache, 'CACHE_DIR', str(tmp_path / 'previews'))
+        file_path = str(tmp_path / 'image.npy')
+        np.save(file_path, np.arange(64.).reshape(8, 8))
+        preview_cache.store_previews(file_path, {'image.npy': np.load(file_path)})
+        computed = []
+        make_preview = preview_cache.make_preview
+        monkeypatch.setattr(preview_cache, 'make_preview', lambda data, **kwargs: computed.append(1) or make_preview(data, **kwargs))
+
+        model = parent.dataset_model
+        parent.datasets['image.npy'] = wrap(np.load(file_path, mmap_mode='r'), 'image.npy')
+        model.set_source('image.npy', file_path)
+        model.index(0, 0).data(QtCore.Qt.ItemDataRole.DecorationRole)
+        model.pool.waitForDone()
+        QtWidgets.QApplication.processEvents()
+        assert 'Range: 0 .. 63' in model.index(0, 0).data(QtCore.Qt.ItemDataRole.ToolTipRole)
+        assert computed == []
+
+        parent.datasets.peek('image.npy').modified()
+        model.index(0, 0).data(QtCore.Qt.ItemDataRole.DecorationRole)
+        model.pool.waitForDone()
+        assert computed == [1]
+
+    def test_filters_share_the_model(self, parent):
+        """Test that filtered views follow the model and its changes."""
+        parent.datasets['image'] = wrap(np.zeros((4, 4)), 'image')
+        combo = QtWidgets.QComboBox()
+        set_combo_model(combo, parent, is_spectrum)
+        assert combo.count() == 0
+
+        parent.datasets['b'] = wrap(np.zeros(16), 'second')
+        parent.datasets['a'] = wrap(np.zeros(8), 'first')
+        assert [combo.itemData(i, KEY_ROLE) for i in range(combo.count())] == ['b', 'a']
+
+        parent.datasets.peek('a').title = 'renamed'
+        parent.datasets.notify_changed('a')
+        assert combo.itemText(1) == 'a: renamed'
+
+        proxy = DatasetFilter(parent.dataset_model, is_spectrum)
+        proxy.sort(0)
+        assert [proxy.index(i, 0).data(KEY_ROLE) for i in range(proxy.rowCount())] == ['a', 'b']
+        proxy.sort(3, QtCore.Qt.SortOrder.DescendingOrder)
+        assert proxy.index(0, 0).data(KEY_ROLE) == 'b'
+        proxy.setFilterFixedString('RENAMED')
+        assert proxy.rowCount() == 1
+
+        parent.datasets['b'] = wrap(np.zeros((2, 2)), 'now an image')
+        assert combo.count() == 1
+
+    def test_categories(self):
+        """Test that datasets are listed by type, survey images only by their metadata."""
+        from pycrosGUI.dataset import Dataset
+        assert category(wrap(np.zeros(8), 'spectrum')) == 'Spectrum'
+        assert category(wrap(np.zeros((4, 4)), 'survey image')) == 'Image'
+        assert category(Dataset(np.zeros((4, 4)), 'adf', metadata={'survey': True})) == 'Survey'
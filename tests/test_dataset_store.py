@@ -0,0 +1,112 @@
+"""
+Tests for the memory-budgeted dataset store
+"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pycrosGUI import autosave, lazy_data
+from pycrosGUI.dataset_store import DatasetStore
+
+
+class TestDatasetStore:
+    """Test spilling to scratch files."""
+
+    def test_least_recently_used_are_spilled(self, tmp_path):
+        """Test that the store keeps in-memory arrays within its budget."""
+        events = []
+        store = DatasetStore(budget=1700, scratch_dir=str(tmp_path))
+        store.subscribe(lambda event, key: events.append((event, key)))
+        for name in 'abc':
+            store[name] = np.full((10, 10), ord(name), dtype=np.float64)
+        store['a']
+        store['d'] = np.zeros((10, 10))
+        assert store.is_spilled('a') and store.is_spilled('b') and not store.is_spilled('d')
+        assert store.resident_bytes == 1600 and store.spilled_bytes == 1600
+        assert lazy_data.is_lazy(store['b'])
+        np.testing.assert_array_equal(store['b'], ord('b'))
+        # Spilled data are referenced by the autosave journal, not copied
+        assert 'memmap' in autosave.data_source(store['a'])
+        assert events[:4] == [('added', 'a'), ('added', 'b'), ('added', 'c'), ('spilled', 'a')]
+
+        del store['b']
+        assert events[-1] == ('removed', 'b')
+        assert len(os.listdir(tmp_path)) == 1
+        store.close()
+        assert len(store) == 0 and os.listdir(tmp_path) == []
+
+    def test_file_backed_data_are_not_counted(self, tmp_path):
+        """Test that lazy data and a larger budget cause no spilling."""
+        np.save(tmp_path / 'raw.npy', np.zeros((100, 100)))
+        store = DatasetStore(budget=1000, scratch_dir=str(tmp_path / 'scratch'))
+        store['raw'] = np.load(tmp_path / 'raw.npy', mmap_mode='r')
+        store['small'] = np.zeros(10)
+        assert store.resident_bytes == 80 and store.spilled_bytes == 0
+        store.set_budget(10)
+        assert store.is_spilled('small') and not store.is_spilled('raw')
+        store.close()
+
+    def test_spill_in_background(self, tmp_path):
+        """Test that arrays are swapped for their memory maps only when the scratch file is complete."""
+        from concurrent.futures import ThreadPoolExecutor
+        from pycrosGUI.dataset import wrap
+        executor = ThreadPoolExecutor(max_workers=1)
+        done = []
+        store = DatasetStore(budget=1000, scratch_dir=str(tmp_path), executor=executor)
+        store.spill_done = lambda: done.append(True)
+        events = []
+        store.subscribe(lambda event, key: events.append((event, key)))
+        first = wrap(np.full((10, 10), 1.0), 'first')
+        array = first.array
+        store['a'] = first
+        store['b'] = np.zeros((10, 10))
+        assert store.is_spilling('a') and not store.is_spilled('a')
+        assert store.peek('a').array is array
+        store['c'] = np.zeros(10)
+        assert not store.is_spilling('b')
+        executor.shutdown()
+        assert done == [True]
+        assert store.finish_spills() == ['a']
+        assert store.is_spilled('a') and store.peek('a') is first and lazy_data.is_lazy(first.array)
+        np.testing.assert_array_equal(first.array, 1.0)
+        assert events[-1] == ('spilled', 'a')
+        store.close()
+
+    def test_changed_data_are_not_swapped(self, tmp_path):
+        """Test that data replaced or modified while being spilled stay in memory."""
+        from concurrent.futures import ThreadPoolExecutor
+        from pycrosGUI.dataset import wrap
+        executor = ThreadPoolExecutor(max_workers=1)
+        store = DatasetStore(budget=1000, scratch_dir=str(tmp_path), executor=executor)
+        store['a'] = wrap(np.zeros((10, 10)), 'a')
+        store['b'] = wrap(np.zeros((10, 10)), 'b')
+        store.peek('a')[0, 0] = 5
+        store['b'] = wrap(np.ones((10, 10)), 'b')
+        assert store.wait_spills() == []
+        assert not store.is_spilled('a') and not lazy_data.is_lazy(store.peek('a').array)
+        assert os.listdir(tmp_path) == []
+        executor.shutdown()
+        store.close()
+
+    def test_displayed_image_follows_spill(self, tmp_path):
+        """Test that the image view of the main window shows the memory map of a spilled dataset."""
+        QtCore = pytest.importorskip('PyQt5.QtCore')
+        QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        from pycrosGUI import BaseWidget
+        widget = BaseWidget()
+        widget.datasets.scratch_dir = str(tmp_path)
+        widget.datasets.budget = 1000
+        widget.add_dataset('image', np.ones((10, 10)))
+        widget.add_dataset('other', np.zeros((10, 10)), show=False)
+        widget.datasets.executor.shutdown()
+        app.processEvents()
+        assert widget.datasets.is_spilled('image')
+        assert widget.image_item.image is widget.dataset.array and lazy_data.is_lazy(widget.image_item.image)
+        widget.close()
+        widget.deleteLater()
+        QtCore.QCoreApplication.sendPostedEvents(None, QtCore.QEvent.Type.DeferredDelete)
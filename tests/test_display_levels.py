@@ -0,0 +1,41 @@
+"""
+Tests for display levels of images
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pycrosGUI.display_levels import LevelStats, contrast_levels
+
+
+class TestLevelStats:
+    """Test percentiles read from the histogram."""
+
+    def test_percentiles(self):
+        """Test that percentiles of the histogram match those of the values."""
+        values = np.random.default_rng(0).normal(100.0, 10.0, 100_000)
+        values[:10] = np.nan
+        stats = LevelStats(values)
+        for q in [0.5, 50, 99.5]:
+            assert abs(stats.percentile(q) - np.nanpercentile(values, q)) < 0.2
+        low, high = stats.auto_levels
+        assert stats.minimum < low < 100 < high < stats.maximum
+
+    def test_constant_and_empty(self):
+        """Test that images without a spread of values still give a valid range."""
+        low, high = LevelStats(np.full((8, 8), 3.0)).auto_levels
+        assert (low, high) == (3.0, 4.0)
+        assert LevelStats(np.full(4, np.nan)).auto_levels == (0.0, 1.0)
+
+
+class TestContrastLevels:
+    """Test the mapping of the sliders to levels."""
+
+    def test_sliders(self):
+        """Test that the middle gives auto levels, contrast narrows and brightness lowers the range."""
+        assert contrast_levels((10.0, 30.0)) == (10.0, 30.0)
+        low, high = contrast_levels((10.0, 30.0), contrast=100)
+        assert (low, high) == (17.5, 22.5)
+        low, high = contrast_levels((10.0, 30.0), brightness=100)
+        assert (low, high) == (-10.0, 10.0)
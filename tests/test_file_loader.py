@@ -0,0 +1,108 @@
+"""
+Tests for reading files off the GUI thread
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pycrosGUI import file_loader, lazy_data
+
+
+class TestReadFile:
+    """Test read_file with progress and cancellation."""
+
+    def test_lazy_read_keeps_data_on_disk(self, tmp_path):
+        """Test that lazy reading returns file-backed data."""
+        file_path = tmp_path / 'stack.npy'
+        np.save(file_path, np.zeros((4, 8, 8)))
+        loaded = file_loader.read_file(str(file_path))
+        assert list(loaded.keys()) == ['stack.npy']
+        assert lazy_data.is_lazy(loaded['stack.npy'])
+
+    def test_eager_read_reports_progress(self, tmp_path):
+        """Test that eager reading materializes data and reports progress."""
+        data = np.arange(64.).reshape(4, 4, 4)
+        file_path = tmp_path / 'stack.npy'
+        np.save(file_path, data)
+        fractions = []
+        loaded = file_loader.read_file(str(file_path), lazy=False, progress=fractions.append)
+        assert not lazy_data.is_lazy(loaded['stack.npy'])
+        np.testing.assert_array_equal(loaded['stack.npy'], data)
+        assert fractions[-1] == 1.0
+
+    def test_cancelled_read(self, tmp_path):
+        """Test that a cancelled read raises LoadCancelled."""
+        file_path = tmp_path / 'stack.npy'
+        np.save(file_path, np.zeros((4, 8, 8)))
+        with pytest.raises(file_loader.LoadCancelled):
+            file_loader.read_file(str(file_path), lazy=False, is_cancelled=lambda: True)
+
+    def test_eager_hdf5_read(self, tmp_path):
+        """Test that HDF5 datasets are read directly into the result."""
+        h5py = pytest.importorskip('h5py')
+        data = np.arange(600.).reshape(6, 10, 10)
+        with h5py.File(tmp_path / 'data.h5', 'w') as h5_file:
+            h5_file.create_dataset('data', data=data, chunks=(1, 10, 10))
+            h5_file['scalar'] = 3.0
+        loaded = file_loader.read_file(str(tmp_path / 'data.h5'), lazy=False,
+                                       dataset_paths=['/data', '/scalar'])
+        np.testing.assert_array_equal(loaded['data.h5/data'], data)
+        assert loaded['data.h5/scalar'] == 3.0
+
+
+def wait_for_batch(widget):
+    QtCore = pytest.importorskip('PyQt5.QtCore')
+    timer = QtCore.QElapsedTimer()
+    timer.start()
+    while (widget.load_progress or widget.file_loader.active_jobs()) and timer.elapsed() < 5000:
+        widget.file_loader.wait(50)
+        QtCore.QCoreApplication.processEvents()
+
+
+class TestLoadBatch:
+    """Test loading several files at once in the main window."""
+
+    def test_mixed_batch_reports_failures(self, widget, tmp_path):
+        """Test that good files of a batch are added and the bad ones reported once at the end."""
+        for name in ('a.npy', 'b.npy'):
+            np.save(tmp_path / name, np.zeros((4, 4)))
+        (tmp_path / 'bad.npy').write_bytes(b'not a numpy file')
+        paths = [str(tmp_path / name) for name in ('a.npy', 'bad.npy', 'b.npy')]
+        assert len(widget.load_files(paths)) == 3
+        wait_for_batch(widget)
+        assert set(widget.datasets.keys()) == {'a.npy', 'b.npy'}
+        assert widget.main in ('a.npy', 'b.npy')
+        assert len(widget.warnings) == 1
+        assert 'Loaded 2 of 3 files (1 failed)' in widget.warnings[0]
+        assert 'bad.npy' in widget.warnings[0]
+
+    def test_drop_files(self, widget, tmp_path):
+        """Test that dropped files are loaded as one batch."""
+        QtCore = pytest.importorskip('PyQt5.QtCore')
+        QtGui = pytest.importorskip('PyQt5.QtGui')
+        for name in ('a.npy', 'b.npy'):
+            np.save(tmp_path / name, np.zeros((4, 4)))
+        mime = QtCore.QMimeData()
+        mime.setUrls([QtCore.QUrl.fromLocalFile(str(tmp_path / name)) for name in ('a.npy', 'b.npy')])
+        event = QtGui.QDropEvent(QtCore.QPointF(1, 1), QtCore.Qt.DropAction.CopyAction, mime,
+                                 QtCore.Qt.MouseButton.LeftButton, QtCore.Qt.KeyboardModifier.NoModifier)
+        widget.dropEvent(event)
+        assert len(set(widget.load_progress.values())) == 1
+        wait_for_batch(widget)
+        assert set(widget.datasets.keys()) == {'a.npy', 'b.npy'}
+        assert widget.warnings == []
+
+    def test_results_stream_in(self, widget):
+        """Test that results are added while the batch counts, the first non-empty one shown."""
+        progress = file_loader.LoadProgress([(1, 'empty.h5'), (2, 'a.npy'), (3, 'b.npy')], widget.file_loader)
+        widget.load_progress.update({1: progress, 2: progress, 3: progress})
+        widget._load_finished(1, 'empty.h5', {})
+        assert widget.main == '' and progress.label.text() == 'Loading 1/3 files'
+        widget._load_finished(2, 'a.npy', {'a.npy': np.zeros((4, 4))})
+        assert widget.main == 'a.npy' and progress.n_loaded == 1
+        widget._load_finished(3, 'b.npy', {'b.npy': np.ones((4, 4))})
+        assert widget.main == 'a.npy' and 'b.npy' in widget.datasets
+        assert progress.summary() == 'Loaded 2 of 3 files (1 failed)'
+        assert progress.failures == [('empty.h5', 'no data found')]
+        assert len(widget.warnings) == 1 and 'empty.h5: no data found' in widget.warnings[0]
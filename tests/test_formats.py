@@ -0,0 +1,76 @@
+"""
+Tests for the file format registry
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pycrosGUI import formats, file_loader
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Registry that is restored after the test."""
+    monkeypatch.setattr(formats, '_readers', list(formats._readers))
+    return formats
+
+
+class TestRegistry:
+    """Test finding and loading readers."""
+
+    def test_find_by_extension_and_magic(self, tmp_path):
+        """Test that files are matched by extension, then by content."""
+        assert formats.find_reader('spectrum.npy').name == 'NumPy'
+        assert formats.find_reader('session.H5').name == 'HDF5'
+        np.save(tmp_path / 'data.npy', np.zeros(4))
+        (tmp_path / 'data.npy').rename(tmp_path / 'data.raw')
+        assert formats.find_reader(str(tmp_path / 'data.raw')).name == 'NumPy'
+        assert file_loader.read_file(str(tmp_path / 'data.raw'))['data.raw'].shape == (4,)
+
+    def test_reader_imported_on_first_use(self, registry, tmp_path):
+        """Test that a reader module is only imported when a file is read."""
+        reader = registry.register_reader('Text', ['.txt'], reader='numpy:loadtxt')
+        assert not reader.is_loaded
+        (tmp_path / 'spectrum.txt').write_text('1\n2\n3\n')
+        loaded = file_loader.read_file(str(tmp_path / 'spectrum.txt'))
+        assert reader.is_loaded
+        np.testing.assert_array_equal(loaded['spectrum.txt'], [1, 2, 3])
+
+    def test_missing_package(self, registry, tmp_path):
+        """Test that a missing package gives an install hint."""
+        registry.register_reader('Exotic', ['.exo'], reader=lambda path: None,
+                                 requires='no_such_module.api', package='no-such-package')
+        (tmp_path / 'scan.exo').write_bytes(b'')
+        with pytest.raises(ImportError, match='pip install no-such-package'):
+            file_loader.read_file(str(tmp_path / 'scan.exo'))
+
+    def test_prewarm(self, registry):
+        """Test that pre-warming imports readers in the background."""
+        reader = registry.register_reader('Text', ['.txt'], reader='numpy:loadtxt')
+        registry.prewarm(['Text']).join()
+        assert reader.is_loaded
+
+    def test_npz_members(self, tmp_path):
+        """Test that every member of an .npz archive is read, like HDF5 datasets."""
+        np.savez(tmp_path / 'fit.npz', spectrum=np.arange(8.0), background=np.zeros(8))
+        loaded = file_loader.read_file(str(tmp_path / 'fit.npz'))
+        assert sorted(loaded) == ['fit.npz/background', 'fit.npz/spectrum']
+        np.testing.assert_array_equal(loaded['fit.npz/spectrum'], np.arange(8.0))
+
+        np.savez(tmp_path / 'single.npz', data=np.ones(4))
+        assert list(file_loader.read_file(str(tmp_path / 'single.npz'))) == ['single.npz']
+
+    def test_zip_without_arrays(self, tmp_path):
+        """Test that zip files other than .npz archives are not claimed."""
+        import zipfile
+
+        np.savez(tmp_path / 'data.npz', data=np.ones(4))
+        (tmp_path / 'data.npz').rename(tmp_path / 'data.bin')
+        assert formats.find_reader(str(tmp_path / 'data.bin')).name == 'NumPy Archive'
+
+        with zipfile.ZipFile(tmp_path / 'notes.bin', 'w') as archive:
+            archive.writestr('notes.txt', 'not an array')
+        assert formats.find_reader(str(tmp_path / 'notes.bin')) is None
+        with pytest.raises(ValueError, match='Unsupported file format'):
+            file_loader.read_file(str(tmp_path / 'notes.bin'))
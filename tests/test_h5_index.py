@@ -0,0 +1,55 @@
+"""
+Tests for the HDF5 structure index
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+h5py = pytest.importorskip('h5py')
+
+from pycrosGUI import h5_index
+
+
+@pytest.fixture
+def nsid_file(tmp_path, monkeypatch):
+    """HDF5 file with two channels and a dimension scale."""
+    monkeypatch.setattr(h5_index, 'CACHE_DIR', str(tmp_path / 'cache'))
+    h5_index.clear_cache()
+    file_path = tmp_path / 'session.h5'
+    with h5py.File(file_path, 'w') as h5_file:
+        survey = h5_file.create_dataset('Measurement_000/Channel_000/survey', data=np.zeros((8, 8)))
+        survey.attrs['title'] = 'HAADF'
+        survey.attrs['data_type'] = 'IMAGE'
+        h5_file.create_dataset('Measurement_000/Channel_001/SI', shape=(4, 4, 128), dtype='f4', chunks=(1, 4, 128))
+        energy = h5_file.create_dataset('Measurement_000/Channel_001/energy', data=np.arange(128.))
+        energy.make_scale('energy')
+    return str(file_path)
+
+
+class TestIndex:
+    """Test indexing without reading data."""
+
+    def test_index_lists_all_datasets(self, nsid_file):
+        """Test that shapes, dtypes, chunks and attributes are indexed."""
+        entries = {entry['path']: entry for entry in h5_index.index_hdf5(nsid_file)}
+        survey = entries['/Measurement_000/Channel_000/survey']
+        assert survey['shape'] == [8, 8]
+        assert survey['title'] == 'HAADF'
+        assert survey['data_type'] == 'IMAGE'
+        spectrum_image = entries['/Measurement_000/Channel_001/SI']
+        assert spectrum_image['chunks'] == [1, 4, 128]
+        assert spectrum_image['dtype'] == 'float32'
+        assert entries['/Measurement_000/Channel_001/energy']['is_dimension']
+
+    def test_main_datasets_skip_dimension_scales(self, nsid_file):
+        """Test that dimension scales are not offered as main datasets."""
+        paths = [entry['path'] for entry in h5_index.main_datasets(h5_index.index_hdf5(nsid_file))]
+        assert len(paths) == 2
+        assert '/Measurement_000/Channel_001/energy' not in paths
+
+    def test_index_is_cached_on_disk(self, nsid_file, monkeypatch):
+        """Test that an unchanged file is not walked again."""
+        first = h5_index.index_hdf5(nsid_file)
+        h5_index.clear_cache()
+        monkeypatch.setattr(h5_index, '_build_index', lambda file_path: pytest.fail('file was indexed again'))
+        assert h5_index.index_hdf5(nsid_file) == first
@@ -0,0 +1,62 @@
+"""
+Tests for the chunked, compressed HDF5 writer
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+h5py = pytest.importorskip('h5py')
+
+from pycrosGUI import h5_writer
+
+
+class TestChunks:
+    """Test the chunk shape guess."""
+
+    def test_stack_chunks_are_frames(self):
+        """Test that image stacks are chunked by frame."""
+        assert h5_writer.guess_chunks((1000, 512, 512), np.float32) == (1, 512, 512)
+
+    def test_spectrum_image_chunks_keep_spectra(self):
+        """Test that spectrum images keep complete spectra in a chunk."""
+        chunks = h5_writer.guess_chunks((512, 512, 2048), np.float32)
+        assert chunks[-1] == 2048
+        assert np.prod(chunks) * 4 <= h5_writer.CHUNK_BYTES
+
+
+class TestWriter:
+    """Test writing and benchmarking."""
+
+    def test_write_from_memory_map(self, tmp_path):
+        """Test that a memory-mapped array is written compressed."""
+        data = np.zeros((20, 64, 64), dtype=np.uint16)
+        data[:, 10:20, 10:20] = 7
+        np.save(tmp_path / 'stack.npy', data)
+        mapped = np.load(tmp_path / 'stack.npy', mmap_mode='r')
+
+        file_path = tmp_path / 'out.h5'
+        fractions = []
+        h5_writer.write_hdf5(str(file_path), {'stack.npy': mapped}, progress=fractions.append,
+                             compression='gzip', compression_opts=4, shuffle=True)
+        with h5py.File(file_path, 'r') as h5_file:
+            dataset = h5_file['Measurement_000/Channel_000/stack.npy']
+            assert dataset.compression == 'gzip'
+            assert dataset.shuffle
+            assert dataset.chunks == (20, 64, 64)
+            assert dataset.attrs['title'] == 'stack.npy'
+            np.testing.assert_array_equal(dataset[()], data)
+        assert fractions[-1] == pytest.approx(1.0)
+
+    def test_benchmark_reports_every_codec(self):
+        """Test that the benchmark lists speed and ratio per codec."""
+        results = h5_writer.benchmark_codecs(np.zeros((8, 32, 32)))
+        assert [result['name'] for result in results] == [codec[0] for codec in h5_writer.CODECS]
+        assert results[0]['ratio'] == pytest.approx(1.0, rel=0.1)
+        assert results[-1]['ratio'] > 10
+
+    def test_benchmark_clamps_chunks(self):
+        """Test that chunks larger than the benchmark sample are clamped to it."""
+        data = np.zeros((64, 32, 32))
+        results = h5_writer.benchmark_codecs(data, codecs=h5_writer.CODECS[:1], sample_bytes=8 * 32 * 32 * 8,
+                                             chunks=(32, 32, 32))
+        assert len(results) == 1 and results[0]['ratio'] > 0
@@ -0,0 +1,117 @@
+"""
+Tests for undo and redo of dataset changes
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pycrosGUI import history
+from pycrosGUI.dataset import wrap
+from pycrosGUI.dataset_store import DatasetStore
+
+
+class TestChunks:
+    """Test which chunks a write touches."""
+
+    def test_touched_chunks(self):
+        """Test that only chunks of the written rows are selected."""
+        data = np.zeros((100, 10))
+        chunks = history.chunk_slices(data, np.s_[25:35, 3], max_bytes=800)
+        assert chunks == [slice(20, 30), slice(30, 40)]
+        assert len(history.chunk_slices(data, data > 0, max_bytes=800)) == 10
+        assert history.chunk_slices(data, -1, max_bytes=800) == [slice(90, 100)]
+
+
+class TestHistory:
+    """Test the undo and redo stacks."""
+
+    def test_undo_redo_in_place(self):
+        """Test that in-place changes keep only the modified chunks."""
+        store = DatasetStore()
+        changed = []
+        undo = history.History(store, changed=changed.append)
+        spectrum_image = np.random.default_rng(0).random((512, 16, 256), dtype=np.float32)
+        store['si'] = wrap(spectrum_image.copy(), 'si')
+
+        undo.apply('si', lambda block: np.roll(block, 5, axis=-1), np.s_[10:12], 'Shift spectrum')
+        assert undo.nbytes < spectrum_image.nbytes / 4
+        assert changed == ['si'] and undo.undo_text() == 'Shift spectrum'
+        shifted = np.array(store['si'])
+
+        assert undo.undo() == 'Shift spectrum'
+        np.testing.assert_array_equal(store['si'], spectrum_image)
+        assert undo.redo() == 'Shift spectrum'
+        np.testing.assert_array_equal(store['si'], shifted)
+        assert undo.redo() is None
+
+        with pytest.raises(ValueError):
+            with undo.modify('si', np.s_[0], 'Failing') as data:
+                data[0] = 0
+                raise ValueError
+        np.testing.assert_array_equal(store['si'][0], spectrum_image[0])
+
+    def test_removed_and_replaced(self):
+        """Test that removed and replaced datasets come back as they were."""
+        store = DatasetStore()
+        undo = history.History(store)
+        original = wrap(np.arange(10.0), 'spectrum')
+        store['spectrum'] = original
+        undo.replace('spectrum', wrap(np.zeros(10), 'background subtracted'))
+        undo.remove('spectrum')
+        assert 'spectrum' not in store
+        undo.undo()
+        undo.undo()
+        assert store['spectrum'] is original
+        undo.redo()
+        assert store['spectrum'].title == 'background subtracted'
+
+    def test_memory_cap(self):
+        """Test that the oldest steps are dropped beyond the cap."""
+        store = DatasetStore()
+        undo = history.History(store, max_bytes=2500)
+        store['spectrum'] = wrap(np.zeros(128), 'spectrum')
+        for n in range(4):
+            undo.apply('spectrum', lambda block: block + 1, description=f"Add {n}")
+        assert [step.description for step in undo.undo_steps] == ['Add 2', 'Add 3']
+        undo.set_max_bytes(0)
+        assert not undo.can_undo()
+        store.clear()
+        assert undo.nbytes == 0
+
+    def test_spilled_dataset_comes_back(self, tmp_path):
+        """Test that a removed spilled dataset keeps its scratch file until it is back in the store."""
+        store = DatasetStore(budget=1000, scratch_dir=str(tmp_path))
+        undo = history.History(store)
+        store['a'] = wrap(np.arange(100.0).reshape(10, 10), 'a')
+        store['b'] = wrap(np.zeros((10, 10)), 'b')
+        assert store.is_spilled('a')
+        undo.remove('a')
+        assert undo.nbytes == 800 and len(list(tmp_path.iterdir())) == 1
+        undo.undo()
+        assert store.is_spilled('a') and store.spilled_bytes == 800
+        np.testing.assert_array_equal(store['a'], np.arange(100.0).reshape(10, 10))
+        undo.redo()
+        undo.clear()
+        assert list(tmp_path.iterdir()) == []
+
+    def test_step_too_large(self):
+        """Test that a change larger than the history is reported instead of kept."""
+        store = DatasetStore()
+        dropped = []
+        undo = history.History(store, max_bytes=100, too_large=dropped.append)
+        store['spectrum'] = wrap(np.zeros(128), 'spectrum')
+        undo.remove('spectrum')
+        assert not undo.can_undo()
+        assert [(step.description, step.nbytes) for step in dropped] == [('Remove spectrum', 1024)]
+
+    def test_read_only_data(self, tmp_path):
+        """Test that read-only data are refused before a step is recorded."""
+        np.save(tmp_path / 'stack.npy', np.arange(40.0).reshape(4, 10))
+        store = DatasetStore()
+        store['stack'] = wrap(np.load(tmp_path / 'stack.npy', mmap_mode='r'), 'stack')
+        undo = history.History(store)
+        with pytest.raises(ValueError, match='read-only'):
+            undo.apply('stack', lambda block: block * 2, np.s_[1])
+        assert not undo.can_undo()
+        np.testing.assert_array_equal(store['stack'], np.arange(40.0).reshape(4, 10))
@@ -0,0 +1,73 @@
+"""
+Tests for tiled image pyramids
+"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pyqtgraph')
+
+from pycrosGUI import image_pyramid
+
+
+class TestImagePyramid:
+    """Test levels and tiles."""
+
+    def test_levels_in_memory(self):
+        """Test that levels are 2 x 2 means down to one tile."""
+        image = np.arange(600 * 500, dtype=np.float32).reshape(600, 500)
+        pyramid = image_pyramid.ImagePyramid(image, tile_size=64)
+        assert pyramid.n_levels == 5 and pyramid.level_shape(4) == (38, 32)
+        sampled = pyramid.tile(1, 0, 0)
+        assert sampled[0, 0] == image[0, 0]
+        pyramid.build()
+        assert pyramid.complete and pyramid.prefix is None
+        assert pyramid.tile(1, 0, 0)[0, 0] == image[:2, :2].mean()
+        assert pyramid.tile(4, 0, 0).shape == (38, 32)
+        assert pyramid.tile(0, 9, 7).shape == (600 - 9 * 64, 500 - 7 * 64)
+
+    def test_levels_cached_next_to_file(self, tmp_path):
+        """Test that levels of a file are stored beside it and reused."""
+        file_path = tmp_path / 'montage.npy'
+        np.save(file_path, np.ones((300, 300), dtype=np.uint16))
+        data = np.load(file_path, mmap_mode='r')
+        pyramid = image_pyramid.ImagePyramid(data, tile_size=64)
+        built = []
+        pyramid.build(progress=built.append)
+        assert built == [1, 2, 3]
+        assert len(os.listdir(tmp_path / '.pycrosGUI-pyramids')) == 3
+
+        reopened = image_pyramid.ImagePyramid(np.load(file_path, mmap_mode='r'), tile_size=64)
+        assert reopened.complete and reopened.tile(3, 0, 0).shape == (38, 38)
+        assert reopened.levels_range() == (1.0, 1.0)
+
+    def test_stale_and_partial_files_removed(self, tmp_path, monkeypatch):
+        """Test that levels of an older file version and unfinished levels are deleted."""
+        file_path = tmp_path / 'montage.npy'
+        np.save(file_path, np.ones((300, 300), dtype=np.uint16))
+        image_pyramid.ImagePyramid(np.load(file_path, mmap_mode='r'), tile_size=64).build()
+        np.save(file_path, np.zeros((300, 300), dtype=np.uint16))
+        os.utime(file_path, ns=(0, 0))
+
+        def fail(source, target, max_bytes=None):
+            raise OSError("disk full")
+
+        pyramid = image_pyramid.ImagePyramid(np.load(file_path, mmap_mode='r'), tile_size=64)
+        monkeypatch.setattr(image_pyramid, 'downsample', fail)
+        with pytest.raises(OSError):
+            pyramid.build()
+        assert os.listdir(tmp_path / '.pycrosGUI-pyramids') == []
+        monkeypatch.undo()
+        pyramid.build()
+        assert len(os.listdir(tmp_path / '.pycrosGUI-pyramids')) == 3
+
+    def test_build_errors_are_reported(self, tmp_path, monkeypatch):
+        """Test that the background builder reports errors instead of hiding them."""
+        signals = image_pyramid.PyramidSignals()
+        errors = []
+        signals.failed.connect(errors.append)
+        monkeypatch.setattr(image_pyramid.ImagePyramid, 'build', lambda self, progress=None: 1 / 0)
+        image_pyramid.PyramidBuilder(image_pyramid.ImagePyramid(np.zeros((8, 8))), signals).run()
+        assert errors == ['ZeroDivisionError: division by zero']
@@ -0,0 +1,105 @@
+"""
+Tests for streamed image stacks
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+Image = pytest.importorskip('PIL.Image')
+
+from pycrosGUI import image_stack
+
+
+def _frames(n_frames=12):
+    return [(np.ones((16, 24)) * i).astype(np.uint16) for i in range(n_frames)]
+
+
+@pytest.fixture
+def movie(tmp_path):
+    """Multi-page TIFF file with frame index as intensity."""
+    frames = [Image.fromarray(frame) for frame in _frames()]
+    file_path = tmp_path / 'movie.tif'
+    frames[0].save(file_path, save_all=True, append_images=frames[1:])
+    return str(file_path)
+
+
+class TestTiffStack:
+    """Test multi-page TIFF streaming."""
+
+    def test_page_offsets(self, movie):
+        """Test that all pages are indexed."""
+        order, big, offsets = image_stack.tiff_page_offsets(movie)
+        assert order == '<'
+        assert not big
+        assert len(offsets) == 12
+
+    def test_frames_on_demand(self, movie):
+        """Test that frames are decoded when indexed."""
+        stack = image_stack.open_tiff(movie)
+        assert isinstance(stack, image_stack.TiffStack)
+        assert stack.shape == (12, 16, 24)
+        assert stack[7].mean() == 7
+        np.testing.assert_array_equal(stack[2:5, 0, 0], [2, 3, 4])
+
+    def test_parallel_decode(self, movie):
+        """Test that the whole stack decodes in parallel."""
+        stack = image_stack.open_tiff(movie)
+        np.testing.assert_array_equal(stack.decode_frames(max_workers=4), np.stack(_frames()))
+
+    def test_materialize_decodes_in_parallel(self, movie, monkeypatch):
+        """Test that reading a stack into memory decodes blocks in parallel, not frame by frame."""
+        from pycrosGUI.file_loader import materialize
+
+        stack = image_stack.TiffStack(movie, prefetch=0)
+        monkeypatch.setattr(stack, 'frame', lambda index: pytest.fail('decoded frame by frame'))
+        out = np.zeros(stack.shape, dtype=stack.dtype)
+        stack.read_into(out, np.s_[3:9])
+        np.testing.assert_array_equal(out[3:9], np.stack(_frames())[3:9])
+        np.testing.assert_array_equal(materialize(stack), np.stack(_frames()))
+
+    def test_cache_is_bounded(self, movie):
+        """Test that the frame cache keeps to its size limit."""
+        frame_bytes = 16 * 24 * 2
+        stack = image_stack.TiffStack(movie, cache_bytes=3 * frame_bytes, prefetch=0)
+        for i in range(12):
+            stack[i]
+        assert len(stack.cache.frames) == 3
+        assert stack.cache.nbytes <= 3 * frame_bytes
+
+
+class TestDecode:
+    """Test decoding of single images."""
+
+    def test_strips_match_pil(self):
+        """Test that converting in strips gives the same pixels as numpy."""
+        rgb = np.random.default_rng(0).integers(0, 255, (37, 21, 3), dtype=np.uint8)
+        for img in [Image.fromarray(rgb), Image.fromarray(rgb[..., 0]).convert('1')]:
+            data = image_stack.image_to_array(img, max_bytes=100)
+            assert data.flags.writeable
+            np.testing.assert_array_equal(data, np.asarray(img))
+
+
+class TestImageSequence:
+    """Test folders of frames."""
+
+    def test_folder_as_stack(self, tmp_path):
+        """Test that image files of a folder are stacked in sorted order."""
+        for i, frame in enumerate(_frames(5)):
+            Image.fromarray(frame).save(tmp_path / f'frame_{i:03d}.png')
+        stack = image_stack.ImageSequence(str(tmp_path))
+        assert stack.shape == (5, 16, 24)
+        np.testing.assert_array_equal(stack[:, 0, 0], np.arange(5))
+
+    def test_append_frames(self, tmp_path):
+        """Test that a live stack grows by appended frames."""
+        frames = _frames(3)
+        for i, frame in enumerate(frames):
+            Image.fromarray(frame).save(tmp_path / f'frame_{i:03d}.png')
+        stack = image_stack.ImageSequence([str(tmp_path / 'frame_000.png')], first_frame=frames[0])
+        stack.append(str(tmp_path / 'frame_001.png'), frames[1])
+        stack.append(str(tmp_path / 'frame_002.png'))
+        assert stack.shape == (3, 16, 24) and stack.version == 2
+        np.testing.assert_array_equal(stack[:, 0, 0], [0, 1, 2])
+        with pytest.raises(ValueError):
+            stack.append('wrong.png', np.zeros((4, 4), dtype=np.uint16))
+
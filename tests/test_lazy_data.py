@@ -0,0 +1,136 @@
+"""
+Tests for lazy (out-of-core) data access
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pycrosGUI import lazy_data
+
+
+class TestNumpyFiles:
+    """Test memory-mapped and on-demand numpy files."""
+
+    def test_npy_is_memory_mapped(self, tmp_path):
+        """Test that .npy files are opened memory-mapped."""
+        data = np.arange(24, dtype=np.float32).reshape(2, 3, 4)
+        file_path = tmp_path / 'stack.npy'
+        np.save(file_path, data)
+
+        loaded = lazy_data.open_npy(str(file_path))
+        assert isinstance(loaded, np.memmap)
+        assert lazy_data.is_lazy(loaded)
+        np.testing.assert_array_equal(loaded[1], data[1])
+
+    def test_npy_eager(self, tmp_path):
+        """Test that lazy loading can be switched off."""
+        file_path = tmp_path / 'spectrum.npy'
+        np.save(file_path, np.ones(10))
+        loaded = lazy_data.open_npy(str(file_path), lazy=False)
+        assert not lazy_data.is_lazy(loaded)
+
+    def test_npz_stored_members_are_memory_mapped(self, tmp_path):
+        """Test that uncompressed .npz members map into the archive."""
+        first = np.arange(12, dtype=np.int16).reshape(3, 4)
+        second = np.linspace(0, 1, 7)
+        file_path = tmp_path / 'data.npz'
+        np.savez(file_path, first=first, second=second)
+
+        members = lazy_data.open_npz(str(file_path))
+        assert list(members.keys()) == ['first', 'second']
+        assert isinstance(members['first'], np.memmap)
+        np.testing.assert_array_equal(members['first'], first)
+        np.testing.assert_array_equal(members['second'], second)
+
+    def test_npz_compressed_members_on_demand(self, tmp_path):
+        """Test that compressed members are read only when indexed."""
+        data = np.arange(60, dtype=np.float64).reshape(3, 4, 5)
+        file_path = tmp_path / 'data.npz'
+        np.savez_compressed(file_path, data=data)
+
+        member = lazy_data.open_npz(str(file_path))['data']
+        assert isinstance(member, lazy_data.NpzMember)
+        assert member.shape == data.shape
+        assert member._data is None
+        np.testing.assert_array_equal(member[2, 1], data[2, 1])
+        assert member.max() == data.max()
+
+
+class TestSampling:
+    """Test level estimation from sampled frames."""
+
+    def test_sample_frames_reads_few_frames(self):
+        """Test that only a few frames of a stack are sampled."""
+        data = np.arange(100)[:, None, None] * np.ones((100, 4, 4))
+        sample = lazy_data.sample_frames(data, max_frames=5)
+        assert sample.shape[0] == 5
+        assert sample.min() == 0
+        assert sample.max() == 99
+
+
+class TestHDF5:
+    """Test lazy HDF5 datasets."""
+
+    def test_open_hdf5_keeps_dataset_on_disk(self, tmp_path):
+        """Test that the first dataset is returned as an open H5Array."""
+        h5py = pytest.importorskip('h5py')
+        data = np.arange(4 * 6 * 8, dtype=np.uint16).reshape(4, 6, 8)
+        file_path = tmp_path / 'data.h5'
+        with h5py.File(file_path, 'w') as h5_file:
+            h5_file.create_dataset('Measurement_000/Channel_000/data', data=data, chunks=(1, 6, 8))
+
+        loaded = lazy_data.open_hdf5(str(file_path))
+        assert isinstance(loaded, lazy_data.H5Array)
+        assert loaded.shape == data.shape
+        assert loaded.chunks == (1, 6, 8)
+        np.testing.assert_array_equal(loaded[2], data[2])
+        np.testing.assert_array_equal(loaded[:, 3, 4], data[:, 3, 4])
+        assert loaded.max() == data.max()
+        loaded.close()
+        assert not loaded.file.id.valid
+
+    def test_open_hdf5_eager(self, tmp_path):
+        """Test that eager loading returns a numpy array."""
+        h5py = pytest.importorskip('h5py')
+        file_path = tmp_path / 'data.h5'
+        with h5py.File(file_path, 'w') as h5_file:
+            h5_file['spectrum'] = np.ones(16)
+        loaded = lazy_data.open_hdf5(str(file_path), lazy=False)
+        assert isinstance(loaded, np.ndarray)
+
+
+class TestSpectrumImage:
+    """Test block-wise reductions of spectrum images."""
+
+    def test_navigator_and_roi_sum(self, tmp_path):
+        """Test navigator and ROI sum of a memory-mapped spectrum image."""
+        data = np.random.default_rng(0).random((16, 12, 32)).astype(np.float32)
+        np.save(tmp_path / 'si.npy', data)
+        mapped = lazy_data.open_npy(str(tmp_path / 'si.npy'))
+        np.testing.assert_allclose(lazy_data.navigator(mapped), data.sum(axis=-1), rtol=1e-5)
+
+        mask = np.zeros((16, 12), dtype=bool)
+        mask[5:9, 2:4] = True
+        np.testing.assert_allclose(lazy_data.roi_sum(mapped, mask), data[mask].sum(axis=0), rtol=1e-5)
+
+    def test_blocks_follow_chunks(self, tmp_path):
+        """Test that blocks start and end on chunk boundaries."""
+        h5py = pytest.importorskip('h5py')
+        with h5py.File(tmp_path / 'si.h5', 'w') as h5_file:
+            h5_file.create_dataset('si', shape=(100, 8, 8), dtype='f4', chunks=(10, 8, 8))
+        data = lazy_data.open_hdf5(str(tmp_path / 'si.h5'))
+        slices = list(lazy_data.block_slices(data, 15, 47, max_bytes=25 * 8 * 8 * 4))
+        data.close()
+        assert slices[0].start == 10 and slices[-1].stop == 47
+        assert all(sl.start % 10 == 0 for sl in slices)
+
+    def test_dask_array(self):
+        """Test that dask arrays are computed chunk by chunk."""
+        da = pytest.importorskip('dask.array')
+        data = np.arange(8 * 6 * 10.0).reshape(8, 6, 10)
+        lazy = lazy_data.DaskArray(da.from_array(data, chunks=(2, 6, 10)))
+        assert lazy.chunks == (2, 6, 10)
+        np.testing.assert_array_equal(lazy[3, 2], data[3, 2])
+        np.testing.assert_array_equal(lazy_data.navigator(lazy), data.sum(axis=-1))
+        assert lazy.max() == data.max()
@@ -0,0 +1,90 @@
+"""
+Tests for the preview cache and recent files
+"""
+
+import os
+import threading
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from pycrosGUI import preview_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(preview_cache, 'CACHE_DIR', str(tmp_path / 'previews'))
+    monkeypatch.setattr(preview_cache, 'RECENT_FILE', str(tmp_path / 'recent.json'))
+    return preview_cache
+
+
+class TestPreview:
+    """Test preview computation and caching."""
+
+    def test_previews_are_small(self):
+        """Test that images are subsampled and spectra binned."""
+        preview, stats = preview_cache.make_preview(np.ones((10, 1024, 1024), dtype=np.uint16))
+        assert preview.shape == (128, 128)
+        assert stats['shape'] == [10, 1024, 1024] and stats['max'] == 1
+        preview, _ = preview_cache.make_preview(np.arange(2048.0))
+        assert preview.shape == (preview_cache.SPECTRUM_POINTS,)
+
+    def test_spectrum_image_preview(self):
+        """Test that spectrum images are previewed by their navigator, not a slab of the first row."""
+        from pycrosGUI.dataset import DataType
+        data = np.random.default_rng(0).random((40, 30, 256)).astype(np.float32)
+        preview, stats = preview_cache.make_preview(data)
+        assert preview.shape == (40, 30) and stats['shape'] == [40, 30, 256]
+        np.testing.assert_allclose(preview, data.sum(axis=-1), rtol=1e-5)
+        stack, _ = preview_cache.make_preview(data, data_type=DataType.IMAGE_STACK)
+        np.testing.assert_array_equal(stack, data[0, ::2, ::2])
+
+    def test_cache_is_validated(self, cache, tmp_path):
+        """Test that a cached preview is used until the file changes."""
+        file_path = str(tmp_path / 'image.npy')
+        np.save(file_path, np.arange(64.0).reshape(8, 8))
+        previews = cache.get_previews(file_path)
+        assert list(previews) == ['image.npy']
+        cached = cache.load_previews(file_path)
+        np.testing.assert_array_equal(cached['image.npy'][0], previews['image.npy'][0])
+
+        np.save(file_path, np.zeros((4, 4)))
+        os.utime(file_path, ns=(0, 0))
+        assert cache.load_previews(file_path) is None
+        assert cache.get_previews(file_path)['image.npy'][1]['shape'] == [4, 4]
+
+    def test_recent_files(self, cache, tmp_path):
+        """Test that recent files are kept in order without duplicates."""
+        for name in ['a.npy', 'b.npy', 'a.npy']:
+            (tmp_path / name).touch()
+            cache.add_recent_file(str(tmp_path / name))
+        assert [os.path.basename(path) for path in cache.recent_files()] == ['a.npy', 'b.npy']
+
+
+class TestRecentFilesPanel:
+    """Test that the recent files list is updated entry by entry."""
+
+    def test_add_file_moves_entry(self, cache, tmp_path, monkeypatch):
+        """Test that opening a file moves its entry and reads no previews on the GUI thread."""
+        QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+        os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+        app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        from pycrosGUI.recent_files import RecentFilesPanel
+        for name in ['a.npy', 'b.npy']:
+            np.save(tmp_path / name, np.zeros((4, 4)))
+            cache.add_recent_file(str(tmp_path / name))
+        panel = RecentFilesPanel()
+        panel.pool.waitForDone()
+        app.processEvents()
+        first = panel.file_list.item(1)
+        assert first.text() == 'a.npy' and not first.icon().isNull()
+
+        threads = []
+        load_previews = cache.load_previews
+        monkeypatch.setattr(cache, 'load_previews',
+                            lambda file_path: threads.append(threading.get_ident()) or load_previews(file_path))
+        panel.add_file(str(tmp_path / 'a.npy'))
+        assert panel.file_list.item(0) is first and panel.file_list.count() == 2
+        panel.pool.waitForDone()
+        assert threads and threading.get_ident() not in threads
@@ -0,0 +1,101 @@
+"""
+Tests for the provenance graph of derived datasets
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+h5py = pytest.importorskip('h5py')
+
+from pycrosGUI import provenance, session
+from pycrosGUI.dataset import wrap
+from pycrosGUI.dataset_store import DatasetStore
+
+
+@pytest.fixture
+def counted(monkeypatch):
+    """Operation 'scale' counting its calls."""
+    calls = []
+
+    def scale(data, factor=1.0):
+        calls.append(factor)
+        return np.asarray(data) * factor
+
+    monkeypatch.setitem(provenance.OPERATIONS, 'scale', scale)
+    return calls
+
+
+class TestProvenanceGraph:
+    """Test memoized operations."""
+
+    def test_memoized_until_input_changes(self, counted):
+        """Test that an unchanged result is returned without computing it again."""
+        store = DatasetStore()
+        graph = provenance.ProvenanceGraph(store)
+        store['raw'] = wrap(np.arange(4.0), 'raw')
+        assert graph.derive('scale', ['raw'], {'factor': 2.0}) == 'raw_scale'
+        assert graph.derive('scale', ['raw'], {'factor': 2.0}) == 'raw_scale'
+        assert counted == [2.0]
+        np.testing.assert_array_equal(store['raw_scale'], [0, 2, 4, 6])
+        assert store['raw_scale'].metadata['provenance']['params'] == {'factor': 2.0}
+
+        graph.derive('scale', ['raw'], {'factor': 3.0}, key='raw_3')
+        assert counted == [2.0, 3.0]
+        store['raw'][0] = 10
+        assert not graph.is_current('raw_scale')
+        graph.derive('scale', ['raw'], {'factor': 2.0})
+        assert counted == [2.0, 3.0, 2.0] and store['raw_scale'][0] == 20
+
+        derived = graph.derive('sum_frames', ['raw_scale'])
+        assert [key for key, step in graph.lineage(derived)] == ['raw_scale', derived]
+        del store['raw_scale']
+        assert 'raw_scale' not in graph and graph.lineage(derived)[0][0] == derived
+
+    def test_existing_dataset_is_not_replaced(self, counted):
+        """Test that a result whose key is taken by another dataset gets a key of its own."""
+        store = DatasetStore()
+        graph = provenance.ProvenanceGraph(store)
+        store['raw'] = wrap(np.arange(4.0), 'raw')
+        store['raw_scale'] = wrap(np.zeros(2), 'loaded from a file')
+        assert graph.derive('scale', ['raw'], {'factor': 2.0}) == 'raw_scale_1'
+        assert store['raw_scale'].title == 'loaded from a file'
+        assert graph.derive('scale', ['raw'], {'factor': 3.0}) == 'raw_scale_2'
+        store['raw'][0] = 10
+        assert graph.derive('scale', ['raw'], {'factor': 2.0}) == 'raw_scale_1'
+        assert store['raw_scale_1'][0] == 20 and len(store) == 4
+
+    def test_evicted_results_are_recomputed(self, counted):
+        """Test that results over the memory budget are dropped and recomputed when read."""
+        store = DatasetStore(budget=10 ** 6)
+        graph = provenance.ProvenanceGraph(store)
+        store.evictor = graph.evict
+        store['raw'] = wrap(np.ones((100, 100)), 'raw')
+        graph.derive('scale', ['raw'], {'factor': 2.0})
+        result = store.peek('raw_scale')
+        store['raw']
+        store.set_budget(80000)
+        assert isinstance(result.array, provenance.DerivedArray) and store.resident_bytes == 80000
+        assert not store.is_spilled('raw_scale')
+        assert result[0, 0] == 2.0 and isinstance(result.array, np.ndarray)
+        assert counted == [2.0, 2.0] and graph.is_current('raw_scale')
+
+    def test_saved_with_session(self, tmp_path, counted):
+        """Test that current results stay current after a session round trip."""
+        store = DatasetStore()
+        graph = provenance.ProvenanceGraph(store)
+        store['raw'] = wrap(np.arange(4.0), 'raw')
+        graph.derive('scale', ['raw'], {'factor': 2.0})
+
+        s = session.Session(str(tmp_path / 'session.h5'))
+        s.save(store, {'provenance': graph.state()})
+        s.close()
+        s = session.Session(str(tmp_path / 'session.h5'))
+        datasets, states, main = s.load()
+        loaded = DatasetStore()
+        loaded.update(datasets)
+        restored = provenance.ProvenanceGraph(loaded)
+        restored.restore(states['provenance'])
+        assert restored.lookup('scale', ['raw'], {'factor': 2.0}) == 'raw_scale'
+        assert restored.derive('scale', ['raw'], {'factor': 2.0}) == 'raw_scale'
+        assert counted == [2.0]
+        s.close()
@@ -0,0 +1,64 @@
+"""
+Tests for the redraw scheduler
+"""
+
+import os
+
+import pytest
+
+QtCore = pytest.importorskip('PyQt5.QtCore')
+QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+
+from pycrosGUI.redraw import RedrawScheduler
+
+
+@pytest.fixture
+def app():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    yield QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+def wait(app, scheduler, milliseconds=200):
+    timer = QtCore.QElapsedTimer()
+    timer.start()
+    while (scheduler.timer.isActive() or scheduler.dirty) and timer.elapsed() < milliseconds:
+        app.processEvents()
+
+
+class TestRedrawScheduler:
+    """Test that requests are coalesced and timed."""
+
+    def test_burst_is_drawn_once(self, app):
+        """Test that many requests before a frame give one redraw per layer."""
+        drawn = []
+        scheduler = RedrawScheduler()
+        scheduler.add_layer('spectra', lambda: drawn.append('spectra'))
+        scheduler.add_layer('image', lambda: drawn.append('image'))
+        for _ in range(50):
+            scheduler.request('image')
+            scheduler.request('spectra')
+        assert drawn == [] and scheduler.is_dirty('spectra')
+        wait(app, scheduler)
+        assert drawn == ['spectra', 'image']
+        assert scheduler.requests == 100
+        assert scheduler.timings['spectra'].count == 1
+        assert '100 redraw requests' in scheduler.summary()
+
+    def test_flush_and_requests_while_drawing(self, app):
+        """Test that flush draws at once and layers asked for while drawing wait for the next frame."""
+        drawn = []
+        scheduler = RedrawScheduler()
+
+        def draw():
+            drawn.append(len(drawn))
+            if len(drawn) == 1:
+                scheduler.request('spectra')
+
+        scheduler.add_layer('spectra', draw)
+        scheduler.request('spectra')
+        scheduler.flush()
+        assert drawn == [0] and scheduler.is_dirty()
+        wait(app, scheduler)
+        assert drawn == [0, 1] and not scheduler.is_dirty()
+        with pytest.raises(KeyError):
+            scheduler.request('unknown')
@@ -0,0 +1,76 @@
+"""
+Tests for the HDF5 save options
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('h5py')
+
+
+@pytest.fixture
+def dialog(widget):
+    from pycrosGUI import H5SaveDialog
+    dialog = H5SaveDialog(np.zeros((4, 8, 8)), widget)
+    yield dialog
+    dialog.deleteLater()
+
+
+class TestChunks:
+    """Test validation of the chunk entry."""
+
+    def test_auto(self, dialog):
+        """Test that an empty or auto entry gives automatic chunks."""
+        for text in ('', 'auto'):
+            dialog.chunks_edit.setText(text)
+            assert dialog.chunks() is None
+
+    def test_valid(self, dialog, widget):
+        """Test that a chunk shape of the dataset is accepted."""
+        QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+        dialog.chunks_edit.setText('1, 8x8')
+        assert dialog.chunks() == (1, 8, 8)
+        dialog.accept()
+        assert dialog.result() == QtWidgets.QDialog.DialogCode.Accepted
+        assert widget.warnings == []
+
+    @pytest.mark.parametrize('text', ['1, a, 8', '8, 8', '0, 8, 8'])
+    def test_invalid_keeps_dialog_open(self, dialog, widget, text):
+        """Test that malformed chunks are reported and do not close the dialog."""
+        QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+        dialog.chunks_edit.setText(text)
+        with pytest.raises(ValueError):
+            dialog.chunks()
+        dialog.accept()
+        assert dialog.result() != QtWidgets.QDialog.DialogCode.Accepted
+        assert len(widget.warnings) == 1
+
+
+class TestSaveHDF5:
+    """Test writing datasets from the main window."""
+
+    def test_failed_save_removes_file(self, widget, tmp_path, monkeypatch):
+        """Test that a save failing part way does not leave a partial file."""
+        QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+        from pycrosGUI import base_widget, h5_writer
+
+        class Options:
+            def __init__(self, data, parent):
+                pass
+
+            def exec(self):
+                return QtWidgets.QDialog.DialogCode.Accepted
+
+            def options(self):
+                return {}
+
+        def write_hdf5(file_path, datasets, progress=None, **kwargs):
+            open(file_path, 'wb').close()
+            raise OSError('disk full')
+
+        monkeypatch.setattr(base_widget, 'H5SaveDialog', Options)
+        monkeypatch.setattr(h5_writer, 'write_hdf5', write_hdf5)
+        file_path = tmp_path / 'out.h5'
+        with pytest.raises(OSError):
+            widget.save_hdf5(str(file_path), {'data': np.zeros((4, 4))})
+        assert not file_path.exists()
@@ -0,0 +1,176 @@
+"""
+Tests for the incremental session container
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+h5py = pytest.importorskip('h5py')
+
+from pycrosGUI import session
+
+
+class TestState:
+    """Test encoding of dialog states."""
+
+    def test_round_trip(self):
+        """Test that arrays and scalars survive encoding."""
+        state = {'edits': {'width': '1.5'}, 'attributes': {'fit': np.arange(4.0), 'n': np.int64(3),
+                                                            'atoms': object()}}
+        arrays = {}
+        encoded = session.encode_state(state, arrays)
+        decoded = session.decode_state(encoded, arrays)
+        assert decoded['edits'] == {'width': '1.5'}
+        assert np.array_equal(decoded['attributes']['fit'], np.arange(4.0))
+        assert decoded['attributes']['n'] == 3
+        assert 'atoms' not in decoded['attributes']
+
+
+class TestSession:
+    """Test saving and reopening sessions."""
+
+    def test_incremental_save(self, tmp_path):
+        """Test that only new and changed datasets are written."""
+        file_path = str(tmp_path / 'session.h5')
+        spectrum = np.arange(100.0)
+        image = np.ones((32, 32), dtype=np.float32)
+
+        s = session.Session(file_path)
+        written, unchanged = s.save({'spectrum': spectrum, 'image': image}, main='image')
+        assert sorted(written) == ['image', 'spectrum'] and unchanged == []
+
+        written, unchanged = s.save({'spectrum': spectrum, 'image': image}, main='image')
+        assert written == [] and sorted(unchanged) == ['image', 'spectrum']
+
+        image[0, 0] = 5
+        s.mark_changed('image')
+        written, _ = s.save({'spectrum': spectrum, 'image': image, 'sum': image * 2}, main='image')
+        assert sorted(written) == ['image', 'sum']
+
+        written, _ = s.save({'image': image, 'sum': image * 2}, main='sum')
+        assert written == ['sum']
+        s.close()
+
+        s = session.Session(file_path)
+        datasets, states, main = s.load()
+        assert sorted(datasets) == ['image', 'sum'] and main == 'sum'
+        assert np.asarray(datasets['image'])[0, 0] == 5
+
+        # Reopened datasets are not written again
+        written, unchanged = s.save(datasets, main=main)
+        assert written == [] and len(unchanged) == 2
+        s.close()
+
+    def test_states(self, tmp_path):
+        """Test that dialog states are stored and restored."""
+        file_path = str(tmp_path / 'session.h5')
+        s = session.Session(file_path)
+        s.save({}, {'LowLoss': {'edits': {'offset': '0.1'}, 'attributes': {'drude_fit': np.ones(8)}}})
+        digest = s.state_group['LowLoss'].attrs['digest']
+        s.save({}, {'LowLoss': {'edits': {'offset': '0.1'}, 'attributes': {'drude_fit': np.ones(8)}}})
+        assert s.state_group['LowLoss'].attrs['digest'] == digest
+        s.close()
+
+        s = session.Session(file_path)
+        _, states, _ = s.load()
+        assert states['LowLoss']['edits'] == {'offset': '0.1'}
+        assert np.array_equal(states['LowLoss']['attributes']['drude_fit'], np.ones(8))
+        s.close()
+
+    def test_dataset_attributes(self, tmp_path):
+        """Test that Dataset attributes are stored and changed metadata are saved."""
+        from pycrosGUI.dataset import Dataset, DataType
+
+        file_path = str(tmp_path / 'session.h5')
+        spectrum = Dataset(np.arange(10.0), title='low loss', modality='EELS')
+        s = session.Session(file_path)
+        s.save({'spectrum': spectrum})
+        spectrum.metadata['experiment'] = {'exposure_time': 0.5}
+        s.datasets_group[s.names['spectrum']].attrs['marker'] = 1
+        written, _ = s.save({'spectrum': spectrum})
+        assert written == ['spectrum']
+        # Only the attributes were updated, the array was not written again
+        assert s.datasets_group[s.names['spectrum']].attrs['marker'] == 1
+        s.close()
+
+        s = session.Session(file_path)
+        datasets, _, _ = s.load()
+        assert datasets['spectrum'].title == 'low loss'
+        assert datasets['spectrum'].data_type == DataType.SPECTRUM
+        assert datasets['spectrum'].metadata == {'experiment': {'exposure_time': 0.5}}
+        s.close()
+
+    def test_save_as_reopened(self, tmp_path):
+        """Test that a reopened session can be saved to a new file and keeps reading from it."""
+        from pycrosGUI.dataset import Dataset
+
+        one, two = str(tmp_path / 'one.h5'), str(tmp_path / 'two.h5')
+        image = np.arange(64.0).reshape(8, 8)
+        s = session.Session(one)
+        s.save({'image': image, 'spectrum': Dataset(np.arange(10.0), title='low loss')}, main='image')
+        s.close()
+
+        s = session.Session(one)
+        datasets, _, main = s.load()
+        datasets['sum'] = image * 2
+        s2, written, unchanged = session.save_as(two, datasets, main=main, source=s)
+        assert written == ['sum'] and sorted(unchanged) == ['image', 'spectrum']
+        assert not s.h5_file.id.valid and not (tmp_path / 'two.h5.part').exists()
+        assert datasets['image'].array.file.filename == two
+        assert np.array_equal(np.asarray(datasets['image']), image)
+
+        # Saving again only writes what changed
+        written, unchanged = s2.save(datasets, main=main)
+        assert written == [] and len(unchanged) == 3
+        s2.close()
+
+        s = session.Session(two)
+        datasets, _, _ = s.load()
+        assert sorted(datasets) == ['image', 'spectrum', 'sum'] and datasets['spectrum'].title == 'low loss'
+        assert np.array_equal(np.asarray(datasets['sum']), image * 2)
+        s.close()
+
+    def test_repeated_saves_keep_size(self, tmp_path):
+        """Test that changed datasets and states of the same shape are overwritten in place."""
+        file_path = tmp_path / 'session.h5'
+        image = np.zeros((256, 256))
+        s = session.Session(str(file_path))
+        s.save({'image': image}, {'LowLoss': {'attributes': {'fit': np.zeros(1000)}}}, compression=None)
+        size = file_path.stat().st_size
+        name = s.names['image']
+        for n in range(1, 6):
+            image[:] = n
+            s.mark_changed('image')
+            written, _ = s.save({'image': image}, {'LowLoss': {'attributes': {'fit': np.full(1000, n)}}},
+                                compression=None)
+            assert written == ['image']
+        assert file_path.stat().st_size == size
+        assert s.names['image'] == name and s.datasets_group[name][0, 0] == 5
+        s.close()
+
+        s = session.Session(str(file_path))
+        _, states, _ = s.load()
+        assert np.array_equal(states['LowLoss']['attributes']['fit'], np.full(1000, 5))
+        s.close()
+
+    def test_compact(self, tmp_path, monkeypatch):
+        """Test that saving a session as its own file gives back unused space."""
+        monkeypatch.setattr(session, 'COMPACT_MIN_BYTES', 1024)
+        file_path = str(tmp_path / 'session.h5')
+        image = np.arange(256 * 256.0).reshape(256, 256)
+        s = session.Session(file_path)
+        s.save({'big': np.ones((512, 512)), 'image': image}, main='image', compression=None)
+        s.save({'image': image}, main='image', compression=None)
+        assert s.needs_compacting()
+        s.close()
+
+        s = session.Session(file_path)
+        datasets, states, main = s.load()
+        size = (tmp_path / 'session.h5').stat().st_size
+        s, written, unchanged = session.save_as(file_path, datasets, states, main, source=s)
+        assert written == [] and unchanged == ['image']
+        assert (tmp_path / 'session.h5').stat().st_size < size / 2
+        assert not s.needs_compacting()
+        assert datasets['image'].array.file == s.h5_file
+        assert np.array_equal(np.asarray(datasets['image']), image)
+        s.close()
@@ -0,0 +1,101 @@
+"""
+Tests for the spectrum image viewer
+"""
+
+import os
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pyqtgraph')
+QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+
+from pycrosGUI import lazy_data, si_view
+from pycrosGUI.dataset import wrap
+
+
+@pytest.fixture
+def view():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+    yield si_view.SpectrumImageView()
+    app.processEvents()
+
+
+def spectrum_image(tmp_path, shape=(24, 20, 64)):
+    data = np.random.default_rng(0).random(shape).astype(np.float32)
+    np.save(tmp_path / 'si.npy', data)
+    return data, wrap(np.load(tmp_path / 'si.npy', mmap_mode='r'), 'si')
+
+
+class TestSpectrumImageView:
+    """Test navigator, pixel and ROI spectra."""
+
+    def test_navigator_pixel_and_roi(self, view, tmp_path):
+        """Test that the viewer shows the sum, the pixel spectrum and the ROI sum."""
+        data, dataset = spectrum_image(tmp_path)
+        view.set_dataset(dataset)
+        np.testing.assert_allclose(view.image.image, data.sum(axis=-1), rtol=1e-5)
+        assert dataset.has_cached('navigator')
+        assert view.pixel == (12, 10)
+        np.testing.assert_allclose(view.pixel_curve.yData, data[12, 10])
+
+        view.show_pixel(3, 4)
+        np.testing.assert_allclose(view.pixel_curve.yData, data[3, 4])
+        x0, x1, y0, y1 = view.roi_bounds()
+        np.testing.assert_allclose(view.roi_curve.yData, data[x0:x1, y0:y1].sum(axis=(0, 1)), rtol=1e-5)
+
+    def test_large_navigator_and_roi_in_background(self, view, tmp_path, monkeypatch):
+        """Test that large data are reduced in the background, the latest ROI winning."""
+        monkeypatch.setattr(lazy_data, 'BLOCK_BYTES', 1024)
+        monkeypatch.setattr(si_view, 'LIVE_ROI_BYTES', 0)
+        data, dataset = spectrum_image(tmp_path)
+        view.set_dataset(dataset)
+        view.roi.setPos([2, 3])
+        view.roi.setSize([5, 6])
+        view.pool.waitForDone()
+        QtWidgets.QApplication.processEvents()
+        view.pool.waitForDone()
+        QtWidgets.QApplication.processEvents()
+        np.testing.assert_allclose(view.image.image, data.sum(axis=-1), rtol=1e-5)
+        np.testing.assert_allclose(view.roi_curve.yData, data[2:7, 3:9].sum(axis=(0, 1)), rtol=1e-5)
+
+    def test_navigator_failure(self, view, tmp_path, monkeypatch):
+        """Test that a failed background navigator is reported and computed again when asked for."""
+        monkeypatch.setattr(lazy_data, 'BLOCK_BYTES', 1024)
+        data, dataset = spectrum_image(tmp_path)
+        navigator = lazy_data.navigator
+        monkeypatch.setattr(lazy_data, 'navigator', lambda array: 1 / 0)
+        view.set_dataset(dataset)
+        view.pool.waitForDone()
+        QtWidgets.QApplication.processEvents()
+        assert view.pixel_label.text() == 'Navigator could not be computed'
+        assert view._stamp is None and not dataset.has_cached('navigator')
+
+        monkeypatch.setattr(lazy_data, 'navigator', navigator)
+        view.update_navigator()
+        view.pool.waitForDone()
+        QtWidgets.QApplication.processEvents()
+        np.testing.assert_allclose(view.image.image, data.sum(axis=-1), rtol=1e-5)
+
+    def test_image_navigator(self, view, tmp_path):
+        """Test that images of the navigation size can be chosen as navigator."""
+        data, dataset = spectrum_image(tmp_path)
+        adf = wrap(np.ones((24, 20)), 'adf')
+        view.set_dataset(dataset, {'adf': adf, 'other': wrap(np.ones((5, 5)), 'other')})
+        assert [view.navigator_box.itemText(i) for i in range(view.navigator_box.count())] == ['Sum', 'adf']
+        view.navigator_box.setCurrentText('adf')
+        view.update_navigator()
+        np.testing.assert_array_equal(view.image.image, adf.array)
+
+
+class TestRoiSum:
+    """Test ROI sums restricted to the covered block."""
+
+    def test_roi_sum_columns(self):
+        """Test that a ROI sum reads only the rows and columns covered."""
+        data = np.arange(10 * 12 * 5, dtype=np.float64).reshape(10, 12, 5)
+        mask = si_view.roi_mask((10, 12), 2, 5, 7, 11)
+        mask[3, 8] = False
+        np.testing.assert_allclose(lazy_data.roi_sum(data, mask), data[mask].sum(axis=0))
+        assert not lazy_data.roi_sum(data, np.zeros((10, 12), dtype=bool)).any()
@@ -0,0 +1,38 @@
+"""
+Tests for decimated spectrum drawing
+"""
+
+import pytest
+
+np = pytest.importorskip('numpy')
+pytest.importorskip('pyqtgraph')
+
+from pycrosGUI import spectrum_plot
+
+
+class TestMinMaxPyramid:
+    """Test envelopes of long spectra."""
+
+    def test_levels_and_envelope(self):
+        """Test that the envelope keeps every extremum at screen resolution."""
+        spectrum = np.random.default_rng(0).random(1_000_003).astype(np.float32)
+        spectrum[777_777] = 5.0
+        spectrum[12] = np.nan
+        pyramid = spectrum_plot.MinMaxPyramid(spectrum, max_bytes=4096)
+        assert len(pyramid.levels[-1][1]) <= spectrum_plot.MIN_BINS
+        assert pyramid.bounds[1] == 5.0
+        assert pyramid.nbytes < spectrum.nbytes / 2
+
+        x, y = pyramid.envelope(0, spectrum.size, 1000)
+        assert 1000 <= len(x) // 2 <= 2000
+        assert y.max() == 5.0 and np.nanmin(y) == np.nanmin(spectrum)
+
+        x, y = pyramid.envelope(777_000, 778_000, 1000)
+        assert len(x) == 1001 and y[x == 777_777] == 5.0
+
+    def test_short_spectrum(self):
+        """Test that short spectra are drawn channel by channel."""
+        pyramid = spectrum_plot.MinMaxPyramid(np.arange(10.0))
+        x, y = pyramid.envelope(-5, 20, 500)
+        np.testing.assert_array_equal(y, np.arange(10.0))
+        assert pyramid.envelope(20, 30, 500)[0].size == 0
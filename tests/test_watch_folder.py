@@ -0,0 +1,90 @@
+"""
+Tests for the live ingestion of a watched folder
+"""
+
+import os
+import threading
+
+import pytest
+
+np = pytest.importorskip('numpy')
+Image = pytest.importorskip('PIL.Image')
+QtCore = pytest.importorskip('PyQt5.QtCore')
+QtWidgets = pytest.importorskip('PyQt5.QtWidgets')
+
+from pycrosGUI import image_stack, watch_folder
+
+
+def _frames(n_frames=12):
+    return [(np.ones((16, 24)) * i).astype(np.uint16) for i in range(n_frames)]
+
+
+@pytest.fixture
+def app():
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    yield QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+class TestFolderWatcher:
+    """Test polling a folder."""
+
+    def test_scans_run_in_worker(self, app, tmp_path):
+        """Test that timed scans run off the GUI thread and their results are queued to it."""
+        watcher = watch_folder.FolderWatcher(str(tmp_path))
+        threads, reported = [], []
+        scan = watcher._scan
+        watcher._scan = lambda: threads.append(threading.get_ident()) or scan()
+        watcher.new_files.connect(reported.extend)
+        np.save(tmp_path / 'spectrum.npy', np.zeros(8))
+        for _ in range(2):
+            watcher.start_poll()
+            watcher.scan_future.result()
+        assert reported == []
+        app.processEvents()
+        assert reported == [str(tmp_path / 'spectrum.npy')]
+        assert threading.get_ident() not in threads
+        watcher.stop()
+
+
+class TestLiveIngest:
+    """Test watching a folder."""
+
+    def test_grown_tiff_and_settled_files(self, app, tmp_path):
+        """Test that files are reported once settled and TIFF stacks pick up new pages."""
+        folder = tmp_path / 'acquisition'
+        folder.mkdir()
+        frames = [Image.fromarray(frame) for frame in _frames(4)]
+        frames[0].save(folder / 'movie.tif', save_all=True, append_images=frames[1:2])
+        stack = image_stack.TiffStack(str(folder / 'movie.tif'))
+
+        loaded, added = [], []
+        ingest = watch_folder.LiveIngest(str(folder), loaded.extend, lambda: {'movie.tif': stack})
+        ingest.frames_added.connect(lambda key, data: added.append((key, data.shape[0])))
+
+        np.save(folder / 'spectrum.npy', np.zeros(8))
+        ingest.watcher.poll()
+        assert loaded == []  # not settled yet
+        ingest.watcher.poll()
+        assert loaded == [str(folder / 'spectrum.npy')]
+
+        frames[0].save(folder / 'movie.tif', save_all=True, append_images=frames[1:])
+        ingest.watcher.poll()
+        ingest.watcher.poll()
+        assert added == [('movie.tif', 4)]
+        assert stack[3].mean() == 3
+        ingest.stop()
+
+    def test_live_stack_keeps_existing_dataset(self, app, tmp_path):
+        """Test that the live stack gets a key of its own if the default one is taken."""
+        folder = tmp_path / 'acquisition'
+        folder.mkdir()
+        datasets = {'acquisition_live': np.zeros(4)}
+        added = []
+        ingest = watch_folder.LiveIngest(str(folder), [].extend, lambda: datasets)
+        ingest.frames_added.connect(lambda key, data: added.append(key))
+        frame = _frames(1)[0]
+        ingest._append(str(folder / 'frame_000.png'), frame)
+        datasets[added[0]] = ingest.stacks[added[0]]
+        ingest._append(str(folder / 'frame_001.png'), frame)
+        assert added == ['acquisition_live_1', 'acquisition_live_1']
+        ingest.stop()